@@ -0,0 +1,223 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.cache.backends.locmem import LocMemCache
+
+from . import timing
+
+_MISSING = object()
+
+
+class InstrumentedCacheMixin:
+    """Считает попадания и промахи кэша в статистику запроса."""
+
+    def get(self, key, default=None, version=None):
+        with timing.muted():
+            value = super().get(key, _MISSING, version=version)
+        found = value is not _MISSING
+        timing.count_cache(int(found), int(not found))
+        return value if found else default
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        with timing.muted():
+            values = super().get_many(keys, version=version)
+        timing.count_cache(len(values), len(keys) - len(values))
+        return values
+
+
+class SQLiteCache(BaseCache):
+    """Кэш в общем SQLite-файле, один на все процессы хоста.
+
+    В отличие от LocMemCache, запись одного воркера сразу видна
+    остальным, а incr атомарен между процессами, поэтому версии
+    лент и заполненные фрагменты общие для всего пула gunicorn.
+    LOCATION — путь к файлу кэша.
+    """
+
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+    busy_timeout: int = 5
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._path = location
+        self._local = threading.local()
+        self._writes = 0
+
+    @property
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        # После fork соединение родителя использовать нельзя.
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(
+                self._path,
+                timeout=self.busy_timeout,
+                isolation_level=None,
+                check_same_thread=False,
+            )
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS cache ('
+                'key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL)'
+            )
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def _expiry(self, timeout=DEFAULT_TIMEOUT):
+        # get_backend_timeout уже возвращает момент истечения, а не срок.
+        return self.get_backend_timeout(timeout)
+
+    def _dumps(self, value):
+        return pickle.dumps(value, self.pickle_protocol)
+
+    def _cull(self, connection):
+        self._writes += 1
+        if self._writes % self._cull_frequency:
+            return
+        connection.execute(
+            'DELETE FROM cache WHERE expires < ?', (time.time(),)
+        )
+        (entries,) = connection.execute(
+            'SELECT COUNT(*) FROM cache'
+        ).fetchone()
+        if entries > self._max_entries:
+            connection.execute(
+                'DELETE FROM cache WHERE key IN (SELECT key FROM cache '
+                'ORDER BY expires IS NULL, expires LIMIT ?)',
+                (entries // self._cull_frequency,),
+            )
+
+    def get_many(self, keys, version=None):
+        key_map = {}
+        for key in keys:
+            cache_key = self.make_key(key, version=version)
+            self.validate_key(cache_key)
+            key_map[cache_key] = key
+        if not key_map:
+            return {}
+        rows = self._connection.execute(
+            'SELECT key, value FROM cache WHERE key IN (%s) '
+            'AND (expires IS NULL OR expires > ?)'
+            % ', '.join('?' * len(key_map)),
+            [*key_map, time.time()],
+        ).fetchall()
+        return {key_map[key]: pickle.loads(value) for key, value in rows}
+
+    def get(self, key, default=None, version=None):
+        return self.get_many([key], version=version).get(key, default)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        expires = self._expiry(timeout)
+        rows = []
+        for key, value in data.items():
+            key = self.make_key(key, version=version)
+            self.validate_key(key)
+            rows.append((key, self._dumps(value), expires))
+        connection = self._connection
+        with connection:
+            connection.execute('BEGIN IMMEDIATE')
+            connection.executemany(
+                'INSERT OR REPLACE INTO cache (key, value, expires) '
+                'VALUES (?, ?, ?)',
+                rows,
+            )
+            self._cull(connection)
+        return []
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout=timeout, version=version)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        connection = self._connection
+        with connection:
+            connection.execute('BEGIN IMMEDIATE')
+            connection.execute(
+                'DELETE FROM cache WHERE key = ? AND expires <= ?',
+                (key, time.time()),
+            )
+            cursor = connection.execute(
+                'INSERT OR IGNORE INTO cache (key, value, expires) '
+                'VALUES (?, ?, ?)',
+                (key, self._dumps(value), self._expiry(timeout)),
+            )
+        return cursor.rowcount == 1
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        connection = self._connection
+        with connection:
+            cursor = connection.execute(
+                'UPDATE cache SET expires = ? WHERE key = ? '
+                'AND (expires IS NULL OR expires > ?)',
+                (self._expiry(timeout), key, time.time()),
+            )
+        return cursor.rowcount == 1
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        connection = self._connection
+        # BEGIN IMMEDIATE берёт блокировку записи до чтения значения,
+        # так что конкурирующие incr из других процессов не теряются.
+        with connection:
+            connection.execute('BEGIN IMMEDIATE')
+            row = connection.execute(
+                'SELECT value FROM cache WHERE key = ? '
+                'AND (expires IS NULL OR expires > ?)',
+                (key, time.time()),
+            ).fetchone()
+            if row is None:
+                raise ValueError("Key '%s' not found" % key)
+            value = pickle.loads(row[0]) + delta
+            connection.execute(
+                'UPDATE cache SET value = ? WHERE key = ?',
+                (self._dumps(value), key),
+            )
+        return value
+
+    def delete_many(self, keys, version=None):
+        keys = [self.make_key(key, version=version) for key in keys]
+        for key in keys:
+            self.validate_key(key)
+        if not keys:
+            return
+        connection = self._connection
+        with connection:
+            connection.execute(
+                'DELETE FROM cache WHERE key IN (%s)'
+                % ', '.join('?' * len(keys)),
+                keys,
+            )
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version=version)
+
+    def has_key(self, key, version=None):
+        return bool(self.get_many([key], version=version))
+
+    def clear(self):
+        connection = self._connection
+        with connection:
+            connection.execute('DELETE FROM cache')
+
+    def close(self, **kwargs):
+        # Соединение живёт вместе с потоком: переоткрывать файл на каждый
+        # запрос дороже, чем держать его открытым.
+        pass
+
+
+class InstrumentedLocMemCache(InstrumentedCacheMixin, LocMemCache):
+    pass
+
+
+class InstrumentedSQLiteCache(InstrumentedCacheMixin, SQLiteCache):
+    pass
@@ -0,0 +1,95 @@
+import random
+import sqlite3
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.db import OperationalError, connection, transaction
+
+LOCK_ERRORS = (OperationalError, sqlite3.OperationalError)
+
+
+def pragma_statements():
+    """PRAGMA-команды профиля SQLite из settings.SQLITE_PRAGMAS."""
+    return [
+        f'PRAGMA {name} = {value}'
+        for name, value in settings.SQLITE_PRAGMAS.items()
+    ]
+
+
+def configure_sqlite(sender, connection, **kwargs):
+    """Настраивает новое соединение с SQLite: обработчик connection_created.
+
+    Прагмы действуют только на своё соединение, поэтому ставятся при
+    каждом подключении; с CONN_MAX_AGE это раз за жизнь соединения.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for statement in pragma_statements():
+            cursor.execute(statement)
+
+
+def is_lock_error(error):
+    return isinstance(error, LOCK_ERRORS) and 'locked' in str(error)
+
+
+def in_django_transaction(error):
+    """Упала ли запись внутри atomic соединения Django.
+
+    Ошибки голого sqlite3 к транзакциям Django отношения не имеют.
+    """
+    return (
+        isinstance(error, OperationalError) and connection.in_atomic_block
+    )
+
+
+def retry_on_lock(func):
+    """Повторяет пишущую функцию, если SQLite ответил «database is locked».
+
+    busy_timeout не спасает транзакцию, которая начала с чтения и не
+    смогла поднять блокировку до записи: SQLite отказывает сразу.
+    Такую транзакцию можно только повторить целиком, поэтому внутри
+    чужого atomic ошибка пробрасывается — повторит внешний уровень.
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        attempt = 0
+        while True:
+            try:
+                return func(*args, **kwargs)
+            except LOCK_ERRORS as error:
+                if (not is_lock_error(error)
+                        or in_django_transaction(error)
+                        or attempt >= settings.DATABASE_LOCK_RETRIES):
+                    raise
+            delay = settings.DATABASE_LOCK_RETRY_DELAY * 2 ** attempt
+            # Случайная доля паузы разводит повторы столкнувшихся писателей.
+            time.sleep(random.uniform(delay / 2, delay))
+            attempt += 1
+    return wrapper
+
+
+@contextmanager
+def write_transaction():
+    """Транзакция, которая сразу берёт блокировку записи.
+
+    На SQLite отложенная транзакция, начавшая с чтения, при встречной
+    записи из другого процесса падает с «database is locked», не ожидая
+    таймаута. BEGIN IMMEDIATE ставит такие транзакции в очередь.
+    Внутри уже открытой транзакции работает как обычный atomic.
+    """
+    if connection.vendor != 'sqlite' or connection.in_atomic_block:
+        with transaction.atomic():
+            yield
+        return
+    connection.ensure_connection()
+    with connection.cursor() as cursor:
+        cursor.execute('BEGIN IMMEDIATE')
+        try:
+            yield
+        except BaseException:
+            cursor.execute('ROLLBACK')
+            raise
+        cursor.execute('COMMIT')
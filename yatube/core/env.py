@@ -0,0 +1,15 @@
+"""Разбор значений из переменных окружения для settings.py.
+
+Модуль не импортирует Django: settings загружается раньше приложений.
+"""
+import os
+
+DISABLED = ('', 'off')
+
+
+def optional_float(name, default):
+    """Число из переменной name; пустое значение или off — None."""
+    value = os.getenv(name, str(default)).strip()
+    if value.lower() in DISABLED:
+        return None
+    return float(value)
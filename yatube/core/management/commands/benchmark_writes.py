@@ -0,0 +1,133 @@
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.db import is_lock_error, pragma_statements, retry_on_lock
+
+# Прежний профиль: журнал отката, полный fsync и таймаут sqlite3
+# по умолчанию — так соединения Django жили без настроек.
+DEFAULT, TUNED = 'default', 'tuned'
+PROFILES = (DEFAULT, TUNED)
+DEFAULT_TIMEOUT = 5.0
+
+
+def connect(path, profile):
+    db = sqlite3.connect(
+        path, timeout=DEFAULT_TIMEOUT, isolation_level=None
+    )
+    if profile == TUNED:
+        for statement in pragma_statements():
+            db.execute(statement)
+    return db
+
+
+def setup(path, profile):
+    db = connect(path, profile)
+    db.executescript(
+        'CREATE TABLE post (id INTEGER PRIMARY KEY, author INTEGER, '
+        'text TEXT);'
+        'CREATE TABLE stats (author INTEGER PRIMARY KEY, posts_count INTEGER);'
+    )
+    db.close()
+
+
+def write_post(db, author, text):
+    """Запись как в post_create: сначала чтение, потом две записи."""
+    db.execute('BEGIN')
+    try:
+        db.execute(
+            'SELECT posts_count FROM stats WHERE author = ?', [author]
+        ).fetchone()
+        db.execute(
+            'INSERT INTO post (author, text) VALUES (?, ?)', [author, text]
+        )
+        db.execute(
+            'INSERT OR IGNORE INTO stats VALUES (?, 0)', [author]
+        )
+        db.execute(
+            'UPDATE stats SET posts_count = posts_count + 1 '
+            'WHERE author = ?', [author]
+        )
+    except BaseException:
+        db.execute('ROLLBACK')
+        raise
+    db.execute('COMMIT')
+
+
+def run_worker(args):
+    """Пишет writes постов; возвращает (успешных, отказов, повторов)."""
+    path, profile, author, writes = args
+    db = connect(path, profile)
+    attempts = 0
+
+    def attempt(text):
+        nonlocal attempts
+        attempts += 1
+        write_post(db, author, text)
+
+    if profile == TUNED:
+        attempt = retry_on_lock(attempt)
+    done = failed = 0
+    for number in range(writes):
+        try:
+            attempt(f'Пост {number} автора {author}')
+        except sqlite3.OperationalError as error:
+            if not is_lock_error(error):
+                raise
+            failed += 1
+        else:
+            done += 1
+    db.close()
+    return done, failed, attempts - done - failed
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает пропускную способность параллельной записи в SQLite '
+        'с прежними настройками и с профилем из SQLITE_PRAGMAS.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=4,
+            help='Число процессов, пишущих одновременно.',
+        )
+        parser.add_argument(
+            '--writes', type=int, default=200,
+            help='Сколько постов записывает каждый процесс.',
+        )
+        parser.add_argument(
+            '--profile', choices=PROFILES, action='append',
+            help='Какие профили замерять; по умолчанию оба.',
+        )
+
+    def measure(self, profile, workers, writes):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'benchmark.sqlite3')
+            setup(path, profile)
+            started = time.monotonic()
+            with multiprocessing.Pool(workers) as pool:
+                results = pool.map(run_worker, [
+                    (path, profile, author, writes)
+                    for author in range(workers)
+                ])
+            elapsed = max(time.monotonic() - started, 1e-6)
+        done, failed, retries = (sum(column) for column in zip(*results))
+        return done, failed, retries, elapsed
+
+    def handle(self, *args, **options):
+        workers = max(options['workers'], 1)
+        writes = max(options['writes'], 1)
+        for profile in options['profile'] or PROFILES:
+            done, failed, retries, elapsed = self.measure(
+                profile, workers, writes
+            )
+            self.stdout.write(
+                f'{profile}: записано {done} из {workers * writes} '
+                f'за {elapsed:.2f} с, {done / elapsed:.1f} записей/с; '
+                f'отказов из-за блокировки: {failed}, повторов: {retries}'
+            )
@@ -0,0 +1,393 @@
+"""Реестр метрик и их выдача в текстовом формате Prometheus.
+
+Каждый поток пишет в свой шард без блокировок; блокировка берётся только
+при заведении шарда и при подсчёте итогов процесса. Воркеры gunicorn
+слушают один порт, и сбор попадает в случайный из них, поэтому каждый
+процесс периодически добавляет прирост своих итогов к общим суммам
+в SQLite-файле, а /metrics/ отдаёт эти суммы.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from bisect import bisect_left
+from contextlib import closing
+
+from django.conf import settings
+
+STORE_TIMEOUT: int = 5
+# Сброс из пути запроса не ждёт занятое хранилище: прирост не теряется
+# и уйдёт со следующим сбросом.
+REQUEST_STORE_TIMEOUT: float = 0.05
+
+# Границы по умолчанию клиентских библиотек Prometheus, в секундах.
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1, 2.5, 5, 10,
+)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = tuple(
+    kilobytes * 1024 for kilobytes in (10, 100, 500, 1024, 5 * 1024, 10240)
+)
+
+
+def _escape(value):
+    return (
+        str(value).replace('\\', r'\\').replace('"', r'\"')
+        .replace('\n', r'\n')
+    )
+
+
+def _labels(pairs):
+    if not pairs:
+        return ''
+    return '{%s}' % ','.join(f'{name}="{_escape(value)}"'
+                             for name, value in pairs)
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, registry, name, documentation):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+
+    def _values(self, labels):
+        shard = self.registry.shard()
+        key = (self.name, tuple(sorted(labels.items())))
+        values = shard.get(key)
+        if values is None:
+            values = shard[key] = self.empty()
+        return values
+
+    def header(self):
+        return [
+            f'# HELP {self.name} {self.documentation}',
+            f'# TYPE {self.name} {self.kind}',
+        ]
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    @staticmethod
+    def empty():
+        return [0]
+
+    def inc(self, amount=1, **labels):
+        self._values(labels)[0] += amount
+
+    @staticmethod
+    def merge(total, values):
+        total[0] += values[0]
+
+    def render(self, series):
+        lines = self.header()
+        for pairs, values in series:
+            lines.append(f'{self.name}{_labels(pairs)} {_number(values[0])}')
+        return lines
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, registry, name, documentation, buckets):
+        super().__init__(registry, name, documentation)
+        self.buckets = tuple(sorted(buckets))
+
+    def empty(self):
+        # Счётчики по корзинам, корзина +Inf, сумма наблюдений.
+        return [0] * (len(self.buckets) + 1) + [0]
+
+    def observe(self, value, **labels):
+        values = self._values(labels)
+        values[bisect_left(self.buckets, value)] += 1
+        values[-1] += value
+
+    @staticmethod
+    def merge(total, values):
+        for index, value in enumerate(values):
+            total[index] += value
+
+    def render(self, series):
+        lines = self.header()
+        bounds = self.buckets + (float('inf'),)
+        for pairs, values in series:
+            cumulative = 0
+            for bound, count in zip(bounds, values):
+                cumulative += count
+                le = pairs + (('le', _number(bound)),)
+                lines.append(f'{self.name}_bucket{_labels(le)} {cumulative}')
+            lines.append(
+                f'{self.name}_sum{_labels(pairs)} {_number(values[-1])}'
+            )
+            lines.append(f'{self.name}_count{_labels(pairs)} {cumulative}')
+        return lines
+
+
+class Gauge(Metric):
+    """Значение, которое вычисляется при сборе из других метрик."""
+
+    kind = 'gauge'
+
+    def __init__(self, registry, name, documentation, function):
+        super().__init__(registry, name, documentation)
+        self.function = function
+
+    def render(self, collected):
+        value = self.function(collected)
+        if value is None:
+            return []
+        return self.header() + [f'{self.name} {_number(value)}']
+
+
+class Registry:
+    """Метрики процесса в шардах потоков и их общий сбор через SQLite.
+
+    Шард завершившегося потока при заведении нового вливается в шард
+    процесса, так что число шардов не растёт с числом запросов.
+    Процесс раз в METRICS_FLUSH_INTERVAL секунд прибавляет к суммам
+    в METRICS_STORE прирост с прошлого сброса, поэтому в хранилище одна
+    строка на серию, сколько бы воркеров ни сменилось.
+    """
+
+    def __init__(self):
+        self.metrics = []
+        self.lock = threading.Lock()
+        self._reset()
+        # Ребёнок gunicorn не должен считать наблюдения родителя своими.
+        os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        self.local = threading.local()
+        self.shards = {}
+        self.retired = {}
+        # Итоги на момент последнего сброса: от них считается прирост.
+        self.flushed_totals = {}
+        self.flush_lock = threading.Lock()
+        self.ready_stores = set()
+        self.flushed = time.monotonic()
+
+    def shard(self):
+        shard = getattr(self.local, 'shard', None)
+        if shard is None:
+            shard = self.local.shard = {}
+            with self.lock:
+                self._retire_finished()
+                self.shards[threading.current_thread()] = shard
+        return shard
+
+    def counter(self, name, documentation):
+        return self._register(Counter(self, name, documentation))
+
+    def histogram(self, name, documentation, buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(self, name, documentation, buckets))
+
+    def gauge(self, name, documentation, function):
+        return self._register(Gauge(self, name, documentation, function))
+
+    def _register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def _merge(self, target, items):
+        by_name = {metric.name: metric for metric in self.metrics}
+        for (name, pairs), values in items:
+            metric = by_name.get(name)
+            if metric is None:
+                continue
+            if (name, pairs) not in target:
+                target[name, pairs] = metric.empty()
+            metric.merge(target[name, pairs], list(values))
+
+    def _retire_finished(self):
+        for thread in [thread for thread in self.shards
+                       if not thread.is_alive()]:
+            self._merge(self.retired, self.shards.pop(thread).items())
+
+    def totals(self):
+        """Итоги этого процесса: {(имя, метки): значения}."""
+        with self.lock:
+            self._retire_finished()
+            totals = {}
+            self._merge(totals, self.retired.items())
+            for shard in list(self.shards.values()):
+                # Копия под GIL: поток-владелец тем временем может
+                # добавить в шард новый ключ.
+                self._merge(totals, list(shard.items()))
+        return totals
+
+    def _store(self, timeout=STORE_TIMEOUT):
+        path = settings.METRICS_STORE
+        connection = sqlite3.connect(
+            path, timeout=timeout, isolation_level=None,
+        )
+        if path not in self.ready_stores:
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS metric_totals ('
+                'name TEXT, labels TEXT, value TEXT, '
+                'PRIMARY KEY (name, labels))'
+            )
+            self.ready_stores.add(path)
+        return connection
+
+    def _increments(self, totals):
+        increments = {}
+        for key, values in totals.items():
+            before = self.flushed_totals.get(key, [0] * len(values))
+            delta = [now - then for now, then in zip(values, before)]
+            if any(delta):
+                increments[key] = delta
+        return increments
+
+    def flush(self, timeout=STORE_TIMEOUT):
+        """Прибавляет к общим суммам прирост итогов процесса."""
+        with self.flush_lock:
+            self._flush(timeout)
+
+    def _flush(self, timeout):
+        self.flushed = time.monotonic()
+        totals = self.totals()
+        increments = self._increments(totals)
+        with closing(self._store(timeout)) as connection:
+            if not increments:
+                return
+            with connection:
+                connection.execute('BEGIN IMMEDIATE')
+                stored = dict(
+                    ((name, labels), json.loads(value))
+                    for name, labels, value in connection.execute(
+                        'SELECT name, labels, value FROM metric_totals'
+                    )
+                )
+                rows = []
+                for (name, pairs), delta in increments.items():
+                    labels = json.dumps(pairs)
+                    value = stored.get((name, labels))
+                    if value is not None:
+                        delta = [a + b for a, b in zip(value, delta)]
+                    rows.append((name, labels, json.dumps(delta)))
+                connection.executemany(
+                    'INSERT OR REPLACE INTO metric_totals VALUES (?, ?, ?)',
+                    rows,
+                )
+        # Только после коммита: неудачный сброс повторится целиком.
+        self.flushed_totals = totals
+
+    def flush_if_due(self):
+        """Сброс из пути запроса: не чаще METRICS_FLUSH_INTERVAL.
+
+        Если сбрасывает другой поток или хранилище занято, запрос
+        не ждёт — прирост уйдёт в следующий раз.
+        """
+        if time.monotonic() - self.flushed < settings.METRICS_FLUSH_INTERVAL:
+            return
+        if not self.flush_lock.acquire(blocking=False):
+            return
+        try:
+            self._flush(REQUEST_STORE_TIMEOUT)
+        except sqlite3.Error:
+            pass
+        finally:
+            self.flush_lock.release()
+
+    def collect(self):
+        """Общие суммы всех воркеров: {имя: {метки: значения}}."""
+        self.flush()
+        with closing(self._store()) as connection:
+            rows = connection.execute(
+                'SELECT name, labels, value FROM metric_totals'
+            ).fetchall()
+        totals = {}
+        self._merge(totals, (
+            ((name, tuple(map(tuple, json.loads(labels)))),
+             json.loads(value))
+            for name, labels, value in rows
+        ))
+        collected = {}
+        for (name, pairs), values in totals.items():
+            collected.setdefault(name, {})[pairs] = values
+        return collected
+
+    def render(self):
+        collected = self.collect()
+        lines = []
+        for metric in self.metrics:
+            if isinstance(metric, Gauge):
+                lines.extend(metric.render(collected))
+                continue
+            series = sorted(collected.get(metric.name, {}).items())
+            if series:
+                lines.extend(metric.render(series))
+        return '\n'.join(lines) + '\n'
+
+    def clear(self):
+        """Обнуляет метрики этого процесса."""
+        with self.lock:
+            for shard in self.shards.values():
+                shard.clear()
+            self.retired.clear()
+            self.flushed_totals = {}
+
+
+def _total(collected, name, **labels):
+    wanted = set(labels.items())
+    return sum(
+        values[0] for pairs, values in collected.get(name, {}).items()
+        if wanted <= set(pairs)
+    )
+
+
+def _cache_hit_ratio(collected):
+    hits = _total(collected, 'yatube_cache_requests_total', result='hit')
+    requests = _total(collected, 'yatube_cache_requests_total')
+    return hits / requests if requests else None
+
+
+REGISTRY = Registry()
+
+REQUESTS = REGISTRY.counter(
+    'yatube_requests_total', 'Обработанные запросы по view и статусу.'
+)
+REQUEST_LATENCY = REGISTRY.histogram(
+    'yatube_request_duration_seconds', 'Время ответа по view.'
+)
+REQUEST_QUERIES = REGISTRY.histogram(
+    'yatube_request_queries', 'Число запросов к базе за запрос по view.',
+    buckets=QUERY_BUCKETS,
+)
+REQUEST_DB_TIME = REGISTRY.histogram(
+    'yatube_request_db_seconds', 'Время в базе за запрос по view.'
+)
+CACHE_REQUESTS = REGISTRY.counter(
+    'yatube_cache_requests_total', 'Чтения кэша: попадания и промахи.'
+)
+CACHE_HIT_RATIO = REGISTRY.gauge(
+    'yatube_cache_hit_ratio', 'Доля попаданий в кэш с запуска процесса.',
+    _cache_hit_ratio,
+)
+UPLOAD_SIZE = REGISTRY.histogram(
+    'yatube_upload_size_bytes', 'Размер загруженных картинок.',
+    buckets=SIZE_BUCKETS,
+)
+
+
+def observe_request(view, status, stats, total):
+    """Записывает в реестр статистику одного запроса."""
+    REQUESTS.inc(view=view, status=status)
+    REQUEST_LATENCY.observe(total, view=view)
+    REQUEST_QUERIES.observe(stats.counts['db'], view=view)
+    REQUEST_DB_TIME.observe(stats.durations['db'], view=view)
+    if stats.counts['cache_hits']:
+        CACHE_REQUESTS.inc(stats.counts['cache_hits'], result='hit')
+    if stats.counts['cache_misses']:
+        CACHE_REQUESTS.inc(stats.counts['cache_misses'], result='miss')
+    REGISTRY.flush_if_due()
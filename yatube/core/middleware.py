@@ -0,0 +1,169 @@
+import json
+import logging
+import random
+import threading
+import time
+
+from django.conf import settings
+
+from . import metrics, profiling, timing
+from .routers import replica_reads
+
+logger = logging.getLogger(__name__)
+
+SAFE_METHODS = ('GET', 'HEAD')
+
+
+class ReplicaMiddleware:
+    """Отдаёт чтения GET-запросов репликам, сохраняя read-your-writes.
+
+    Запрос, который что-то записал, ставит cookie: пока она жива, все
+    запросы этого клиента читают из основной базы и видят свою запись,
+    даже если реплика отстаёт.
+    """
+
+    cookie_name = 'primary_reads'
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        enabled = (
+            request.method in SAFE_METHODS
+            and self.cookie_name not in request.COOKIES
+        )
+        with replica_reads(enabled) as state:
+            response = self.get_response(request)
+            wrote = state.wrote
+        if wrote:
+            response.set_cookie(
+                self.cookie_name,
+                '1',
+                max_age=settings.READ_YOUR_WRITES_SECONDS,
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
+
+
+class MetricsMiddleware:
+    """Пишет время, запросы к базе и обращения к кэшу в реестр метрик.
+
+    Считает каждый запрос; метка view — имя URL вида posts:index,
+    а для адресов, которые не разрешились, — unmatched, чтобы число
+    рядов в реестре оставалось ограниченным.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with timing.request() as stats:
+            response = self.get_response(request)
+        match = request.resolver_match
+        metrics.observe_request(
+            match.view_name if match else 'unmatched',
+            response.status_code,
+            stats,
+            stats.elapsed(),
+        )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # Имя view нужно журналу медленных запросов уже во время view.
+        stats = timing.current()
+        if stats is not None:
+            stats.view = request.resolver_match.view_name
+
+
+class TimingMiddleware:
+    """Разбивает время выборочных запросов по частям.
+
+    Для доли REQUEST_TIMING_SAMPLE_RATE запросов считает запросы к базе
+    и их время, отрисовку шаблонов, попадания в кэш и работу с
+    миниатюрами; отдаёт это заголовком Server-Timing и строкой JSON
+    в лог core.middleware. Статистику берёт у MetricsMiddleware, если
+    тот стоит выше, и собирает сама, если его нет.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if random.random() >= settings.REQUEST_TIMING_SAMPLE_RATE:
+            return self.get_response(request)
+        with timing.request() as stats:
+            response = self.get_response(request)
+        total = stats.elapsed()
+        response['Server-Timing'] = self.header(stats, total)
+        logger.info(json.dumps(
+            self.record(request, response, stats, total), ensure_ascii=False
+        ))
+        return response
+
+    @staticmethod
+    def header(stats, total):
+        durations, counts = stats.durations, stats.counts
+        return ', '.join([
+            f'db;dur={durations["db"] * 1000:.1f};'
+            f'desc="{counts["db"]} queries"',
+            f'tpl;dur={durations["tpl"] * 1000:.1f}',
+            f'thumb;dur={durations["thumb"] * 1000:.1f}',
+            f'cache;desc="{counts["cache_hits"]} hits '
+            f'{counts["cache_misses"]} misses"',
+            f'total;dur={total * 1000:.1f}',
+        ])
+
+    @staticmethod
+    def record(request, response, stats, total):
+        match = request.resolver_match
+        return {
+            'method': request.method,
+            'path': request.path,
+            'view': match.view_name if match else None,
+            'status': response.status_code,
+            'total_ms': round(total * 1000, 2),
+            'db_ms': round(stats.durations['db'] * 1000, 2),
+            'queries': stats.counts['db'],
+            'tpl_ms': round(stats.durations['tpl'] * 1000, 2),
+            'thumb_ms': round(stats.durations['thumb'] * 1000, 2),
+            'cache_hits': stats.counts['cache_hits'],
+            'cache_misses': stats.counts['cache_misses'],
+        }
+
+
+class ProfilerMiddleware:
+    """Профилирует запрос сотрудника по заголовку X-Profile или ?_profile.
+
+    Стоит после AuthenticationMiddleware: для всех остальных запросов
+    это одна проверка заголовка и строки запроса. Имя сохранённого
+    профиля возвращается в заголовке X-Profile.
+    """
+
+    header = 'HTTP_X_PROFILE'
+    param = '_profile'
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def requested(self, request):
+        return (
+            (self.header in request.META or self.param in request.GET)
+            and request.user.is_staff
+        )
+
+    def __call__(self, request):
+        if not self.requested(request):
+            return self.get_response(request)
+        started = time.perf_counter()
+        with profiling.Sampler(
+            threading.get_ident(), settings.PROFILER_INTERVAL
+        ) as sampler:
+            response = self.get_response(request)
+        match = request.resolver_match
+        response['X-Profile'] = profiling.save(
+            sampler.stacks,
+            match.view_name if match else None,
+            time.perf_counter() - started,
+        )
+        return response
@@ -0,0 +1,121 @@
+"""Выборочный профилировщик одного запроса по требованию.
+
+Пока идёт запрос, фоновый поток раз в PROFILER_INTERVAL секунд снимает
+стек потока запроса через sys._current_frames(). Результат сохраняется
+в PROFILER_DIR в свёрнутом формате (стек через «;», пробел, число
+выборок), который читают flamegraph.pl и speedscope.
+"""
+import os
+import re
+import sys
+import threading
+import uuid
+from collections import Counter
+from contextlib import suppress
+from datetime import datetime, timezone
+
+from django.conf import settings
+
+EXTENSION = '.collapsed'
+# 20261018-142501-posts-profile-85ms-1a2b3c.collapsed
+NAME_RE = re.compile(
+    r'^(?P<started>\d{8}-\d{6})-(?P<view>[\w-]+)-(?P<ms>\d+)ms-[0-9a-f]{6}'
+    + re.escape(EXTENSION) + '$'
+)
+
+
+class Sampler:
+    """Снимает стеки потока thread_id, пока открыт блок with."""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[collapse(frame)] += 1
+
+
+def collapse(frame):
+    """Стек от внешнего вызова к текущему: «модуль:функция;...»."""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        module = frame.f_globals.get('__name__', '?')
+        names.append(f'{module}:{code.co_name}')
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+def save(stacks, view, seconds):
+    """Пишет профиль в PROFILER_DIR и возвращает имя файла.
+
+    Старые файлы сверх PROFILER_KEEP удаляются, чтобы каталог
+    на боевом сервере не рос без конца.
+    """
+    os.makedirs(settings.PROFILER_DIR, exist_ok=True)
+    started = datetime.now(timezone.utc).strftime('%Y%m%d-%H%M%S')
+    view = re.sub(r'[^\w-]', '-', view or 'unmatched')
+    name = (
+        f'{started}-{view}-{round(seconds * 1000)}ms-'
+        f'{uuid.uuid4().hex[:6]}{EXTENSION}'
+    )
+    path = os.path.join(settings.PROFILER_DIR, name)
+    with open(path + '.tmp', 'w', encoding='utf-8') as output:
+        for stack, count in stacks.most_common():
+            output.write(f'{stack} {count}\n')
+    os.replace(path + '.tmp', path)
+    for old in list_profiles()[settings.PROFILER_KEEP:]:
+        # Тот же файл может удалить соседний запрос, закончившийся
+        # одновременно с этим.
+        with suppress(FileNotFoundError):
+            os.remove(os.path.join(settings.PROFILER_DIR, old['name']))
+    return name
+
+
+def list_profiles():
+    """Сохранённые профили, новые первыми."""
+    if not os.path.isdir(settings.PROFILER_DIR):
+        return []
+    profiles = []
+    for name in os.listdir(settings.PROFILER_DIR):
+        match = NAME_RE.match(name)
+        if match is None:
+            continue
+        try:
+            size = os.path.getsize(os.path.join(settings.PROFILER_DIR, name))
+        except FileNotFoundError:
+            # Удалён другим запросом между listdir и getsize.
+            continue
+        profiles.append({
+            'name': name,
+            'started': datetime.strptime(
+                match.group('started'), '%Y%m%d-%H%M%S'
+            ).replace(tzinfo=timezone.utc),
+            'view': match.group('view'),
+            'ms': int(match.group('ms')),
+            'size': size,
+        })
+    return sorted(profiles, key=lambda profile: profile['name'],
+                  reverse=True)
+
+
+def profile_path(name):
+    """Путь к профилю по имени или None, если такого нет."""
+    if NAME_RE.match(name) is None:
+        return None
+    path = os.path.join(settings.PROFILER_DIR, name)
+    return path if os.path.isfile(path) else None
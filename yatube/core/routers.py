@@ -0,0 +1,68 @@
+import random
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+_local = threading.local()
+# Приложения, которые всегда читаются из основной базы: сессия только
+# что вошедшего пользователя должна находиться и при отставшей реплике.
+PRIMARY_APPS = {'sessions'}
+
+
+def read_alias():
+    """Алиас базы, с которой сейчас читает ORM.
+
+    Реплика выбирается только внутри replica_reads() и только до первой
+    записи: всё, что читается после неё, должно видеть её результат.
+    """
+    replica = getattr(_local, 'replica', None)
+    if replica is None or _local.wrote:
+        return DEFAULT_DB_ALIAS
+    return replica
+
+
+@contextmanager
+def replica_reads(enabled=True):
+    """Отмечает границы запроса; при enabled разрешает читать с реплики.
+
+    Реплика выбирается одна на весь запрос, чтобы его чтения видели
+    одно состояние данных. Возвращает состояние, в котором wrote
+    говорит, писал ли запрос в базу.
+    """
+    previous = (
+        getattr(_local, 'replica', None), getattr(_local, 'wrote', False)
+    )
+    replicas = settings.DATABASE_REPLICAS
+    _local.replica = random.choice(replicas) if enabled and replicas else None
+    _local.wrote = False
+    try:
+        yield _local
+    finally:
+        _local.replica, _local.wrote = previous
+
+
+class ReplicaRouter:
+    """Пишет в основную базу, читает с реплик из DATABASE_REPLICAS.
+
+    Вне replica_reads() — в командах, оболочке, сигналах вне запроса —
+    всё идёт в основную базу.
+    """
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label in PRIMARY_APPS:
+            return DEFAULT_DB_ALIAS
+        return read_alias()
+
+    def db_for_write(self, model, **hints):
+        _local.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # На всех алиасах одни и те же данные.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Реплика получает схему вместе с данными от основной базы.
+        return db not in settings.DATABASE_REPLICAS
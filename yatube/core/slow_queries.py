@@ -0,0 +1,228 @@
+"""Журнал медленных запросов к базе с планом выполнения.
+
+Запрос дольше SLOW_QUERY_MS попадает строкой JSON в лог
+core.slow_queries (в настройках — ротируемый файл SLOW_QUERY_LOG):
+SQL, параметры чтений, view и место вызова, время и EXPLAIN QUERY PLAN.
+Полный проход по таблице отмечается отдельно — это самая частая
+причина деградации ленты после правки запроса или индекса.
+"""
+import json
+import logging
+import os
+import re
+import traceback
+from collections import defaultdict
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.db import DatabaseError
+
+logger = logging.getLogger(__name__)
+
+CORE_DIR = os.path.dirname(os.path.abspath(__file__))
+# SCAN posts_post, SCAN TABLE posts_post AS p (SQLite до 3.36), в том
+# числе USING [COVERING] INDEX: проход по всему индексу — тот же полный
+# проход. Исключение — индексный проход в запросе со своим LIMIT и без
+# временного B-дерева, как у ленты по pub_date: он останавливается
+# на первой странице.
+FULL_SCAN_RE = re.compile(
+    r'^SCAN (?:TABLE )?(\w+)(?: AS \w+)?'
+    r'(?P<index> USING (?:COVERING )?INDEX \w+)?$'
+)
+# Узлы плана, под которыми идут шаги вложенного SELECT.
+SUBQUERY_RE = re.compile(r'^(?:CO-ROUTINE|MATERIALIZE)\b|\bSUBQUERY\b')
+LIMIT_RE = re.compile(r'\bLIMIT\b', re.IGNORECASE)
+# Строки плана — дерево: отступ в PLAN_INDENT пробелов на уровень.
+PLAN_INDENT = '  '
+# Журнал — обычный текстовый файл, поэтому параметры пишутся только
+# для чтений и не для таблиц с сессиями и хэшами паролей.
+PARAMS_STATEMENTS = ('SELECT', 'WITH')
+SECRET_TABLES_RE = re.compile(r'\b(?:django_session|auth_user)\b')
+# EXPLAIN в SQLite сам запрос не выполняет, так что и запись безопасна.
+EXPLAINED_STATEMENTS = ('SELECT', 'WITH', 'UPDATE', 'DELETE')
+# Планы храним по тексту SQL: параметры план в SQLite почти не меняют,
+# а повторный EXPLAIN для каждого медленного запроса удвоил бы нагрузку.
+PLAN_CACHE_SIZE: int = 500
+
+_plans = {}
+
+
+def threshold():
+    """Порог в секундах или None, если журнал выключен."""
+    milliseconds = settings.SLOW_QUERY_MS
+    return None if milliseconds is None else milliseconds / 1000
+
+
+def explain(connection, sql, params):
+    """Строки плана запроса; только для SQLite, для остальных — []."""
+    if connection.vendor != 'sqlite':
+        return []
+    if not sql.lstrip().upper().startswith(EXPLAINED_STATEMENTS):
+        return []
+    if sql in _plans:
+        return _plans[sql]
+    # create_cursor — курсор без обёрток execute_wrapper, иначе EXPLAIN
+    # сам попал бы в статистику запроса и в этот журнал.
+    cursor = connection.create_cursor()
+    try:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        rows = cursor.fetchall()
+    except DatabaseError as error:
+        return [f'EXPLAIN не удался: {error}']
+    finally:
+        cursor.close()
+    # Строки приходят в порядке обхода: родитель раньше детей.
+    depths, plan = {}, []
+    for node, parent, _, detail in rows:
+        depths[node] = depths[parent] + 1 if parent in depths else 0
+        plan.append(PLAN_INDENT * depths[node] + detail)
+    if len(_plans) < PLAN_CACHE_SIZE:
+        _plans[sql] = plan
+    return plan
+
+
+def statement_texts(sql):
+    """Текст внешнего запроса и вложенных SELECT без их подзапросов."""
+    texts, stack, quote = [], [[]], None
+    for char in sql:
+        if quote:
+            stack[-1].append(char)
+            quote = None if char == quote else quote
+        elif char in '\'"':
+            stack[-1].append(char)
+            quote = char
+        elif char == '(':
+            stack.append([])
+        elif char == ')' and len(stack) > 1:
+            text = ''.join(stack.pop())
+            if text.lstrip().upper().startswith(('SELECT', 'WITH')):
+                texts.append(text)
+            stack[-1].append('()')
+        else:
+            stack[-1].append(char)
+    return ''.join(stack[0]), texts
+
+
+def plan_owners(plan):
+    """Для каждой строки плана — номер строки её SELECT, None — внешний."""
+    owners, path = [], []
+    for line in plan:
+        depth = (len(line) - len(line.lstrip(' '))) // len(PLAN_INDENT)
+        del path[depth:]
+        owner = next((index for index in reversed(path)
+                      if SUBQUERY_RE.search(plan[index].strip())), None)
+        owners.append(owner)
+        path.append(len(owners) - 1)
+    return owners
+
+
+def full_scans(plan, sql=''):
+    """Таблицы, которые план запроса sql проходит целиком.
+
+    Индексный проход не считается полным, только если LIMIT есть у того
+    же SELECT и сортировка не идёт через временное B-дерево: с ним
+    читаются все строки, сколько бы ни вернул LIMIT. Какому вложенному
+    SELECT принадлежит узел плана, по тексту не узнать, поэтому для них
+    LIMIT нужен у всех вложенных SELECT.
+    """
+    outer, nested = statement_texts(sql)
+    nested_bounded = bool(nested) and all(map(LIMIT_RE.search, nested))
+    owners = plan_owners(plan)
+    sorted_in_temp = {
+        owner for owner, line in zip(owners, plan)
+        if line.strip().startswith('USE TEMP B-TREE')
+    }
+    scans = []
+    for owner, line in zip(owners, plan):
+        match = FULL_SCAN_RE.match(line.strip())
+        if match is None:
+            continue
+        if owner is None:
+            bounded = LIMIT_RE.search(outer) is not None
+        else:
+            bounded = nested_bounded
+        if not (match.group('index') and bounded
+                and owner not in sorted_in_temp):
+            scans.append(match.group(1))
+    return scans
+
+
+def loggable_params(sql, params, many):
+    """Параметры для журнала или None, если их нельзя писать в файл."""
+    if many or not sql.lstrip().upper().startswith(PARAMS_STATEMENTS):
+        return None
+    if SECRET_TABLES_RE.search(sql):
+        return None
+    return params
+
+
+def call_site():
+    """Ближайший к запросу кадр кода проекта вне core, «файл:строка»."""
+    for frame in reversed(traceback.extract_stack()):
+        filename = os.path.abspath(frame.filename)
+        if (filename.startswith(settings.BASE_DIR)
+                and not filename.startswith(CORE_DIR)):
+            path = os.path.relpath(filename, settings.BASE_DIR)
+            return f'{path}:{frame.lineno} in {frame.name}'
+    return None
+
+
+def check(connection, sql, params, many, seconds, view):
+    """Пишет запрос в журнал, если он медленнее порога."""
+    limit = threshold()
+    if limit is None or seconds < limit:
+        return
+    plan = [] if many else explain(connection, sql, params)
+    record = {
+        'time': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'duration_ms': round(seconds * 1000, 2),
+        'database': connection.alias,
+        'view': view,
+        'call_site': call_site(),
+        'sql': sql,
+        'params': loggable_params(sql, params, many),
+        'plan': plan,
+        'full_scan': full_scans(plan, sql),
+    }
+    logger.warning(json.dumps(record, ensure_ascii=False, default=str))
+
+
+def read_log(path):
+    """Записи журнала вместе с ротированными файлами path.1, path.2..."""
+    paths = [path]
+    while os.path.exists(f'{path}.{len(paths)}'):
+        paths.append(f'{path}.{len(paths)}')
+    records = []
+    for name in paths:
+        if not os.path.exists(name):
+            continue
+        with open(name, encoding='utf-8') as log:
+            for line in log:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    continue
+    return records
+
+
+def report(records):
+    """Сводка по тексту SQL, самые затратные запросы первыми."""
+    groups = defaultdict(list)
+    for record in records:
+        groups[record['sql']].append(record)
+    rows = []
+    for sql, group in groups.items():
+        durations = [record['duration_ms'] for record in group]
+        last = max(group, key=lambda record: record['time'])
+        rows.append({
+            'sql': sql,
+            'count': len(group),
+            'total_ms': round(sum(durations), 2),
+            'max_ms': max(durations),
+            'avg_ms': round(sum(durations) / len(group), 2),
+            'views': sorted({record['view'] for record in group
+                             if record['view']}),
+            'last': last,
+            'full_scan': last['full_scan'],
+        })
+    return sorted(rows, key=lambda row: row['total_ms'], reverse=True)
@@ -0,0 +1,29 @@
+from django.template import TemplateDoesNotExist
+from django.template.backends.django import DjangoTemplates as BaseBackend
+from django.template.backends.django import Template as BaseTemplate
+from django.template.backends.django import reraise
+
+from . import timing
+
+
+class Template(BaseTemplate):
+    def render(self, context=None, request=None):
+        with timing.measure('tpl'):
+            return super().render(context, request)
+
+
+class DjangoTemplates(BaseBackend):
+    """Шаблоны Django, время отрисовки которых идёт в статистику запроса.
+
+    Меряется только шаблон, отданный бэкендом, то есть render() во вьюхе;
+    вложенные include входят в его время.
+    """
+
+    def from_string(self, template_code):
+        return Template(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return Template(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
@@ -0,0 +1,20 @@
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class TestRunner(DiscoverRunner):
+    """Запуск тестов без выборочных замеров запросов.
+
+    С долей REQUEST_TIMING_SAMPLE_RATE из настроек в вывод тестов
+    случайно попадали бы строки лога; тесты самой выборки задают долю
+    через override_settings.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._quiet_timing = override_settings(REQUEST_TIMING_SAMPLE_RATE=0)
+        self._quiet_timing.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._quiet_timing.disable()
+        super().teardown_test_environment(**kwargs)
@@ -0,0 +1,116 @@
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from django.db import connections
+
+from . import slow_queries
+
+_local = threading.local()
+
+
+class RequestTiming:
+    """Сколько времени и обращений ушло на части одного запроса.
+
+    durations — секунды по метрикам (db, tpl, thumb), counts — число
+    событий (запросы к базе, попадания и промахи кэша).
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.durations = Counter()
+        self.counts = Counter()
+        self.muted = 0
+        self.view = None
+
+    def add(self, name, seconds, count=1):
+        self.durations[name] += seconds
+        self.counts[name] += count
+
+    def execute(self, execute, sql, params, many, context):
+        """Обёртка курсора Django: время и число запросов к базе.
+
+        Медленный запрос заодно уходит в журнал slow_queries.
+        """
+        started = time.perf_counter()
+        try:
+            result = execute(sql, params, many, context)
+        finally:
+            seconds = time.perf_counter() - started
+            self.add('db', seconds)
+        slow_queries.check(
+            context['connection'], sql, params, many, seconds, self.view
+        )
+        return result
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+
+def current():
+    """Статистика текущего запроса или None, если её никто не собирает."""
+    return getattr(_local, 'timing', None)
+
+
+@contextmanager
+def collect():
+    """Собирает статистику кода внутри блока в новый RequestTiming."""
+    previous, _local.timing = current(), RequestTiming()
+    try:
+        yield _local.timing
+    finally:
+        _local.timing = previous
+
+
+@contextmanager
+def request():
+    """Статистика запроса вместе с запросами к базе на всех соединениях.
+
+    Если внешний слой уже собирает статистику, отдаёт её же, чтобы
+    запросы к базе не считались дважды.
+    """
+    timing = current()
+    if timing is not None:
+        yield timing
+        return
+    with collect() as timing, ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(timing.execute))
+        yield timing
+
+
+@contextmanager
+def measure(name):
+    """Добавляет время блока к метрике name текущего запроса."""
+    timing = current()
+    if timing is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timing.add(name, time.perf_counter() - started)
+
+
+@contextmanager
+def muted():
+    """Не считает обращения к кэшу внутри блока — их посчитает вызвавший."""
+    timing = current()
+    if timing is None:
+        yield
+        return
+    timing.muted += 1
+    try:
+        yield
+    finally:
+        timing.muted -= 1
+
+
+def count_cache(hits, misses):
+    timing = current()
+    if timing is None or timing.muted:
+        return
+    timing.counts['cache_hits'] += hits
+    timing.counts['cache_misses'] += misses
@@ -1,4 +1,15 @@
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import FileResponse, Http404, HttpResponse
 from django.shortcuts import render
+from django.utils.crypto import constant_time_compare
+
+from . import metrics as registry
+from . import profiling
+from . import slow_queries as journal
+
+METRICS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
 
 
 def page_not_found(request, exception):
@@ -15,3 +26,56 @@ def permission_denied(request, exception):
 
 def server_error(request):
     return render(request, 'core/500.html', status=500)
+
+
+def metrics(request):
+    """Метрики всех воркеров в текстовом формате Prometheus.
+
+    Сборщик передаёт METRICS_TOKEN заголовком Authorization: Bearer.
+    Без верного токена, а также пока токен не задан, отвечаем 404,
+    как на любой несуществующий адрес.
+    """
+    token = settings.METRICS_TOKEN
+    if not token or not constant_time_compare(
+        request.META.get('HTTP_AUTHORIZATION', ''), f'Bearer {token}'
+    ):
+        return page_not_found(request, None)
+    return HttpResponse(
+        registry.REGISTRY.render(), content_type=METRICS_CONTENT_TYPE
+    )
+
+
+@staff_member_required
+def slow_queries(request):
+    """Отчёт админки по журналу медленных запросов."""
+    rows = journal.report(journal.read_log(settings.SLOW_QUERY_LOG))
+    context = {
+        **admin.site.each_context(request),
+        'title': 'Медленные запросы',
+        'rows': rows,
+        'threshold': settings.SLOW_QUERY_MS,
+        'full_scans': sum(bool(row['full_scan']) for row in rows),
+    }
+    return render(request, 'core/slow_queries.html', context)
+
+
+@staff_member_required
+def profiles(request):
+    """Список профилей запросов, снятых ProfilerMiddleware."""
+    context = {
+        **admin.site.each_context(request),
+        'title': 'Профили запросов',
+        'profiles': profiling.list_profiles(),
+    }
+    return render(request, 'core/profiles.html', context)
+
+
+@staff_member_required
+def profile_file(request, name):
+    path = profiling.profile_path(name)
+    if path is None:
+        raise Http404
+    return FileResponse(
+        open(path, 'rb'), as_attachment=True, filename=name,
+        content_type='text/plain; charset=utf-8',
+    )
@@ -1,5 +1,6 @@
 from django.contrib import admin
 
+from . import search
 from .models import Group, Post
 
 
@@ -16,6 +17,14 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        # Ищем по индексу FTS5, а не LIKE '%...%' по всей таблице.
+        if not search_term.strip():
+            return queryset, False
+        return search.search_posts(
+            search_term, queryset, kinds=(search.POST,)
+        ), False
+
 
 admin.site.register(Post, PostAdmin)
 admin.site.register(Group)
@@ -0,0 +1,201 @@
+import hashlib
+import json
+
+from django.http import JsonResponse
+from django.views.decorators.http import condition, require_GET, require_POST
+
+from core.db import retry_on_lock
+
+from . import batch, timeline
+from .cache import (
+    INDEX_SCOPE, author_scope, feed_version, follow_scope, group_scope,
+    post_scope,
+)
+from .models import Group, Post, User
+from .utils import COMMENTS_PAGE, PAGINATOR_PAGE, get_cursor_page
+
+API_VERSION = 'v1'
+
+
+def api_response(data, status=200):
+    return JsonResponse(
+        data, status=status, json_dumps_params={'ensure_ascii': False}
+    )
+
+
+def not_found():
+    return api_response({'detail': 'Не найдено.'}, status=404)
+
+
+def serialize_post(post):
+    # Без comments_count: новый комментарий сдвигает только post_scope,
+    # и ETag ленты отдавал бы 304 с устаревшим числом. Счётчик есть
+    # в post_detail, чей ETag зависит от post_scope.
+    return {
+        'id': post.pk,
+        'text': post.text,
+        'pub_date': post.pub_date.isoformat(),
+        'author': {
+            'username': post.author.username,
+            'full_name': post.author.get_full_name(),
+        },
+        'group': post.group and {
+            'slug': post.group.slug,
+            'title': post.group.title,
+        },
+        'image': post.image.url if post.image else None,
+    }
+
+
+def serialize_comment(comment):
+    return {
+        'id': comment.pk,
+        'author': comment.author.username,
+        'text': comment.text,
+        'created': comment.created.isoformat(),
+    }
+
+
+def serialize_page(page, serializer):
+    return {
+        'results': [serializer(item) for item in page],
+        'next': page.next_cursor,
+        'previous': page.previous_cursor,
+    }
+
+
+def feed_etag(*scopes):
+    """ETag по версиям областей кэша, без чтения строк ленты.
+
+    Дата последнего поста не меняется при правке и удалении, а версия
+    области сдвигается при любой из них. В ключ входит и полный путь,
+    то есть курсор страницы.
+    """
+    def etag_func(request, *args, **kwargs):
+        resolved = [
+            scope(request, *args, **kwargs) if callable(scope) else scope
+            for scope in scopes
+        ]
+        if None in resolved:
+            return None
+        raw = '|'.join(
+            [API_VERSION, feed_version(*resolved), request.get_full_path()]
+        )
+        return hashlib.sha1(raw.encode()).hexdigest()
+    return condition(etag_func=etag_func)
+
+
+def _group_scope(request, slug):
+    group_id = Group.objects.filter(slug=slug).values_list(
+        'pk', flat=True
+    ).first()
+    return group_scope(group_id) if group_id else None
+
+
+def _author_scope(request, username):
+    author_id = User.objects.filter(username=username).values_list(
+        'pk', flat=True
+    ).first()
+    return author_scope(author_id) if author_id else None
+
+
+def _follow_scope(request):
+    if not request.user.is_authenticated:
+        return None
+    return follow_scope(request.user.pk)
+
+
+def _post_scope(request, post_id):
+    return post_scope(post_id)
+
+
+def feed_response(request, queryset):
+    page = get_cursor_page(queryset.feed(), request, per_page=PAGINATOR_PAGE)
+    return api_response(serialize_page(page, serialize_post))
+
+
+@require_GET
+@feed_etag(INDEX_SCOPE)
+def index(request):
+    return feed_response(request, Post.objects.all())
+
+
+@require_GET
+@feed_etag(_group_scope)
+def group_posts(request, slug):
+    group = Group.objects.filter(slug=slug).first()
+    if group is None:
+        return not_found()
+    return feed_response(request, group.posts.all())
+
+
+@require_GET
+@feed_etag(_author_scope)
+def profile(request, username):
+    author = User.objects.filter(username=username).first()
+    if author is None:
+        return not_found()
+    return feed_response(request, author.posts.all())
+
+
+@require_GET
+@feed_etag(INDEX_SCOPE, _follow_scope)
+def follow_index(request):
+    if not request.user.is_authenticated:
+        return api_response(
+            {'detail': 'Требуется авторизация.'}, status=401
+        )
+    return feed_response(request, timeline.follow_feed(request.user))
+
+
+@require_GET
+@feed_etag(_post_scope)
+def post_detail(request, post_id):
+    post = Post.objects.feed().filter(pk=post_id).first()
+    if post is None:
+        return not_found()
+    comments = get_cursor_page(
+        post.comments.select_related('author'),
+        request,
+        per_page=COMMENTS_PAGE,
+        field='created',
+    )
+    data = serialize_post(post)
+    data['comments_count'] = post.comments_count
+    data['comments'] = serialize_page(comments, serialize_comment)
+    return api_response(data)
+
+
+def batch_response(request, create):
+    if not request.user.is_authenticated:
+        return api_response(
+            {'detail': 'Требуется авторизация.'}, status=401
+        )
+    try:
+        items = json.loads(request.body)['items']
+    except (ValueError, KeyError, TypeError):
+        return api_response(
+            {'detail': 'Ожидается JSON вида {"items": [...]}.'}, status=400
+        )
+    if not isinstance(items, list) or len(items) > batch.BATCH_LIMIT:
+        return api_response(
+            {'detail': f'items — список не длиннее {batch.BATCH_LIMIT}.'},
+            status=400,
+        )
+    results = create(request.user, items)
+    return api_response({
+        'created': sum('id' in result for result in results),
+        'results': results,
+    })
+
+
+@require_POST
+@retry_on_lock
+def create_posts(request):
+    return batch_response(request, batch.create_posts)
+
+
+@require_POST
+@retry_on_lock
+def create_comments(request):
+    return batch_response(request, batch.create_comments)
@@ -0,0 +1,17 @@
+from django.urls import path
+
+from . import api
+
+app_name = 'api'
+
+urlpatterns = [
+    path('posts/', api.index, name='index'),
+    path('posts/batch/', api.create_posts, name='create_posts'),
+    path('comments/batch/', api.create_comments, name='create_comments'),
+    path('posts/<int:post_id>/', api.post_detail, name='post_detail'),
+    path('groups/<slug>/posts/', api.group_posts, name='group_list'),
+    path(
+        'profiles/<str:username>/posts/', api.profile, name='profile'
+    ),
+    path('follow/posts/', api.follow_index, name='follow_index'),
+]
@@ -0,0 +1,130 @@
+from collections import Counter
+
+from django.db import transaction
+
+from . import cache, counters, search, timeline
+from .forms import CommentForm, PostForm
+from .models import Comment, Post
+
+BATCH_LIMIT: int = 500
+BULK_BATCH_SIZE: int = 100
+
+
+def _errors(form):
+    return {field: list(errors) for field, errors in form.errors.items()}
+
+
+def _assign_pks(model, objs):
+    """Проставляет pk объектам после bulk_create, если база их не вернула.
+
+    SQLite в Django 2.2 не отдаёт id из bulk_create. Блокировку записи
+    транзакция держит с первого INSERT до коммита, а id в SQLite только
+    растут, поэтому последние len(objs) строк таблицы — наши, по порядку.
+    """
+    if not objs or objs[0].pk is not None:
+        return
+    pks = model.objects.order_by('-pk').values_list(
+        'pk', flat=True
+    )[:len(objs)]
+    for obj, pk in zip(objs, reversed(list(pks))):
+        obj.pk = pk
+
+
+def _validate(items, make_form):
+    """Проверяет элементы формами; возвращает (результаты, валидные формы)."""
+    results, valid = [], []
+    for index, item in enumerate(items):
+        form = make_form(item if isinstance(item, dict) else {})
+        if form.is_valid():
+            results.append({'index': index})
+            valid.append((results[-1], form))
+        else:
+            results.append({'index': index, 'errors': _errors(form)})
+    return results, valid
+
+
+def create_posts(author, items):
+    """Создаёт посты пачкой: одна транзакция и один INSERT на пачку.
+
+    Сигналы bulk_create не вызывает, поэтому счётчики, ленты подписчиков,
+    поисковый индекс и версии кэша обновляются здесь же, по разу на пачку.
+    """
+    results, valid = _validate(items, lambda data: PostForm(data=data))
+    posts = []
+    for _, form in valid:
+        post = form.save(commit=False)
+        post.author = author
+        posts.append(post)
+    if not posts:
+        return results
+    with transaction.atomic():
+        Post.objects.bulk_create(posts, batch_size=BULK_BATCH_SIZE)
+        _assign_pks(Post, posts)
+        counters.change_author_stats(author.pk, posts_count=len(posts))
+        timeline.fan_out_posts(author.pk, posts)
+        search.index_rows(
+            (search.POST, post.pk, post.pk, post.text) for post in posts
+        )
+    cache.bump(
+        cache.INDEX_SCOPE,
+        cache.author_scope(author.pk),
+        *{cache.group_scope(post.group_id)
+          for post in posts if post.group_id is not None},
+    )
+    for (result, _), post in zip(valid, posts):
+        result['id'] = post.pk
+    return results
+
+
+def _post_id(item):
+    """id поста из элемента пачки или None, если это не целое число.
+
+    bool — подкласс int, а 1.0 == 1, поэтому проверяем тип строго.
+    """
+    pk = item.get('post') if isinstance(item, dict) else None
+    return pk if type(pk) is int else None
+
+
+def create_comments(author, items):
+    """Создаёт комментарии к разным постам одной пачкой."""
+    post_ids = [_post_id(item) for item in items]
+    existing = set(
+        Post.objects.filter(
+            pk__in={pk for pk in post_ids if pk is not None}
+        ).values_list('pk', flat=True)
+    )
+    results, valid = _validate(items, lambda data: CommentForm(data=data))
+    for result in results:
+        if post_ids[result['index']] is None:
+            result.setdefault('errors', {})['post'] = [
+                'Нужен целый id поста.'
+            ]
+    comments, created = [], []
+    for result, form in valid:
+        post_id = post_ids[result['index']]
+        if post_id is None:
+            continue
+        if post_id not in existing:
+            result['errors'] = {'post': ['Пост не найден.']}
+            continue
+        comment = form.save(commit=False)
+        comment.author = author
+        comment.post_id = post_id
+        comments.append(comment)
+        created.append(result)
+    if not comments:
+        return results
+    per_post = Counter(comment.post_id for comment in comments)
+    with transaction.atomic():
+        Comment.objects.bulk_create(comments, batch_size=BULK_BATCH_SIZE)
+        _assign_pks(Comment, comments)
+        for post_id, total in per_post.items():
+            counters.change_comments_count(post_id, total)
+        search.index_rows(
+            (search.COMMENT, comment.pk, comment.post_id, comment.text)
+            for comment in comments
+        )
+    cache.bump(*(cache.post_scope(post_id) for post_id in per_post))
+    for result, comment in zip(created, comments):
+        result['id'] = comment.pk
+    return results
@@ -0,0 +1,80 @@
+import time
+
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+from core.routers import read_alias
+
+INDEX_SCOPE = 'index'
+GLOBAL_SCOPE = 'all'
+
+
+def group_scope(group_id):
+    return f'group:{group_id}'
+
+
+def author_scope(author_id):
+    return f'author:{author_id}'
+
+
+def post_scope(post_id):
+    return f'post:{post_id}'
+
+
+def follow_scope(user_id):
+    return f'follows:{user_id}'
+
+
+def post_scopes(post_id, author_id, group_id=None):
+    """Области, во фрагментах которых выводится пост."""
+    scopes = [INDEX_SCOPE, author_scope(author_id), post_scope(post_id)]
+    if group_id is not None:
+        scopes.append(group_scope(group_id))
+    return scopes
+
+
+def replica_scope(alias):
+    return f'replica:{alias}'
+
+
+def _version_key(scope):
+    return f'feed-version:{scope}'
+
+
+def _initial_version():
+    # После вытеснения ключа версия не должна вернуться к значению,
+    # под которым в кэше ещё могут лежать старые фрагменты.
+    return int(time.time() * 1000)
+
+
+def feed_version(*scopes):
+    """Токен поколения для ключей кэша ленты.
+
+    Содержит сами области и меняется при любой правке попадающих в них
+    данных; вместе с номером страницы даёт ключ фрагмента, который
+    не нужно сбрасывать по таймеру. Страница, прочитанная с реплики,
+    кэшируется отдельно и до следующей синхронизации реплики: иначе
+    её устаревшая копия легла бы под новую версию области.
+    """
+    alias = read_alias()
+    if alias != DEFAULT_DB_ALIAS:
+        scopes += (replica_scope(alias),)
+    keys = [_version_key(scope) for scope in (GLOBAL_SCOPE,) + scopes]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, _initial_version(), None)
+            versions[key] = cache.get(key)
+    return '{}@{}'.format(
+        ','.join(scopes), '.'.join(str(versions[key]) for key in keys)
+    )
+
+
+def bump(*scopes):
+    """Начинает новое поколение для перечисленных областей."""
+    for scope in scopes:
+        key = _version_key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, _initial_version(), None)
@@ -0,0 +1,116 @@
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import AuthorStats, Comment, Follow, Post, User
+
+RECONCILE_BATCH: int = 500
+AUTHOR_COUNTERS = {
+    'posts_count': (Post, 'author'),
+    'followers_count': (Follow, 'author'),
+    'following_count': (Follow, 'user'),
+}
+
+
+def change_author_stats(user_id, **deltas):
+    """Сдвигает счётчики пользователя одним UPDATE, при нужде создав строку.
+
+    Строку создаём только для прироста: уменьшать нечего, а при удалении
+    пользователя каскад убирает AuthorStats раньше его постов и подписок,
+    и новая строка ссылалась бы на удалённого пользователя.
+    """
+    changes = {field: F(field) + delta for field, delta in deltas.items()}
+    if AuthorStats.objects.filter(user_id=user_id).update(**changes):
+        return
+    if any(delta <= 0 for delta in deltas.values()):
+        return
+    AuthorStats.objects.bulk_create(
+        [AuthorStats(user_id=user_id)], ignore_conflicts=True
+    )
+    AuthorStats.objects.filter(user_id=user_id).update(**changes)
+
+
+def change_comments_count(post_id, delta):
+    Post.objects.filter(pk=post_id).update(
+        comments_count=F('comments_count') + delta
+    )
+
+
+def _count(model, field):
+    rows = model.objects.filter(
+        **{field: OuterRef('pk')}
+    ).order_by().values(field).annotate(total=Count('pk'))
+    return Coalesce(
+        Subquery(rows.values('total'), output_field=IntegerField()), 0
+    )
+
+
+def _id_batches(model, batch_size):
+    last = 0
+    while True:
+        ids = list(
+            model.objects.filter(pk__gt=last).order_by('pk').values_list(
+                'pk', flat=True
+            )[:batch_size]
+        )
+        if not ids:
+            return
+        yield ids
+        last = ids[-1]
+
+
+def reconcile_authors(batch_size=RECONCILE_BATCH):
+    """Пересчитывает счётчики пользователей пачками; число исправленных.
+
+    Каждая пачка читается и пишется в одной транзакции, чтобы не затереть
+    изменения, сделанные сигналами между подсчётом и записью.
+    """
+    fields = list(AUTHOR_COUNTERS)
+    annotations = {
+        field: _count(model, related)
+        for field, (model, related) in AUTHOR_COUNTERS.items()
+    }
+    fixed = 0
+    for ids in _id_batches(User, batch_size):
+        with transaction.atomic():
+            actual = User.objects.filter(pk__in=ids).annotate(
+                **{f'actual_{field}': value
+                   for field, value in annotations.items()}
+            ).values('pk', *(f'actual_{field}' for field in fields))
+            stored = AuthorStats.objects.select_for_update().in_bulk(ids)
+            changed, missing = [], []
+            for row in actual:
+                counts = {field: row[f'actual_{field}'] for field in fields}
+                stats = stored.get(row['pk'])
+                if stats is None:
+                    missing.append(AuthorStats(user_id=row['pk'], **counts))
+                elif any(
+                    getattr(stats, field) != value
+                    for field, value in counts.items()
+                ):
+                    for field, value in counts.items():
+                        setattr(stats, field, value)
+                    changed.append(stats)
+            AuthorStats.objects.bulk_update(changed, fields)
+            AuthorStats.objects.bulk_create(missing, ignore_conflicts=True)
+        fixed += len(changed) + len(missing)
+    return fixed
+
+
+def reconcile_posts(batch_size=RECONCILE_BATCH):
+    """Пересчитывает число комментариев постов пачками."""
+    fixed = 0
+    for ids in _id_batches(Post, batch_size):
+        with transaction.atomic():
+            changed = [
+                Post(pk=pk, comments_count=actual)
+                for pk, stored, actual in Post.objects.filter(
+                    pk__in=ids
+                ).annotate(
+                    actual=_count(Comment, 'post')
+                ).values_list('pk', 'comments_count', 'actual')
+                if stored != actual
+            ]
+            Post.objects.bulk_update(changed, ['comments_count'])
+        fixed += len(changed)
+    return fixed
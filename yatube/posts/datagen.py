@@ -0,0 +1,394 @@
+import bisect
+import io
+import multiprocessing
+import random
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from django.db.models import Case, Max, Value, When
+from django.utils import timezone
+from faker import Faker
+from PIL import Image
+
+from core.db import write_transaction
+
+from . import counters, search, timeline
+from .images import save_variants
+from .models import Comment, Follow, Group, Post, User
+
+BATCH_SIZE: int = 1000
+# Строк в одном UPDATE ... CASE, что проставляет даты после bulk_create.
+DATES_BATCH_SIZE: int = 300
+LOCALE = 'ru_RU'
+# Показатель закона Ципфа: доля постов и подписчиков у первых авторов.
+ZIPF_EXPONENT: float = 1.1
+# Показатель Парето для числа подписок: у большинства их мало.
+FOLLOWS_SHAPE: float = 1.5
+GROUP_SHARE: float = 0.5
+# Активность по часам суток: ночью пишут вдесятеро реже, чем вечером.
+HOURLY_ACTIVITY = (
+    2, 1, 1, 1, 1, 2, 4, 7, 9, 10, 10, 11,
+    12, 12, 11, 11, 12, 14, 17, 20, 20, 17, 10, 5,
+)
+# Всплески: раз в BURST_EVERY_DAYS дней на несколько часов активность
+# растёт в BURST_FACTOR раз — новости, споры, праздники.
+BURST_EVERY_DAYS: int = 7
+BURST_HOURS = (1, 6)
+BURST_FACTOR = (5, 20)
+# Среднее время от поста до комментария, в секундах.
+COMMENT_DELAY: int = 6 * 60 * 60
+IMAGE_POOL: int = 8
+IMAGE_DIR = 'posts/generated'
+
+# Общие для задач воркера данные; заполняет _init_worker.
+_shared = {}
+
+
+def zipf_index(rng, count, exponent=ZIPF_EXPONENT):
+    """Индекс 0..count-1, где индекс k выпадает с вероятностью ~ 1/(k+1)^s.
+
+    Обратное преобразование непрерывного степенного распределения:
+    без таблицы весов, поэтому годится и для миллионов вариантов.
+    """
+    power = 1 - exponent
+    top = (count + 1) ** power - 1
+    return min(int((top * rng.random() + 1) ** (1 / power)) - 1, count - 1)
+
+
+def zipf_choice(rng, values):
+    return values[zipf_index(rng, len(values))]
+
+
+def faker(seed):
+    fake = Faker(LOCALE)
+    fake.seed_instance(seed)
+    return fake
+
+
+def post_text(fake, rng):
+    # Длина постов скошена: много коротких и немного длинных.
+    return fake.paragraph(
+        nb_sentences=max(1, int(rng.lognormvariate(1, 0.8)))
+    )
+
+
+def comment_text(fake, rng):
+    return fake.sentence(nb_words=rng.randint(3, 20))
+
+
+class ActivityCurve:
+    """Распределение моментов публикации за days дней до end.
+
+    Интенсивность задана по часам: суточный цикл HOURLY_ACTIVITY
+    и случайные всплески. at(q) — момент, до которого опубликована
+    доля q всех записей, так что равные доли id ложатся на время
+    неравномерно, как в живой ленте.
+    """
+
+    def __init__(self, seed, days, end):
+        rng = random.Random(seed)
+        self.end = end
+        self.start = end - timedelta(days=days)
+        hours = days * 24
+        weights = [
+            HOURLY_ACTIVITY[(self.start.hour + hour) % 24]
+            for hour in range(hours)
+        ]
+        for _ in range(max(days // BURST_EVERY_DAYS, 1)):
+            first = rng.randrange(hours)
+            factor = rng.uniform(*BURST_FACTOR)
+            for hour in range(first, min(first + rng.randint(*BURST_HOURS),
+                                         hours)):
+                weights[hour] *= factor
+        self.cumulative = []
+        total = 0
+        for weight in weights:
+            total += weight
+            self.cumulative.append(total)
+
+    def at(self, share):
+        target = share * self.cumulative[-1]
+        hour = min(
+            bisect.bisect_left(self.cumulative, target),
+            len(self.cumulative) - 1,
+        )
+        before = self.cumulative[hour - 1] if hour else 0
+        within = (target - before) / (self.cumulative[hour] - before)
+        return self.start + timedelta(hours=hour + within)
+
+
+def set_dates(model, name, dates):
+    """Проставляет даты {pk: дата} поверх auto_now_add после bulk_create.
+
+    Выключать auto_now_add на время вставки нельзя: поле общее для всех
+    потоков процесса, и чужой save() в это время записал бы пустую дату.
+    """
+    field = model._meta.get_field(name)
+    items = list(dates.items())
+    for start in range(0, len(items), DATES_BATCH_SIZE):
+        batch = items[start:start + DATES_BATCH_SIZE]
+        model.objects.filter(pk__in=[pk for pk, _ in batch]).update(**{
+            name: Case(
+                *(When(pk=pk, then=Value(date, output_field=field))
+                  for pk, date in batch),
+                output_field=field,
+            ),
+        })
+
+
+def make_images(seed):
+    """Создаёт небольшой набор картинок, которые делят между собой посты."""
+    rng = random.Random(seed)
+    names = []
+    for number in range(IMAGE_POOL):
+        size = (rng.randint(400, 1600), rng.randint(300, 1200))
+        color = tuple(rng.randrange(256) for _ in range(3))
+        content = io.BytesIO()
+        Image.new('RGB', size, color).save(content, 'JPEG')
+        name = f'{IMAGE_DIR}/{seed}-{number}.jpg'
+        if not default_storage.exists(name):
+            default_storage.save(name, ContentFile(content.getvalue()))
+            save_variants(name)
+        names.append(name)
+    return names
+
+
+def _max_pk(model):
+    return model.objects.aggregate(last=Max('pk'))['last'] or 0
+
+
+def _chunks(total, batch_size):
+    return [
+        (number, start, min(batch_size, total - start))
+        for number, start in enumerate(range(0, total, batch_size))
+    ]
+
+
+def create_posts(seed, chunk, start, size, total, first_id):
+    """Пишет пачку постов с id first_id + start и дальше.
+
+    Пачка номер chunk занимает свою долю кривой активности, поэтому
+    id растут вместе с датой при любом числе воркеров.
+    """
+    rng = random.Random(f'{seed}:posts:{chunk}')
+    fake = faker(rng.randrange(2 ** 32))
+    curve, authors, groups = (
+        _shared['curve'], _shared['authors'], _shared['groups']
+    )
+    images, image_share = _shared['images'], _shared['image_share']
+    shares = sorted(
+        (start + rng.random() * size) / total for _ in range(size)
+    )
+    posts = [
+        Post(
+            pk=first_id + start + offset,
+            author_id=zipf_choice(rng, authors),
+            group_id=(
+                zipf_choice(rng, groups)
+                if groups and rng.random() < GROUP_SHARE else None
+            ),
+            text=post_text(fake, rng),
+            pub_date=curve.at(share),
+            image=(
+                rng.choice(images)
+                if images and rng.random() < image_share else ''
+            ),
+        )
+        for offset, share in enumerate(shares)
+    ]
+    # bulk_create затрёт pub_date текущим временем, запомним заранее.
+    dates = {post.pk: post.pub_date for post in posts}
+    with transaction.atomic():
+        Post.objects.bulk_create(posts)
+        set_dates(Post, 'pub_date', dates)
+    return size
+
+
+def create_comments(seed, chunk, start, size, first_post, last_post,
+                    first_id):
+    """Пишет пачку комментариев; свежие посты комментируют чаще."""
+    rng = random.Random(f'{seed}:comments:{chunk}')
+    fake = faker(rng.randrange(2 ** 32))
+    count = last_post - first_post + 1
+    picks = [last_post - zipf_index(rng, count) for _ in range(size)]
+    dates = dict(
+        Post.objects.filter(pk__in=set(picks)).values_list('pk', 'pub_date')
+    )
+    end = _shared['curve'].end
+    comments = [
+        Comment(
+            pk=first_id + start + offset,
+            post_id=post_id,
+            author_id=rng.choice(_shared['authors']),
+            text=comment_text(fake, rng),
+            created=min(
+                dates[post_id]
+                + timedelta(seconds=rng.expovariate(1 / COMMENT_DELAY)),
+                end,
+            ),
+        )
+        for offset, post_id in enumerate(picks)
+        if post_id in dates
+    ]
+    created = {comment.pk: comment.created for comment in comments}
+    with transaction.atomic():
+        Comment.objects.bulk_create(comments)
+        set_dates(Comment, 'created', created)
+    return len(comments)
+
+
+def create_follows(seed, chunk, user_ids, follows):
+    """Подписки пачки пользователей; цели — по популярности авторов."""
+    rng = random.Random(f'{seed}:follows:{chunk}')
+    authors = _shared['authors']
+    pending = []
+    for user_id in user_ids:
+        count = min(
+            int(follows * rng.paretovariate(FOLLOWS_SHAPE)
+                * (FOLLOWS_SHAPE - 1) / FOLLOWS_SHAPE),
+            len(authors) - 1,
+        )
+        targets = {zipf_choice(rng, authors) for _ in range(count)}
+        targets.discard(user_id)
+        pending.extend(
+            Follow(user_id=user_id, author_id=author_id)
+            for author_id in sorted(targets)
+        )
+    with transaction.atomic():
+        Follow.objects.bulk_create(pending, ignore_conflicts=True)
+    return len(pending)
+
+
+_TASKS = {
+    'posts': create_posts,
+    'comments': create_comments,
+    'follows': create_follows,
+}
+
+
+def _init_worker(shared):
+    _shared.clear()
+    _shared.update(shared)
+
+
+def _run_task(task):
+    name, args = task
+    try:
+        return _TASKS[name](*args)
+    finally:
+        if _shared.get('in_worker'):
+            connections.close_all()
+
+
+def _run(tasks, shared, workers):
+    """Выполняет задачи в workers процессах, либо здесь же при одном."""
+    if workers == 1 or len(tasks) < 2:
+        _init_worker(shared)
+        return sum(map(_run_task, tasks))
+    # Дочерние процессы не должны унаследовать открытые соединения.
+    connections.close_all()
+    with multiprocessing.Pool(
+        workers, _init_worker, [dict(shared, in_worker=True)]
+    ) as pool:
+        return sum(pool.imap_unordered(_run_task, tasks))
+
+
+def generate(users=0, groups=0, posts=0, comments=0, follows=0,
+             images=0.0, days=365, seed=0, workers=1,
+             batch_size=BATCH_SIZE, report=None):
+    """Добавляет в базу синтетические данные; возвращает число строк.
+
+    Авторы постов, группы и цели подписок выбираются по закону Ципфа,
+    число подписок — по Парето (follows — среднее), даты постов — по
+    кривой активности со всплесками. images — доля постов с картинкой
+    из общего набора. Посты и комментарии получают id заранее, так что
+    при том же seed содержимое строк не зависит от числа воркеров.
+    Счётчики и ленты подписок после загрузки пересчитываются целиком,
+    новые строки добавляются в поисковый индекс.
+    """
+    rng = random.Random(seed)
+    report = report or (lambda phase, rows: None)
+    created = {}
+
+    first_user = _max_pk(User) + 1
+    password = make_password(None)
+    fake = faker(seed)
+    new_users = [
+        User(
+            username=f'user{first_user + number}',
+            first_name=fake.first_name(),
+            last_name=fake.last_name(),
+            password=password,
+        )
+        for number in range(users)
+    ]
+    for start in range(0, users, batch_size):
+        User.objects.bulk_create(new_users[start:start + batch_size])
+    first_group = _max_pk(Group) + 1
+    Group.objects.bulk_create([
+        Group(
+            title=f'{fake.word().capitalize()} {first_group + number}',
+            slug=f'group-{first_group + number}',
+            description=fake.sentence(),
+        )
+        for number in range(groups)
+    ])
+    created['users'], created['groups'] = users, groups
+    report('users', users)
+
+    authors = list(User.objects.order_by('pk').values_list('pk', flat=True))
+    rng.shuffle(authors)
+    shared = {
+        'authors': authors,
+        'groups': list(
+            Group.objects.order_by('pk').values_list('pk', flat=True)
+        ),
+        'curve': ActivityCurve(seed, days, timezone.now()),
+        'images': make_images(seed) if images and posts else [],
+        'image_share': images,
+    }
+
+    first_post = _max_pk(Post) + 1
+    created['posts'] = _run([
+        ('posts', (seed, chunk, start, size, posts, first_post))
+        for chunk, start, size in _chunks(posts, batch_size)
+    ], shared, workers)
+    report('posts', created['posts'])
+
+    last_post = _max_pk(Post)
+    first_comment = _max_pk(Comment) + 1
+    created['comments'] = 0
+    if last_post:
+        oldest_post = Post.objects.order_by('pk').values_list(
+            'pk', flat=True
+        ).first()
+        created['comments'] = _run([
+            ('comments', (seed, chunk, start, size, oldest_post, last_post,
+                          first_comment))
+            for chunk, start, size in _chunks(comments, batch_size)
+        ], shared, workers)
+    report('comments', created['comments'])
+
+    user_ids = sorted(authors)
+    follow_batch = max(batch_size // max(follows, 1), 1)
+    created['follows'] = _run([
+        ('follows', (seed, chunk, user_ids[start:start + size], follows))
+        for chunk, start, size in _chunks(len(user_ids), follow_batch)
+    ], shared, workers) if follows else 0
+    report('follows', created['follows'])
+
+    counters.reconcile_authors(batch_size)
+    counters.reconcile_posts(batch_size)
+    created['feed_items'] = timeline.rebuild_feeds()
+    report('feed_items', created['feed_items'])
+    for kind, after_id in ((search.POST, first_post - 1),
+                           (search.COMMENT, first_comment - 1)):
+        for first, last in search.id_batches(kind, after_id, None,
+                                             batch_size):
+            with write_transaction():
+                search.index_range(kind, first, last)
+    report('search', created['posts'] + created['comments'])
+    return created
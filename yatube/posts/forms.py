@@ -2,6 +2,11 @@ from xml.etree.ElementTree import Comment
 from django.forms import ModelForm
 from .models import Post, Comment
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
+
+from core.metrics import UPLOAD_SIZE
+
+from .images import normalize_image
 
 
 class PostForm(ModelForm):
@@ -11,6 +16,13 @@ class PostForm(ModelForm):
         labels = {'group': 'Группа', 'text': 'Сообщение'}
         help_texts = {'group': 'Выберите группу', 'text': 'Введите ссообщение'}
 
+    def clean_image(self):
+        image = self.cleaned_data.get('image')
+        if isinstance(image, UploadedFile):
+            UPLOAD_SIZE.observe(image.size)
+            return normalize_image(image)
+        return image
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
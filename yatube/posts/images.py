@@ -0,0 +1,103 @@
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+MAX_IMAGE_PIXELS: int = 40_000_000
+MAX_IMAGE_SIDE: int = 2048
+JPEG_QUALITY: int = 85
+# Форматы, которые храним как есть, если картинка не больше лимита.
+KEEP_FORMATS = ('JPEG', 'PNG', 'GIF', 'WEBP')
+# До этого размера перекодированный файл держим в памяти, дальше — на диске.
+SPOOL_SIZE: int = 1024 * 1024
+
+
+def _max_pixels():
+    return getattr(settings, 'POSTS_MAX_IMAGE_PIXELS', MAX_IMAGE_PIXELS)
+
+
+def _max_side():
+    return getattr(settings, 'POSTS_IMAGE_MAX_SIDE', MAX_IMAGE_SIDE)
+
+
+def _has_alpha(image):
+    return image.mode in ('RGBA', 'LA') or (
+        image.mode == 'P' and 'transparency' in image.info
+    )
+
+
+def normalize_image(upload):
+    """Проверяет загруженную картинку и ограничивает её размер.
+
+    Размеры читаются из заголовка, без декодирования пикселей. Картинка
+    больше лимита декодируется сразу в уменьшенном виде (для JPEG —
+    через draft) и перекодируется в мастер-копию не больше
+    POSTS_IMAGE_MAX_SIDE по длинной стороне.
+    """
+    max_side = _max_side()
+    upload.seek(0)
+    with Image.open(upload) as image:
+        width, height = image.size
+        if width * height > _max_pixels():
+            raise ValidationError(
+                'Слишком большое изображение: %(width)s×%(height)s.',
+                code='image_too_large',
+                params={'width': width, 'height': height},
+            )
+        if max(width, height) <= max_side and image.format in KEEP_FORMATS:
+            upload.seek(0)
+            return upload
+        if image.format == 'JPEG':
+            image.draft('RGB', (max_side, max_side))
+        master = ImageOps.exif_transpose(image)
+        master.thumbnail((max_side, max_side), Image.LANCZOS)
+        if _has_alpha(master):
+            master, image_format, extension = (
+                master.convert('RGBA'), 'PNG', '.png'
+            )
+        else:
+            master, image_format, extension = (
+                master.convert('RGB'), 'JPEG', '.jpg'
+            )
+        output = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE)
+        master.save(
+            output, image_format, quality=JPEG_QUALITY, optimize=True
+        )
+    output.seek(0)
+    name = os.path.splitext(os.path.basename(upload.name))[0] + extension
+    return File(output, name=name)
+
+
+def variant_name(name, image_format):
+    return f'{os.path.splitext(name)[0]}.{image_format.lower()}'
+
+
+def save_variants(name):
+    """Сохраняет рядом с мастер-копией её версии в POSTS_IMAGE_VARIANTS.
+
+    Форматы, которые не поддерживает установленный Pillow, пропускаются.
+    """
+    Image.init()
+    formats = [
+        image_format
+        for image_format in getattr(settings, 'POSTS_IMAGE_VARIANTS', ())
+        if image_format in Image.SAVE
+    ]
+    if not formats:
+        return []
+    saved = []
+    with default_storage.open(name) as source, Image.open(source) as image:
+        image.load()
+        for image_format in formats:
+            target = variant_name(name, image_format)
+            if default_storage.exists(target):
+                continue
+            output = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE)
+            image.save(output, image_format, quality=JPEG_QUALITY)
+            output.seek(0)
+            saved.append(default_storage.save(target, File(output)))
+    return saved
@@ -0,0 +1,290 @@
+import json
+import math
+import platform
+import random
+import time
+import tracemalloc
+
+import django
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, reset_queries
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from posts import datagen
+from posts.models import AuthorStats, Comment, Follow, Group, Post, User
+
+# Сколько самых популярных групп, авторов и постов берётся в выборку
+# адресов; внутри выборки адрес выбирается по закону Ципфа.
+TARGETS: int = 1000
+FEED_PAGES: int = 5
+# Метрики, рост которых при сравнении прогонов считается регрессией.
+COMPARED = ('p50_ms', 'p99_ms', 'queries', 'peak_memory_kib')
+
+
+def percentile(values, share):
+    """Перцентиль методом ближайшего ранга."""
+    ordered = sorted(values)
+    return ordered[max(math.ceil(share * len(ordered)) - 1, 0)]
+
+
+class Targets:
+    """Адреса запросов к каждой вьюхе, воспроизводимые при том же seed."""
+
+    def __init__(self, seed):
+        self.rng = random.Random(seed)
+        self.fake = datagen.faker(seed)
+        self.groups = list(Group.objects.order_by('pk').values_list(
+            'slug', flat=True
+        )[:TARGETS])
+        self.authors = list(AuthorStats.objects.order_by(
+            '-posts_count'
+        ).values_list('user__username', flat=True)[:TARGETS])
+        self.posts = list(Post.objects.order_by(
+            '-pub_date', '-id'
+        ).values_list('pk', flat=True)[:TARGETS])
+        # Худший случай ленты подписок — самый подписанный пользователь.
+        self.reader = User.objects.filter(
+            pk=AuthorStats.objects.order_by(
+                '-following_count'
+            ).values('user_id')[:1]
+        ).first()
+        if not (self.groups and self.authors and self.posts and self.reader):
+            raise CommandError(
+                'В базе нет данных для замеров: запустите с --populate.'
+            )
+
+    def pick(self, values):
+        return datagen.zipf_choice(self.rng, values)
+
+    def index(self):
+        page = self.rng.randint(1, FEED_PAGES)
+        return 'get', reverse('posts:index') + f'?page={page}', None
+
+    def group_posts(self):
+        slug = self.pick(self.groups)
+        return 'get', reverse('posts:group_list', args=(slug,)), None
+
+    def profile(self):
+        username = self.pick(self.authors)
+        return 'get', reverse('posts:profile', args=(username,)), None
+
+    def post_detail(self):
+        post_id = self.pick(self.posts)
+        return 'get', reverse('posts:post_detail', args=(post_id,)), None
+
+    def follow_index(self):
+        return 'get', reverse('posts:follow_index'), None
+
+    def add_comment(self):
+        post_id = self.pick(self.posts)
+        return (
+            'post',
+            reverse('posts:add_comment', args=(post_id,)),
+            {'text': datagen.comment_text(self.fake, self.rng)},
+        )
+
+    def post_create(self):
+        return (
+            'post',
+            reverse('posts:post_create'),
+            {'text': datagen.post_text(self.fake, self.rng)},
+        )
+
+
+# Вьюхи и нужна ли им авторизация.
+VIEWS = {
+    'index': False,
+    'group_posts': False,
+    'profile': False,
+    'post_detail': False,
+    'follow_index': True,
+    'add_comment': True,
+    'post_create': True,
+}
+
+
+def send(client, request):
+    method, path, data = request
+    response = getattr(client, method)(path, data)
+    if response.status_code >= 400:
+        raise CommandError(f'{path} ответил {response.status_code}.')
+
+
+def measure(client, build, requests, warmup):
+    """Задержки, число SQL-запросов и пик памяти на запрос к вьюхе.
+
+    Задержки меряются без перехвата запросов и tracemalloc, которые
+    сами замедляют работу; запросы и память — отдельными прогонами.
+    """
+    for _ in range(warmup):
+        send(client, build())
+    timings = []
+    for _ in range(requests):
+        request = build()
+        started = time.perf_counter()
+        send(client, request)
+        timings.append((time.perf_counter() - started) * 1000)
+    # Журнал запросов очищается в начале каждого запроса, а перехват —
+    # срез этого журнала: начинаем с пустого и считаем сразу.
+    reset_queries()
+    with CaptureQueriesContext(connection) as captured:
+        send(client, build())
+    queries = len(captured)
+    tracemalloc.start()
+    try:
+        send(client, build())
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        'requests': requests,
+        'p50_ms': round(percentile(timings, 0.5), 3),
+        'p95_ms': round(percentile(timings, 0.95), 3),
+        'p99_ms': round(percentile(timings, 0.99), 3),
+        'mean_ms': round(sum(timings) / len(timings), 3),
+        'queries': queries,
+        'peak_memory_kib': round(peak / 1024, 1),
+    }
+
+
+def regressions(current, baseline, threshold):
+    """Метрики, выросшие относительно прошлого прогона.
+
+    Число запросов не зависит от шума и сравнивается точно, время
+    и память — с допуском threshold.
+    """
+    found = []
+    for view, metrics in current['views'].items():
+        previous = baseline.get('views', {}).get(view)
+        if previous is None:
+            continue
+        for metric in COMPARED:
+            if metric not in previous:
+                continue
+            allowed = previous[metric]
+            if metric != 'queries':
+                allowed *= 1 + threshold
+            if metrics[metric] > allowed:
+                found.append(
+                    f'{view}.{metric}: {previous[metric]} → {metrics[metric]}'
+                )
+    return found
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет задержки p50/p95/p99, число SQL-запросов и пик памяти '
+        'вьюх постов и сохраняет результат в JSON для сравнения прогонов. '
+        'Пишущие вьюхи создают посты и комментарии: запускайте на '
+        'отдельной базе (YATUBE_DB).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--populate', action='store_true',
+            help='Сначала наполнить пустую базу данными нужного объёма.',
+        )
+        parser.add_argument('--users', type=int, default=10000)
+        parser.add_argument('--groups', type=int, default=100)
+        parser.add_argument('--posts', type=int, default=1000000)
+        parser.add_argument('--comments', type=int, default=1000000)
+        parser.add_argument(
+            '--follows', type=int, default=20,
+            help='Среднее число подписок пользователя.',
+        )
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help='Seed генератора данных и выбора адресов.',
+        )
+        parser.add_argument(
+            '--requests', type=int, default=200,
+            help='Сколько замеряемых запросов к каждой вьюхе.',
+        )
+        parser.add_argument(
+            '--warmup', type=int, default=20,
+            help='Сколько запросов сделать до замеров.',
+        )
+        parser.add_argument(
+            '--views', nargs='+', choices=list(VIEWS), default=list(VIEWS),
+        )
+        parser.add_argument('--output', help='Куда сохранить JSON.')
+        parser.add_argument(
+            '--compare',
+            help='JSON прошлого прогона; при регрессии команда падает.',
+        )
+        parser.add_argument(
+            '--threshold', type=float, default=0.2,
+            help='Допустимый рост времени и памяти, доля.',
+        )
+
+    def populate(self, options):
+        if Post.objects.exists() or User.objects.exists():
+            raise CommandError('--populate наполняет только пустую базу.')
+        started = time.monotonic()
+        datagen.generate(
+            users=options['users'],
+            groups=options['groups'],
+            posts=options['posts'],
+            comments=options['comments'],
+            follows=options['follows'],
+            seed=options['seed'],
+        )
+        self.stdout.write(
+            f'База наполнена за {time.monotonic() - started:.1f} с.'
+        )
+
+    def handle(self, *args, **options):
+        if options['populate']:
+            self.populate(options)
+        requests = max(options['requests'], 1)
+        targets = Targets(options['seed'])
+        guest, reader = Client(), Client()
+        reader.force_login(targets.reader)
+        result = {
+            'meta': {
+                'created': timezone.now().isoformat(),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+                'seed': options['seed'],
+                'rows': {
+                    model._meta.model_name: model.objects.count()
+                    for model in (User, Group, Post, Comment, Follow)
+                },
+            },
+            'views': {},
+        }
+        for view in options['views']:
+            cache.clear()
+            client = reader if VIEWS[view] else guest
+            metrics = measure(
+                client,
+                getattr(targets, view),
+                requests,
+                max(options['warmup'], 0),
+            )
+            result['views'][view] = metrics
+            self.stdout.write(
+                f'{view:<13} p50 {metrics["p50_ms"]:8.2f} мс  '
+                f'p99 {metrics["p99_ms"]:8.2f} мс  '
+                f'SQL {metrics["queries"]:3}  '
+                f'память {metrics["peak_memory_kib"]:9.1f} КиБ'
+            )
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(result, output, ensure_ascii=False, indent=2)
+        if options['compare']:
+            with open(options['compare']) as baseline:
+                found = regressions(
+                    result, json.load(baseline), options['threshold']
+                )
+            if found:
+                raise CommandError(
+                    'Регрессии относительно прошлого прогона:\n'
+                    + '\n'.join(found)
+                )
+            self.stdout.write(self.style.SUCCESS('Регрессий нет.'))
@@ -0,0 +1,79 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import datagen
+
+
+class Command(BaseCommand):
+    help = (
+        'Добавляет в базу синтетических пользователей, группы, посты, '
+        'комментарии и подписки с реалистичными распределениями: '
+        'для замеров и нагрузочных тестов на больших объёмах.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000)
+        parser.add_argument('--groups', type=int, default=100)
+        parser.add_argument('--posts', type=int, default=1000000)
+        parser.add_argument('--comments', type=int, default=1000000)
+        parser.add_argument(
+            '--follows', type=int, default=20,
+            help='Среднее число подписок пользователя.',
+        )
+        parser.add_argument(
+            '--images', type=float, default=0.05,
+            help='Доля постов с картинкой.',
+        )
+        parser.add_argument(
+            '--days', type=int, default=365,
+            help='За сколько последних дней распределить посты.',
+        )
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help='Seed: при том же seed получаются те же строки.',
+        )
+        parser.add_argument(
+            '--workers', type=int, default=1,
+            help='Число процессов, генерирующих и пишущих пачки.',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=datagen.BATCH_SIZE,
+            help='Сколько строк пишется одной транзакцией.',
+        )
+
+    def handle(self, *args, **options):
+        counts = [
+            options[name]
+            for name in ('users', 'groups', 'posts', 'comments', 'follows')
+        ]
+        if min(counts) < 0 or options['days'] < 1:
+            raise CommandError('Объёмы не могут быть отрицательными.')
+        if not 0 <= options['images'] <= 1:
+            raise CommandError('--images — доля от 0 до 1.')
+        started = time.monotonic()
+
+        def report(phase, rows):
+            self.stdout.write(
+                f'{phase}: {rows} строк, '
+                f'{time.monotonic() - started:.1f} с с начала'
+            )
+
+        created = datagen.generate(
+            users=options['users'],
+            groups=options['groups'],
+            posts=options['posts'],
+            comments=options['comments'],
+            follows=options['follows'],
+            images=options['images'],
+            days=options['days'],
+            seed=options['seed'],
+            workers=max(options['workers'], 1),
+            batch_size=max(options['batch_size'], 1),
+            report=report,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            'Создано: ' + ', '.join(
+                f'{name} {rows}' for name, rows in created.items()
+            )
+        ))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from posts.counters import (
+    RECONCILE_BATCH, reconcile_authors, reconcile_posts
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Сверяет счётчики постов, подписчиков и комментариев с данными '
+        'и исправляет расхождения пачками.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=RECONCILE_BATCH
+        )
+
+    def handle(self, *args, **options):
+        batch_size = max(options['batch_size'], 1)
+        authors = reconcile_authors(batch_size)
+        posts = reconcile_posts(batch_size)
+        self.stdout.write(
+            f'Исправлено счётчиков пользователей: {authors}, '
+            f'постов: {posts}'
+        )
@@ -0,0 +1,219 @@
+import glob
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Max, Min
+
+from core.db import write_transaction
+from posts import search
+
+
+def sync_range(kind, after_id, up_to_id, batch_size, verify,
+               on_batch=None):
+    """Индексирует или сверяет строки kind с id в (after_id, up_to_id].
+
+    Каждая пачка записывается своей короткой транзакцией с блокировкой
+    записи, так что процессы по соседним диапазонам ждут друг друга,
+    а не падают; в памяти держится одна пачка id.
+    """
+    total = 0
+    last_id = after_id
+    for first, last_id in search.id_batches(
+        kind, after_id, up_to_id, batch_size
+    ):
+        if verify:
+            total += search.repair(kind, first, last_id)
+        else:
+            with write_transaction():
+                total += search.index_range(kind, first, last_id)
+        if on_batch is not None:
+            on_batch(kind, last_id, total)
+    if verify:
+        # Хвост диапазона: записи строк, удалённых после последней пачки.
+        total += search.repair(kind, last_id, up_to_id)
+    return total
+
+
+def write_json(path, data):
+    with open(path + '.tmp', 'w') as output:
+        json.dump(data, output)
+    os.replace(path + '.tmp', path)
+
+
+def sync_saved_range(kind, range_path, batch_size, verify):
+    """Доводит диапазон из файла range_path, отмечая в нём каждую пачку.
+
+    Файл хранит {"after": id последней готовой строки, "up_to": граница};
+    после обрыва параллельной перестройки каждый диапазон продолжается
+    со своего места.
+    """
+    with open(range_path) as saved:
+        bounds = json.load(saved)
+
+    def save(kind, last_id, done):
+        write_json(range_path, {'after': last_id, 'up_to': bounds['up_to']})
+    return sync_range(
+        kind, bounds['after'], bounds['up_to'], batch_size, verify, save
+    )
+
+
+def sync_range_in_worker(args):
+    try:
+        return sync_saved_range(*args)
+    finally:
+        connections.close_all()
+
+
+def split_ranges(kind, after_id, parts):
+    """Делит id строк kind после after_id на parts соседних диапазонов."""
+    model, _ = search.SOURCES[kind]
+    bounds = model.objects.filter(pk__gt=after_id).aggregate(
+        first=Min('pk'), last=Max('pk')
+    )
+    if bounds['first'] is None:
+        return [(after_id, None)]
+    step = max((bounds['last'] - bounds['first'] + 1) // parts, 1)
+    edges = list(range(bounds['first'] - 1, bounds['last'], step))[:parts]
+    edges[0] = after_id
+    return list(zip(edges, edges[1:] + [None]))
+
+
+class Command(BaseCommand):
+    help = (
+        'Строит полнотекстовый индекс постов и комментариев пачками '
+        'или сверяет его с данными и чинит расхождения.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Сколько строк записывать одной транзакцией.',
+        )
+        parser.add_argument(
+            '--workers', type=int, default=1,
+            help='Число процессов; каждый обрабатывает свой диапазон id.',
+        )
+        parser.add_argument(
+            '--rebuild', action='store_true',
+            help='Очистить индекс и построить его заново.',
+        )
+        parser.add_argument(
+            '--verify', action='store_true',
+            help='Сверить индекс с данными по контрольным суммам пачек.',
+        )
+        parser.add_argument(
+            '--start-id', type=int, default=None,
+            help='Начать со строк, id которых больше этого.',
+        )
+        parser.add_argument(
+            '--checkpoint',
+            help='Файл с id последних обработанных строк для продолжения.',
+        )
+
+    def read_checkpoint(self, path):
+        if not path or not os.path.exists(path):
+            return {}
+        with open(path) as checkpoint:
+            return json.load(checkpoint)
+
+    def write_checkpoint(self, path, progress):
+        if path:
+            write_json(path, progress)
+
+    def range_paths(self, checkpoint, kind):
+        """Файлы диапазонов, оставшиеся от прерванного запуска."""
+        if not checkpoint:
+            return []
+        pattern = glob.escape(f'{checkpoint}.{kind}.') + '*[0-9]'
+        return sorted(glob.glob(pattern))
+
+    def forget_ranges(self, checkpoint):
+        for kind in search.SOURCES:
+            for path in self.range_paths(checkpoint, kind):
+                os.remove(path)
+
+    def sync_ranges(self, kind, after_id, checkpoint, workers, batch_size,
+                    verify):
+        """Раздаёт диапазоны процессам; прогресс каждого — в своём файле.
+
+        Файлы лежат рядом с checkpoint (без него — во временном каталоге).
+        Если они остались от прерванного запуска, продолжаются они, а не
+        новое деление, даже при одном процессе. По завершении граница
+        kind сдвигается на последний готовый id, а файлы удаляются.
+        """
+        with tempfile.TemporaryDirectory() as scratch:
+            paths = self.range_paths(checkpoint, kind)
+            if not paths:
+                prefix = checkpoint or os.path.join(scratch, 'search')
+                ranges = split_ranges(kind, after_id, workers)
+                paths = [f'{prefix}.{kind}.{number}'
+                         for number in range(len(ranges))]
+                for path, (first, last) in zip(paths, ranges):
+                    write_json(path, {'after': first, 'up_to': last})
+            tasks = [(kind, path, batch_size, verify) for path in paths]
+            if workers == 1:
+                total = sum(sync_saved_range(*task) for task in tasks)
+            else:
+                # Дочерние процессы не должны унаследовать соединения.
+                connections.close_all()
+                with multiprocessing.Pool(workers) as pool:
+                    total = sum(pool.map(sync_range_in_worker, tasks))
+            last_ids = []
+            for path in paths:
+                with open(path) as saved:
+                    last_ids.append(json.load(saved)['after'])
+                os.remove(path)
+        return total, max(last_ids)
+
+    def handle(self, *args, **options):
+        if not search.is_supported():
+            raise CommandError(
+                'Полнотекстовый индекс поддерживается только на SQLite.'
+            )
+        batch_size = max(options['batch_size'], 1)
+        workers = max(options['workers'], 1)
+        verify = options['verify']
+        checkpoint = options['checkpoint']
+        if options['rebuild']:
+            search.clear()
+            progress = {}
+        else:
+            progress = self.read_checkpoint(checkpoint)
+        if options['start_id'] is not None:
+            progress = dict.fromkeys(search.SOURCES, options['start_id'])
+        if options['rebuild'] or options['start_id'] is not None:
+            self.forget_ranges(checkpoint)
+        started = time.monotonic()
+
+        def report(kind, last_id, done):
+            progress[kind] = last_id
+            self.write_checkpoint(checkpoint, progress)
+            elapsed = max(time.monotonic() - started, 1e-6)
+            self.stdout.write(
+                f'{kind}: {done} строк, до id={last_id}: '
+                f'{done / elapsed:.1f} строк/с'
+            )
+
+        total = 0
+        for kind in search.SOURCES:
+            after_id = progress.get(kind, 0)
+            if workers == 1 and not self.range_paths(checkpoint, kind):
+                total += sync_range(
+                    kind, after_id, None, batch_size, verify, report
+                )
+                continue
+            done, last_id = self.sync_ranges(
+                kind, after_id, checkpoint, workers, batch_size, verify
+            )
+            total += done
+            report(kind, last_id, done)
+        if verify:
+            message = f'Исправлено записей индекса: {total}'
+        else:
+            message = f'Проиндексировано строк: {total}'
+        self.stdout.write(self.style.SUCCESS(message))
@@ -0,0 +1,61 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from posts.cache import bump, replica_scope
+
+
+def sync_replica(alias):
+    """Копирует основную базу SQLite в реплику alias целиком.
+
+    Backup API снимает согласованный снимок и не останавливает запись
+    в основную базу. После копии начинается новое поколение кэша
+    реплики: страницы, прочитанные с неё до синхронизации, устарели.
+    """
+    source, target = connections[DEFAULT_DB_ALIAS], connections[alias]
+    if source.vendor != 'sqlite' or target.vendor != 'sqlite':
+        raise CommandError('Копировать реплику умеем только для SQLite.')
+    source.ensure_connection()
+    target.ensure_connection()
+    source.connection.backup(target.connection)
+    bump(replica_scope(alias))
+
+
+class Command(BaseCommand):
+    help = (
+        'Копирует основную базу в реплики. С --interval повторяет копию '
+        'по таймеру, и реплика отстаёт так, как отставала бы настоящая.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'aliases', nargs='*',
+            help='Алиасы реплик; по умолчанию DATABASE_REPLICAS.',
+        )
+        parser.add_argument(
+            '--interval', type=float, default=None,
+            help='Синхронизировать раз в столько секунд, пока не прервут.',
+        )
+
+    def handle(self, *args, **options):
+        aliases = options['aliases'] or settings.DATABASE_REPLICAS
+        if not aliases:
+            raise CommandError(
+                'Реплики не настроены: задайте YATUBE_REPLICA_DB.'
+            )
+        unknown = set(aliases) - set(settings.DATABASES)
+        if unknown or DEFAULT_DB_ALIAS in aliases:
+            raise CommandError(
+                'Неизвестные алиасы реплик: {}.'.format(
+                    ', '.join(sorted(unknown)) or DEFAULT_DB_ALIAS
+                )
+            )
+        while True:
+            for alias in aliases:
+                sync_replica(alias)
+                self.stdout.write(f'Реплика {alias} синхронизирована.')
+            if options['interval'] is None:
+                return
+            time.sleep(options['interval'])
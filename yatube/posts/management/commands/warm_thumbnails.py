@@ -0,0 +1,124 @@
+import logging
+import multiprocessing
+import os
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from posts import cache
+from posts.models import Post
+from posts.thumbnails import generate_thumbnails
+
+logger = logging.getLogger(__name__)
+
+CREATED, SKIPPED, FAILED = 'created', 'skipped', 'failed'
+
+
+def warm(name):
+    try:
+        return CREATED if generate_thumbnails(name) else SKIPPED
+    except Exception:
+        logger.exception('Не удалось построить миниатюры для %s', name)
+        return FAILED
+
+
+def batches(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class Command(BaseCommand):
+    help = (
+        'Строит миниатюры для картинок всех постов параллельно '
+        'на нескольких ядрах; готовые миниатюры пропускает.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help='Число процессов; 1 — без пула, в текущем процессе.',
+        )
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--start-id', type=int, default=None,
+            help='Начать с постов, id которых больше этого.',
+        )
+        parser.add_argument(
+            '--checkpoint',
+            help='Файл с id последнего обработанного поста для продолжения.',
+        )
+
+    def read_checkpoint(self, path):
+        if not path or not os.path.exists(path):
+            return 0
+        with open(path) as checkpoint:
+            return int(checkpoint.read().strip() or 0)
+
+    def write_checkpoint(self, path, last_id):
+        if not path:
+            return
+        with open(path + '.tmp', 'w') as checkpoint:
+            checkpoint.write(str(last_id))
+        os.replace(path + '.tmp', path)
+
+    def handle(self, *args, **options):
+        start_id = options['start_id']
+        if start_id is None:
+            start_id = self.read_checkpoint(options['checkpoint'])
+        posts = Post.objects.exclude(image='').filter(
+            id__gt=start_id
+        ).order_by('id').values_list('id', 'image', 'author_id', 'group_id')
+        workers = max(options['workers'], 1)
+        pool = None
+        if workers > 1:
+            # Дочерние процессы не должны унаследовать открытые соединения.
+            connections.close_all()
+            pool = multiprocessing.Pool(workers)
+        totals = {CREATED: 0, SKIPPED: 0, FAILED: 0}
+        started = time.monotonic()
+        try:
+            for batch in batches(
+                posts.iterator(chunk_size=options['batch_size']),
+                options['batch_size'],
+            ):
+                names = [row[1] for row in batch]
+                if pool is None:
+                    results = map(warm, names)
+                else:
+                    results = pool.map(
+                        warm, names,
+                        chunksize=max(len(names) // (workers * 4), 1),
+                    )
+                scopes = set()
+                for (post_id, _, author_id, group_id), result in zip(
+                    batch, results
+                ):
+                    totals[result] += 1
+                    if result == CREATED:
+                        scopes.update(
+                            cache.post_scopes(post_id, author_id, group_id)
+                        )
+                # Во фрагментах лент ещё лежит исходная картинка.
+                cache.bump(*scopes)
+                self.write_checkpoint(options['checkpoint'], batch[-1][0])
+                done = sum(totals.values())
+                elapsed = max(time.monotonic() - started, 1e-6)
+                self.stdout.write(
+                    f'{done} картинок, до id={batch[-1][0]}: '
+                    f'{done / elapsed:.1f} картинок/с'
+                )
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано: {totals[CREATED]}, уже были: {totals[SKIPPED]}, '
+            f'ошибок: {totals[FAILED]}'
+        ))
@@ -0,0 +1,80 @@
+# Generated by Django 2.2.16 on 2026-10-18 19:02
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Значения posts.timeline на момент миграции: историческая миграция
+# не должна зависеть от текущего кода приложения.
+BACKFILL_POSTS = 200
+FANOUT_FOLLOWERS_LIMIT = 1000
+
+
+def fill_feed(apps, schema_editor):
+    """Раскладывает ленты так же, как rebuild_feeds в posts.timeline.
+
+    Каждый подписчик получает последние BACKFILL_POSTS постов автора,
+    популярные авторы (больше FEED_FANOUT_LIMIT подписчиков) читаются
+    напрямую и не раскладываются. AuthorStats появится только в 0011,
+    поэтому подписчиков считаем по самим подпискам; DISTINCT — потому
+    что дубли подписок удаляет лишь 0010.
+    """
+    Follow = apps.get_model('posts', 'Follow')
+    Post = apps.get_model('posts', 'Post')
+    FeedItem = apps.get_model('posts', 'FeedItem')
+    follow_table = Follow._meta.db_table
+    schema_editor.execute(
+        f'INSERT INTO {FeedItem._meta.db_table} '
+        '(user_id, post_id, author_id, pub_date) '
+        'SELECT DISTINCT follow.user_id, post.id, post.author_id, '
+        'post.pub_date '
+        f'FROM {follow_table} AS follow '
+        'JOIN (SELECT id, author_id, pub_date, ROW_NUMBER() OVER ('
+        'PARTITION BY author_id ORDER BY pub_date DESC, id DESC'
+        f') AS position FROM {Post._meta.db_table}) AS post '
+        'ON post.author_id = follow.author_id '
+        'WHERE post.position <= %s AND follow.author_id NOT IN ('
+        f'SELECT author_id FROM {follow_table} GROUP BY author_id '
+        'HAVING COUNT(DISTINCT user_id) > %s)',
+        [
+            BACKFILL_POSTS,
+            getattr(settings, 'FEED_FANOUT_LIMIT', FANOUT_FOLLOWERS_LIMIT),
+        ],
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0008_auto_20221005_2005'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedItem',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pub_date', models.DateTimeField()),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_items', to='posts.Post')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_items', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-pub_date'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='feeditem',
+            index=models.Index(fields=['user', '-pub_date'], name='feed_user_pub_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='feeditem',
+            index=models.Index(fields=['user', 'author'], name='feed_user_author_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='feeditem',
+            unique_together={('user', 'post')},
+        ),
+        migrations.RunPython(fill_feed, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,50 @@
+from django.db import migrations, models
+import posts.models
+
+SEARCH_TABLE = 'posts_search'
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        f'CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5('
+        'text, kind UNINDEXED, post_id UNINDEXED, '
+        "tokenize='unicode61 remove_diacritics 2')"
+    )
+    schema_editor.execute(
+        f'INSERT INTO {SEARCH_TABLE} (rowid, text, kind, post_id) '
+        "SELECT id * 2, text, 'post', id FROM posts_post"
+    )
+    schema_editor.execute(
+        f'INSERT INTO {SEARCH_TABLE} (rowid, text, kind, post_id) '
+        "SELECT id * 2 + 1, text, 'comment', post_id FROM posts_comment"
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {SEARCH_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0011_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+        migrations.CreateModel(
+            name='SearchEntry',
+            fields=[
+                ('rowid', models.IntegerField(primary_key=True, serialize=False)),
+                ('text', posts.models.SearchField()),
+                ('kind', models.CharField(max_length=10)),
+            ],
+            options={
+                'db_table': 'posts_search',
+                'managed': False,
+            },
+        ),
+    ]
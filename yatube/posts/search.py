@@ -0,0 +1,220 @@
+import hashlib
+
+from django.db import connection
+
+from core.db import write_transaction
+
+from .models import Comment, Post, SearchEntry
+
+SEARCH_TABLE = 'posts_search'
+POST, COMMENT = 'post', 'comment'
+# Посты и комментарии делят одну таблицу: rowid вычисляется из id,
+# чтобы обновлять и удалять запись без поиска по неиндексируемым полям.
+_KINDS = {POST: 0, COMMENT: 1}
+UNINDEX_CHUNK: int = 500
+# Откуда берутся строки индекса: модель и поле с id поста.
+SOURCES = {POST: (Post, 'id'), COMMENT: (Comment, 'post_id')}
+
+
+def is_supported():
+    """Есть ли у базы полнотекстовый индекс; иначе поиск идёт LIKE."""
+    return connection.vendor == 'sqlite'
+
+
+def search_rowid(kind, pk):
+    return pk * len(_KINDS) + _KINDS[kind]
+
+
+def match_query(query):
+    """Строка запроса FTS5: все слова обязательны, последнее — префикс.
+
+    Слова берутся в кавычки, так что операторы FTS5 из ввода
+    пользователя не разбираются.
+    """
+    terms = [
+        '"{}"'.format(term.replace('"', '""')) for term in query.split()
+    ]
+    if not terms:
+        return ''
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def index_rows(rows):
+    """Записывает в индекс строки (kind, id, post_id, text)."""
+    if not is_supported():
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT OR REPLACE INTO {SEARCH_TABLE} '
+            '(rowid, text, kind, post_id) VALUES (%s, %s, %s, %s)',
+            [
+                (search_rowid(kind, pk), text, kind, post_id)
+                for kind, pk, post_id, text in rows
+            ],
+        )
+
+
+def unindex(kind, *pks):
+    if not is_supported() or not pks:
+        return
+    rowids = [search_rowid(kind, pk) for pk in pks]
+    with connection.cursor() as cursor:
+        # Кусками, чтобы не упереться в лимит параметров SQLite.
+        for start in range(0, len(rowids), UNINDEX_CHUNK):
+            chunk = rowids[start:start + UNINDEX_CHUNK]
+            cursor.execute(
+                f'DELETE FROM {SEARCH_TABLE} WHERE rowid IN (%s)'
+                % ', '.join(['%s'] * len(chunk)),
+                chunk,
+            )
+
+
+def clear():
+    if is_supported():
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+
+
+def id_batches(kind, after_id=0, up_to_id=None, batch_size=500):
+    """Делит id строк kind на диапазоны (after_id, last_id] по batch_size.
+
+    Читаются только id, и курсор не остаётся открытым между пачками:
+    пишущая транзакция пачки не упирается в собственную блокировку чтения.
+    """
+    model, _ = SOURCES[kind]
+    queryset = model.objects.order_by('pk')
+    if up_to_id is not None:
+        queryset = queryset.filter(pk__lte=up_to_id)
+    while True:
+        ids = list(
+            queryset.filter(pk__gt=after_id).values_list(
+                'pk', flat=True
+            )[:batch_size]
+        )
+        if not ids:
+            return
+        yield after_id, ids[-1]
+        after_id = ids[-1]
+
+
+def _source_sql(kind):
+    model, post_field = SOURCES[kind]
+    return (
+        f'SELECT id * {len(_KINDS)} + {_KINDS[kind]}, text, %s, '
+        f'{model._meta.get_field(post_field).column} '
+        f'FROM {model._meta.db_table}'
+    )
+
+
+def index_range(kind, after_id, up_to_id):
+    """Переписывает в индекс строки kind с id в (after_id, up_to_id].
+
+    Текст читается тем же INSERT ... SELECT, что и пишется, поэтому
+    параллельная правка поста не затирается устаревшей копией.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT OR REPLACE INTO {SEARCH_TABLE} '
+            f'(rowid, text, kind, post_id) {_source_sql(kind)} '
+            'WHERE id > %s AND id <= %s',
+            [kind, after_id, up_to_id],
+        )
+        return cursor.rowcount
+
+
+def _index_ids(kind, pks):
+    with connection.cursor() as cursor:
+        for start in range(0, len(pks), UNINDEX_CHUNK):
+            chunk = pks[start:start + UNINDEX_CHUNK]
+            cursor.execute(
+                f'INSERT OR REPLACE INTO {SEARCH_TABLE} '
+                f'(rowid, text, kind, post_id) {_source_sql(kind)} '
+                'WHERE id IN ({})'.format(', '.join(['%s'] * len(chunk))),
+                [kind, *chunk],
+            )
+
+
+def _checksum(rows):
+    digest = hashlib.blake2b(digest_size=16)
+    for rowid, (post_id, text) in sorted(rows.items()):
+        digest.update(f'{rowid}\0{post_id}\0{text}\0'.encode())
+    return digest.digest()
+
+
+def repair(kind, after_id, up_to_id=None):
+    """Сверяет строки kind из диапазона id (after_id, up_to_id] с индексом.
+
+    Сначала сравниваются контрольные суммы диапазона; при расхождении
+    изменённые и недостающие строки переписываются, а записи удалённых
+    строк стираются. Возвращает число исправленных записей.
+    """
+    model, post_field = SOURCES[kind]
+    source = model.objects.filter(pk__gt=after_id)
+    entries = SearchEntry.objects.filter(
+        kind=kind, rowid__gt=search_rowid(kind, after_id)
+    )
+    if up_to_id is not None:
+        source = source.filter(pk__lte=up_to_id)
+        entries = entries.filter(rowid__lte=search_rowid(kind, up_to_id))
+    expected = {
+        search_rowid(kind, pk): (post_id, text)
+        for pk, post_id, text in source.values_list(
+            'pk', post_field, 'text'
+        )
+    }
+    actual = {
+        rowid: (post_id, text)
+        for rowid, post_id, text in entries.values_list(
+            'rowid', 'post_id', 'text'
+        )
+    }
+    if _checksum(expected) == _checksum(actual):
+        return 0
+    stale = [
+        rowid // len(_KINDS) for rowid in actual if rowid not in expected
+    ]
+    changed = [
+        rowid // len(_KINDS) for rowid, row in expected.items()
+        if actual.get(rowid) != row
+    ]
+    with write_transaction():
+        unindex(kind, *stale)
+        _index_ids(kind, changed)
+    return len(stale) + len(changed)
+
+
+def index_post(post):
+    index_rows([(POST, post.pk, post.pk, post.text)])
+
+
+def index_comment(comment):
+    index_rows([(COMMENT, comment.pk, comment.post_id, comment.text)])
+
+
+def search_posts(query, queryset=None, kinds=(POST, COMMENT)):
+    """Посты, в тексте которых или в комментариях к которым есть запрос.
+
+    На SQLite отбор идёт по индексу FTS5; на других базах — обычным
+    icontains, как раньше в админке.
+    """
+    if queryset is None:
+        queryset = Post.objects.all()
+    match = match_query(query)
+    if not match:
+        return queryset.none()
+    if is_supported():
+        entries = SearchEntry.objects.filter(text__match=match)
+        if set(kinds) != set(_KINDS):
+            entries = entries.filter(kind__in=kinds)
+        return queryset.filter(pk__in=entries.values('post_id'))
+    condition = queryset.none()
+    if POST in kinds:
+        condition |= queryset.filter(text__icontains=query)
+    if COMMENT in kinds:
+        condition |= queryset.filter(
+            pk__in=Comment.objects.filter(
+                text__icontains=query
+            ).values('post_id')
+        )
+    return condition
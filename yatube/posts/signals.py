@@ -0,0 +1,150 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import cache, counters, search, timeline
+from .models import Comment, Follow, Group, Post, User
+
+# Поля пользователя, что выводятся в лентах и комментариях.
+NAME_FIELDS = ('username', 'first_name', 'last_name')
+
+
+# Счётчики обновляются первыми: рассылка по лентам уже читает
+# followers_count, чтобы решить, популярен ли автор.
+@receiver(post_save, sender=Post)
+def count_new_post(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.change_author_stats(instance.author_id, posts_count=1)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    counters.change_author_stats(instance.author_id, posts_count=-1)
+
+
+@receiver(post_save, sender=Comment)
+def count_new_comment(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.change_comments_count(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    counters.change_comments_count(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Follow)
+def count_new_follow(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.change_author_stats(instance.author_id, followers_count=1)
+        counters.change_author_stats(instance.user_id, following_count=1)
+
+
+@receiver(post_delete, sender=Follow)
+def count_deleted_follow(sender, instance, **kwargs):
+    counters.change_author_stats(instance.author_id, followers_count=-1)
+    counters.change_author_stats(instance.user_id, following_count=-1)
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        timeline.fan_out_post(instance)
+
+
+@receiver(post_save, sender=Follow)
+def fill_follow_feed(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        timeline.add_follow(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def clear_follow_feed(sender, instance, **kwargs):
+    timeline.remove_follow(instance.user_id, instance.author_id)
+
+
+@receiver(pre_save, sender=Post)
+def remember_post_group(sender, instance, raw=False, **kwargs):
+    if instance.pk and not raw:
+        instance._previous_group_id = Post.objects.filter(
+            pk=instance.pk
+        ).values_list('group_id', flat=True).first()
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post_feeds(sender, instance, **kwargs):
+    scopes = {
+        cache.INDEX_SCOPE,
+        cache.author_scope(instance.author_id),
+        cache.post_scope(instance.pk),
+    }
+    for group_id in (
+        instance.group_id, getattr(instance, '_previous_group_id', None)
+    ):
+        if group_id is not None:
+            scopes.add(cache.group_scope(group_id))
+    cache.bump(*scopes)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comment_post(sender, instance, **kwargs):
+    cache.bump(cache.post_scope(instance.post_id))
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_group_feeds(sender, instance, **kwargs):
+    cache.bump(cache.GLOBAL_SCOPE)
+
+
+@receiver(pre_save, sender=User)
+def remember_author_name(sender, instance, raw=False, update_fields=None,
+                         **kwargs):
+    # Вход сохраняет только last_login — лишний запрос ему не нужен.
+    if raw or not instance.pk or (
+        update_fields is not None and not set(update_fields) & set(NAME_FIELDS)
+    ):
+        return
+    instance._previous_name = User.objects.filter(
+        pk=instance.pk
+    ).values_list(*NAME_FIELDS).first()
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_name(sender, instance, created, **kwargs):
+    previous = instance.__dict__.pop('_previous_name', None)
+    if created or previous is None:
+        return
+    if previous != tuple(getattr(instance, name) for name in NAME_FIELDS):
+        # Имя автора есть во всех лентах и под комментариями, а переименование
+        # редкое, поэтому начинаем новое поколение для всего кэша.
+        cache.bump(cache.GLOBAL_SCOPE)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follow_feed(sender, instance, **kwargs):
+    cache.bump(cache.follow_scope(instance.user_id))
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.index_post(instance)
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    search.unindex(search.POST, instance.pk)
+
+
+@receiver(post_save, sender=Comment)
+def index_comment(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.index_comment(instance)
+
+
+@receiver(post_delete, sender=Comment)
+def unindex_comment(sender, instance, **kwargs):
+    search.unindex(search.COMMENT, instance.pk)
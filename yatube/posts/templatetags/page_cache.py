@@ -0,0 +1,11 @@
+from django import template
+
+from posts.utils import page_cache_key as request_page_key
+
+register = template.Library()
+
+
+@register.filter
+def page_cache_key(request):
+    """Ключ страницы для {% cache %} вместо request.get_full_path."""
+    return request_page_key(request)
@@ -0,0 +1,20 @@
+from django import template
+
+from posts.thumbnails import get_ready_thumbnail, schedule_thumbnails
+
+register = template.Library()
+
+
+@register.simple_tag
+def ready_thumbnail(image, geometry, **options):
+    """Готовая миниатюра, а пока её строит фоновый пул — исходная картинка.
+
+    Рендер страницы никогда не ждёт обработки изображения.
+    """
+    if not image:
+        return None
+    thumbnail = get_ready_thumbnail(image, geometry, **options)
+    if thumbnail is None:
+        schedule_thumbnails(image.instance)
+        return image
+    return thumbnail
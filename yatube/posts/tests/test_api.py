@@ -0,0 +1,224 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.batch import BATCH_LIMIT
+from posts.models import AuthorStats, Comment, FeedItem, Follow, Group, Post
+from posts.search import search_posts
+from posts.utils import PAGINATOR_PAGE
+
+User = get_user_model()
+
+
+class FeedApiTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username='api_author')
+        cls.reader = User.objects.create(username='api_reader')
+        cls.group = Group.objects.create(title='Группа', slug='api-group')
+        cls.posts = [
+            Post.objects.create(
+                author=cls.author, text=f'Пост {number}', group=cls.group
+            )
+            for number in range(PAGINATOR_PAGE + 3)
+        ]
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def test_feeds_are_cursor_paginated(self):
+        """Все ленты отдают JSON-страницы по курсору."""
+        urls = (
+            reverse('api_v1:index'),
+            reverse('api_v1:group_list', kwargs={'slug': 'api-group'}),
+            reverse('api_v1:profile', kwargs={'username': 'api_author'}),
+            reverse('api_v1:follow_index'),
+        )
+        expected = [post.pk for post in reversed(self.posts)]
+        for url in urls:
+            with self.subTest(url=url):
+                first = self.reader_client.get(url).json()
+                self.assertEqual(len(first['results']), PAGINATOR_PAGE)
+                self.assertIsNone(first['previous'])
+                second = self.reader_client.get(
+                    url, {'after': first['next']}).json()
+                self.assertIsNone(second['next'])
+                self.assertEqual(
+                    [post['id'] for post in first['results']
+                     + second['results']],
+                    expected,
+                )
+        self.assertEqual(
+            first['results'][0]['group'],
+            {'slug': 'api-group', 'title': 'Группа'},
+        )
+
+    def test_unchanged_feed_returns_304_without_rows(self):
+        """Повтор с ETag отдаёт 304, не читая постов."""
+        url = reverse('api_v1:index')
+        response = self.client.get(url)
+        etag = response['ETag']
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(len(queries), 0)
+        self.posts[0].text = 'Правка'
+        self.posts[0].save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_feed_has_no_comment_counts(self):
+        """Лента не отдаёт счётчик, который её ETag не отслеживает."""
+        url = reverse('api_v1:index')
+        response = self.client.get(url)
+        self.assertNotIn('comments_count', response.json()['results'][0])
+        Comment.objects.create(
+            post=self.posts[0], author=self.reader, text='Новый'
+        )
+        self.assertEqual(
+            self.client.get(url)['ETag'], response['ETag']
+        )
+
+    def test_post_detail_with_comments(self):
+        """Пост отдаётся с первой страницей комментариев."""
+        post = self.posts[0]
+        Comment.objects.create(post=post, author=self.reader, text='Ок')
+        url = reverse('api_v1:post_detail', kwargs={'post_id': post.pk})
+        data = self.client.get(url).json()
+        self.assertEqual(data['comments_count'], 1)
+        self.assertEqual(data['comments']['results'][0]['text'], 'Ок')
+        etag = self.client.get(url)['ETag']
+        Comment.objects.create(post=post, author=self.reader, text='Ещё')
+        self.assertEqual(
+            self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_missing_objects_and_anonymous_follow(self):
+        """Ошибки отдаются в JSON."""
+        responses = {
+            reverse('api_v1:post_detail', kwargs={'post_id': 0}): 404,
+            reverse('api_v1:group_list', kwargs={'slug': 'none'}): 404,
+            reverse('api_v1:profile', kwargs={'username': 'none'}): 404,
+            reverse('api_v1:follow_index'): 401,
+        }
+        for url, status in responses.items():
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, status)
+                self.assertIn('detail', response.json())
+
+
+class BatchApiTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username='batch_author')
+        cls.reader = User.objects.create(username='batch_reader')
+        cls.group = Group.objects.create(title='Группа', slug='batch-group')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.author)
+
+    def post_items(self, name, items):
+        return self.client.post(
+            reverse(f'api_v1:{name}'),
+            data=json.dumps({'items': items}),
+            content_type='application/json',
+        )
+
+    def test_batch_posts(self):
+        """Пачка постов создаётся целиком, ошибки — по элементам."""
+        items = [
+            {'text': 'Первый пакетный', 'group': self.group.pk},
+            {'text': ''},
+            {'text': 'Второй пакетный'},
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            data = self.post_items('create_posts', items).json()
+        inserts = [
+            query for query in queries.captured_queries
+            if query['sql'].startswith('INSERT INTO "posts_post"')
+        ]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(data['created'], 2)
+        self.assertIn('text', data['results'][1]['errors'])
+        first = Post.objects.get(pk=data['results'][0]['id'])
+        second = Post.objects.get(pk=data['results'][2]['id'])
+        self.assertEqual(
+            (first.text, first.group), ('Первый пакетный', self.group))
+        self.assertEqual(second.text, 'Второй пакетный')
+        self.assertEqual(
+            AuthorStats.objects.get(user=self.author).posts_count, 2)
+        self.assertEqual(
+            FeedItem.objects.filter(user=self.reader).count(), 2)
+        self.assertEqual(set(search_posts('пакетный')), {first, second})
+        feed = self.client.get(reverse('api_v1:index')).json()
+        self.assertEqual(len(feed['results']), 2)
+
+    def test_batch_comments(self):
+        """Комментарии к разным постам создаются одной пачкой."""
+        posts = [
+            Post.objects.create(author=self.author, text=f'Пост {number}')
+            for number in range(2)
+        ]
+        items = [
+            {'post': posts[0].pk, 'text': 'Раз'},
+            {'post': posts[1].pk, 'text': 'Два'},
+            {'post': posts[0].pk, 'text': 'Три'},
+            {'post': 0, 'text': 'Мимо'},
+            'не объект',
+        ]
+        data = self.post_items('create_comments', items).json()
+        self.assertEqual(data['created'], 3)
+        self.assertIn('post', data['results'][3]['errors'])
+        self.assertIn('errors', data['results'][4])
+        self.assertEqual(
+            Comment.objects.get(pk=data['results'][2]['id']).text, 'Три')
+        posts[0].refresh_from_db()
+        self.assertEqual(posts[0].comments_count, 2)
+
+    def test_batch_comments_reject_non_integer_post(self):
+        """Список, объект, bool и float вместо id поста — ошибка элемента."""
+        # True и 1.0 равны 1, поэтому пост с таким id должен существовать.
+        post = Post.objects.create(pk=1, author=self.author, text='Пост')
+        items = [
+            {'post': value, 'text': 'Мимо'}
+            for value in ([post.pk], {}, True, 1.0)
+        ]
+        response = self.post_items('create_comments', items)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['created'], 0)
+        for result in data['results']:
+            self.assertIn('post', result['errors'])
+        self.assertFalse(Comment.objects.exists())
+
+    def test_batch_rejects_bad_requests(self):
+        """Аноним, битый JSON и слишком большая пачка отклоняются."""
+        url = reverse('api_v1:create_posts')
+        self.assertEqual(
+            self.client.post(
+                url, data='{', content_type='application/json'
+            ).status_code,
+            400,
+        )
+        self.assertEqual(
+            self.post_items(
+                'create_posts', [{}] * (BATCH_LIMIT + 1)
+            ).status_code,
+            400,
+        )
+        self.client.logout()
+        self.assertEqual(
+            self.post_items('create_posts', []).status_code, 401)
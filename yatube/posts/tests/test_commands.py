@@ -0,0 +1,341 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import QuerySet
+from django.test import TestCase, override_settings
+
+from posts import counters
+from posts.cache import (
+    INDEX_SCOPE, author_scope, feed_version, post_scope,
+)
+from posts.models import (
+    AuthorStats, Comment, FeedItem, Follow, Group, Post,
+)
+from posts.search import search_posts
+from posts.thumbnails import get_ready_thumbnail
+
+User = get_user_model()
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class WarmThumbnailsCommandTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='warm_author')
+        cls.posts = [
+            Post.objects.create(
+                author=cls.user,
+                text=f'Пост {number}',
+                image=SimpleUploadedFile(
+                    f'warm{number}.gif', SMALL_GIF, 'image/gif'),
+            )
+            for number in range(3)
+        ]
+        Post.objects.create(author=cls.user, text='Без картинки')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def warm(self, **options):
+        out = StringIO()
+        call_command('warm_thumbnails', workers=1, stdout=out, **options)
+        return out.getvalue()
+
+    def test_builds_missing_thumbnails(self):
+        """Команда строит миниатюры и пропускает готовые."""
+        self.assertIn('Создано: 3, уже были: 0', self.warm())
+        for post in self.posts:
+            with self.subTest(post=post):
+                self.assertIsNotNone(get_ready_thumbnail(
+                    post.image, '960x339', crop='center', upscale=True))
+        self.assertIn('Создано: 0, уже были: 3', self.warm())
+
+    def test_bumps_feeds_with_new_thumbnails(self):
+        """Фрагменты лент с новыми миниатюрами сбрасываются."""
+        cache.clear()
+        scopes = (INDEX_SCOPE, author_scope(self.user.pk),
+                  post_scope(self.posts[0].pk))
+        before = feed_version(*scopes)
+        self.warm()
+        warmed = feed_version(*scopes)
+        self.assertNotEqual(warmed, before)
+        self.warm()
+        self.assertEqual(feed_version(*scopes), warmed)
+
+    def test_resumes_from_checkpoint(self):
+        """С файлом прогресса повторный запуск продолжает с места."""
+        checkpoint = os.path.join(TEMP_MEDIA_ROOT, 'warm.checkpoint')
+        self.warm(start_id=self.posts[0].pk, checkpoint=checkpoint)
+        with open(checkpoint) as progress:
+            self.assertEqual(int(progress.read()), self.posts[-1].pk)
+        self.assertIn('Создано: 0, уже были: 0', self.warm(
+            checkpoint=checkpoint))
+
+
+class ReconcileCountersCommandTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='reconcile_reader')
+        cls.author = User.objects.create(username='reconcile_author')
+        cls.post = Post.objects.create(author=cls.author, text='Пост')
+        Comment.objects.create(
+            post=cls.post, author=cls.user, text='Комментарий')
+        Follow.objects.create(user=cls.user, author=cls.author)
+
+    def test_reconcile_fixes_drift(self):
+        """Команда возвращает разошедшиеся счётчики к реальным значениям."""
+        AuthorStats.objects.filter(user=self.author).update(
+            posts_count=10, followers_count=0)
+        AuthorStats.objects.filter(user=self.user).delete()
+        Post.objects.filter(pk=self.post.pk).update(comments_count=7)
+        out = StringIO()
+        call_command('reconcile_counters', batch_size=1, stdout=out)
+        self.assertIn('пользователей: 2, постов: 1', out.getvalue())
+        author = AuthorStats.objects.get(user=self.author)
+        self.assertEqual(
+            (author.posts_count, author.followers_count), (1, 1))
+        self.assertEqual(
+            AuthorStats.objects.get(user=self.user).following_count, 1)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 1)
+        out = StringIO()
+        call_command('reconcile_counters', stdout=out)
+        self.assertIn('пользователей: 0, постов: 0', out.getvalue())
+
+
+class SearchIndexCommandTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='index_author')
+        cls.posts = [
+            Post.objects.create(author=cls.user, text=f'Заметка номер{n}')
+            for n in range(5)
+        ]
+        Comment.objects.create(
+            post=cls.posts[0], author=cls.user, text='Отличная заметка')
+
+    def index(self, **options):
+        out = StringIO()
+        call_command('search_index', batch_size=2, stdout=out, **options)
+        return out.getvalue()
+
+    def found(self, query):
+        return set(search_posts(query))
+
+    def test_rebuild_fills_empty_index(self):
+        """Перестройка заново заполняет очищенный индекс пачками."""
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM posts_search')
+        self.assertEqual(self.found('заметка'), set())
+        self.assertIn('Проиндексировано строк: 6', self.index(rebuild=True))
+        self.assertEqual(self.found('заметка'), set(self.posts))
+        self.assertEqual(self.found('отличная'), {self.posts[0]})
+
+    def test_resumes_from_checkpoint(self):
+        """С файлом прогресса индексируются только новые строки."""
+        checkpoint = os.path.join(tempfile.mkdtemp(), 'search.checkpoint')
+        self.index(checkpoint=checkpoint)
+        Post.objects.create(author=self.user, text='Новая запись')
+        self.assertIn(
+            'Проиндексировано строк: 1', self.index(checkpoint=checkpoint))
+        shutil.rmtree(os.path.dirname(checkpoint))
+
+    def test_resumes_interrupted_parallel_ranges(self):
+        """Оборванные диапазоны продолжаются каждый со своего места."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        checkpoint = os.path.join(directory, 'search.checkpoint')
+        ranges = (
+            {'after': self.posts[2].pk, 'up_to': self.posts[2].pk},
+            {'after': self.posts[3].pk, 'up_to': None},
+        )
+        for number, bounds in enumerate(ranges):
+            with open(f'{checkpoint}.post.{number}', 'w') as saved:
+                json.dump(bounds, saved)
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM posts_search')
+        self.assertIn(
+            'Проиндексировано строк: 2', self.index(checkpoint=checkpoint))
+        # posts[0] находится по комментарию, проиндексированному заново.
+        self.assertEqual(
+            self.found('заметка'), {self.posts[0], self.posts[4]})
+        with open(checkpoint) as saved:
+            self.assertEqual(json.load(saved)['post'], self.posts[4].pk)
+        self.assertEqual(os.listdir(directory), ['search.checkpoint'])
+
+    def test_verify_repairs_drift(self):
+        """Сверка находит изменённые, пропавшие и лишние записи."""
+        Post.objects.filter(pk=self.posts[1].pk).update(text='Правка мимо')
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'DELETE FROM posts_search WHERE rowid = %s',
+                [self.posts[2].pk * 2],
+            )
+        Post.objects.filter(pk=self.posts[3].pk).delete()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO posts_search (rowid, text, kind, post_id) "
+                "VALUES (%s, 'Заметка-призрак', 'post', %s)",
+                [self.posts[3].pk * 2, self.posts[3].pk],
+            )
+        self.assertIn(
+            'Исправлено записей индекса: 3', self.index(verify=True))
+        self.assertEqual(self.found('мимо'), {self.posts[1]})
+        self.assertEqual(
+            self.found('заметка'),
+            {self.posts[0], self.posts[2], self.posts[4]}
+        )
+        self.assertIn(
+            'Исправлено записей индекса: 0', self.index(verify=True))
+
+
+class BenchmarkViewsCommandTest(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.output = os.path.join(directory.name, 'run.json')
+
+    def benchmark(self, **options):
+        call_command(
+            'benchmark_views', requests=3, warmup=1, output=self.output,
+            stdout=StringIO(), **options
+        )
+        with open(self.output) as output:
+            return json.load(output)
+
+    def test_populates_and_reports_every_view(self):
+        """Наполняет базу и пишет метрики каждой вьюхи в JSON."""
+        result = self.benchmark(
+            populate=True, users=30, groups=3, posts=120, comments=60,
+            follows=4,
+        )
+        self.assertEqual(result['meta']['rows']['post'], 120)
+        self.assertEqual(set(result['views']), {
+            'index', 'group_posts', 'profile', 'post_detail',
+            'follow_index', 'add_comment', 'post_create',
+        })
+        for metrics in result['views'].values():
+            self.assertLessEqual(metrics['p50_ms'], metrics['p99_ms'])
+            self.assertGreater(metrics['peak_memory_kib'], 0)
+        self.assertEqual(counters.reconcile_authors(), 0)
+        self.assertEqual(counters.reconcile_posts(), 0)
+        self.assertTrue(FeedItem.objects.exists())
+
+    def test_compare_fails_on_regression(self):
+        """Рост числа запросов к прошлому прогону роняет команду."""
+        baseline = self.benchmark(
+            populate=True, users=10, groups=2, posts=30, comments=10,
+            follows=2,
+        )
+        for metrics in baseline['views'].values():
+            metrics['queries'] = 0
+        with open(self.output, 'w') as output:
+            json.dump(baseline, output)
+        with self.assertRaisesMessage(CommandError, 'post_create.queries'):
+            call_command(
+                'benchmark_views', requests=3, warmup=1,
+                views=['post_create'], compare=self.output,
+                stdout=StringIO(),
+            )
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class GenerateDataCommandTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def generate(self, **options):
+        out = StringIO()
+        call_command(
+            'generate_data', users=40, groups=4, posts=300, comments=200,
+            follows=5, images=0.5, days=30, batch_size=70, stdout=out,
+            **options
+        )
+        return out.getvalue()
+
+    def test_generates_consistent_data(self):
+        """Строки созданы, а счётчики, ленты и индекс с ними сходятся."""
+        self.assertIn(
+            'Создано: users 40, groups 4, posts 300', self.generate()
+        )
+        self.assertEqual(User.objects.count(), 40)
+        self.assertEqual(Group.objects.count(), 4)
+        self.assertEqual(Post.objects.count(), 300)
+        self.assertEqual(Comment.objects.count(), 200)
+        self.assertTrue(Follow.objects.exists())
+        self.assertTrue(FeedItem.objects.exists())
+        self.assertTrue(Post.objects.exclude(image='').exists())
+        self.assertEqual(counters.reconcile_authors(), 0)
+        self.assertEqual(counters.reconcile_posts(), 0)
+        post = Post.objects.first()
+        self.assertIn(post, search_posts(post.text.split()[0]))
+
+    def test_dates_follow_ids(self):
+        """Даты постов растут с id, комментарии не раньше поста."""
+        self.generate()
+        dates = list(
+            Post.objects.order_by('pk').values_list('pub_date', flat=True)
+        )
+        self.assertEqual(dates, sorted(dates))
+        for comment in Comment.objects.select_related('post')[:50]:
+            self.assertGreaterEqual(comment.created, comment.post.pub_date)
+
+    def test_model_fields_are_not_touched(self):
+        """Пока идёт вставка, auto_now_add у полей дат не выключается."""
+        flags = []
+        bulk_create = QuerySet.bulk_create
+
+        def watch(queryset, *args, **kwargs):
+            flags.extend(
+                field.auto_now_add for field in (
+                    Post._meta.get_field('pub_date'),
+                    Comment._meta.get_field('created'),
+                )
+            )
+            return bulk_create(queryset, *args, **kwargs)
+        with mock.patch.object(QuerySet, 'bulk_create', watch):
+            self.generate()
+        self.assertTrue(flags)
+        self.assertTrue(all(flags))
+
+    def test_popular_authors_dominate(self):
+        """Авторы распределены по Ципфу: у первого поста много больше."""
+        self.generate()
+        counts = sorted(
+            AuthorStats.objects.values_list('posts_count', flat=True),
+            reverse=True,
+        )
+        self.assertGreater(counts[0], 300 / 40 * 3)
+
+    def test_appends_to_existing_data(self):
+        """Повторный запуск добавляет строки, не конфликтуя с прежними."""
+        self.generate()
+        self.generate(seed=1)
+        self.assertEqual(User.objects.count(), 80)
+        self.assertEqual(Post.objects.count(), 600)
@@ -1,6 +1,36 @@
+import json
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import Counter
 from http import HTTPStatus
+from contextlib import closing
+from io import StringIO
+from unittest import mock
 
-from django.test import Client, TestCase
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import OperationalError, connection, transaction
+from django.test import (
+    Client, SimpleTestCase, TestCase, TransactionTestCase, override_settings,
+)
+from django.urls import reverse
+
+from core.cache import SQLiteCache
+from core import metrics, profiling, slow_queries, timing
+from core.db import retry_on_lock
+from core.env import optional_float
+from core.middleware import ReplicaMiddleware
+from core.routers import replica_reads
+from posts.cache import bump, replica_scope
+from posts.models import Post
+
+User = get_user_model()
 
 
 class CoreUrlsTest(TestCase):
@@ -12,3 +42,658 @@ class CoreUrlsTest(TestCase):
     def test_404(self):
         response = CoreUrlsTest.guest_client.get('/core/тест/')
         self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+
+def incr_in_process(path, times):
+    cache = SQLiteCache(path, {})
+    for _ in range(times):
+        cache.incr('version')
+
+
+class SQLiteCacheTest(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'cache.sqlite3')
+        self.cache = SQLiteCache(self.path, {})
+
+    def test_basic_operations(self):
+        """Кэш поддерживает операции стандартного бэкенда."""
+        self.cache.set('key', {'value': 1})
+        self.assertEqual(self.cache.get('key'), {'value': 1})
+        self.assertFalse(self.cache.add('key', 'other'))
+        self.assertTrue(self.cache.add('new', 'other'))
+        self.cache.set_many({'a': 1, 'b': 2})
+        self.assertEqual(
+            self.cache.get_many(['a', 'b', 'missing']), {'a': 1, 'b': 2}
+        )
+        self.cache.delete('a')
+        self.assertIsNone(self.cache.get('a'))
+        self.assertEqual(self.cache.incr('b', 5), 7)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+
+    def test_expired_keys_are_missing(self):
+        """Просроченная запись не возвращается и не мешает add."""
+        self.cache.set('key', 'value', 0.01)
+        time.sleep(0.02)
+        self.assertIsNone(self.cache.get('key'))
+        self.assertTrue(self.cache.add('key', 'fresh'))
+
+    def test_entries_are_shared_between_processes(self):
+        """Запись и incr одного процесса видны остальным."""
+        other = SQLiteCache(self.path, {})
+        self.cache.set('version', 0, None)
+        self.assertEqual(other.get('version'), 0)
+        workers = [
+            multiprocessing.Process(
+                target=incr_in_process, args=(self.path, 25)
+            )
+            for _ in range(4)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(other.get('version'), 100)
+
+
+class SQLiteProfileTest(TestCase):
+    def pragma(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_connection_gets_pragmas(self):
+        """Новое соединение получает прагмы из SQLITE_PRAGMAS."""
+        self.assertEqual(self.pragma('synchronous'), 1)
+        self.assertEqual(self.pragma('busy_timeout'), 20000)
+        self.assertEqual(self.pragma('cache_size'), -64 * 1024)
+
+
+def failing_write(errors, error=sqlite3.OperationalError):
+    """Запись, которая первые errors раз падает на блокировке."""
+    calls = []
+
+    @retry_on_lock
+    def write():
+        calls.append(1)
+        if len(calls) <= errors:
+            raise error('database is locked')
+        return 'ok'
+    return write, calls
+
+
+@override_settings(DATABASE_LOCK_RETRIES=2, DATABASE_LOCK_RETRY_DELAY=0)
+class RetryOnLockTest(SimpleTestCase):
+    def test_retries_locked_write(self):
+        """Запись, упавшая на блокировке, повторяется."""
+        write, calls = failing_write(errors=2)
+        self.assertEqual(write(), 'ok')
+        self.assertEqual(len(calls), 3)
+
+    def test_gives_up_after_retries(self):
+        """После DATABASE_LOCK_RETRIES повторов ошибка пробрасывается."""
+        write, calls = failing_write(errors=3)
+        with self.assertRaises(sqlite3.OperationalError):
+            write()
+        self.assertEqual(len(calls), 3)
+
+    def test_other_errors_are_not_retried(self):
+        """Прочие ошибки базы не повторяются."""
+        calls = []
+
+        @retry_on_lock
+        def write():
+            calls.append(1)
+            raise OperationalError('no such table: posts_post')
+        with self.assertRaises(OperationalError):
+            write()
+        self.assertEqual(len(calls), 1)
+
+
+@override_settings(DATABASE_LOCK_RETRY_DELAY=0)
+class RetryOnLockInTransactionTest(TestCase):
+    def test_not_retried_inside_atomic(self):
+        """Внутри открытой транзакции повтор оставлен внешнему уровню."""
+        write, calls = failing_write(errors=1, error=OperationalError)
+        with self.assertRaises(OperationalError), transaction.atomic():
+            write()
+        self.assertEqual(len(calls), 1)
+
+
+class BenchmarkWritesCommandTest(SimpleTestCase):
+    def test_tuned_profile_writes_everything(self):
+        """С профилем и повторами все параллельные записи доходят."""
+        out = StringIO()
+        call_command(
+            'benchmark_writes', workers=2, writes=20, stdout=out
+        )
+        self.assertIn('default: записано', out.getvalue())
+        self.assertIn('tuned: записано 40 из 40', out.getvalue())
+
+
+def replicate(*objs):
+    """Доносит строки до реплики, как это сделала бы репликация."""
+    for obj in objs:
+        type(obj).objects.using('replica').bulk_create([obj])
+    bump(replica_scope('replica'))
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingTest(TestCase):
+    databases = {'default', 'replica'}
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username='replica_author')
+        cls.post = Post.objects.create(author=cls.author, text='Старый пост')
+        replicate(cls.author, cls.post)
+
+    def setUp(self):
+        cache.clear()
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+
+    def test_reads_outside_requests_use_primary(self):
+        """Вне запроса и после записи чтения идут в основную базу."""
+        self.assertEqual(Post.objects.all().db, 'default')
+        with replica_reads():
+            self.assertEqual(Post.objects.all().db, 'replica')
+            Post.objects.filter(pk=self.post.pk).update(text='Правка')
+            self.assertEqual(Post.objects.all().db, 'default')
+        with replica_reads(enabled=False):
+            self.assertEqual(Post.objects.all().db, 'default')
+
+    def test_guest_reads_lagging_replica(self):
+        """Гость видит реплику, а с ней и новое поколение кэша."""
+        fresh = Post.objects.create(author=self.author, text='Свежий пост')
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'Старый пост')
+        self.assertNotContains(response, 'Свежий пост')
+        replicate(fresh)
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'Свежий пост')
+
+    def test_author_reads_own_writes(self):
+        """После записи автор читает из основной базы, гость — нет."""
+        response = self.author_client.post(
+            reverse('posts:add_comment', args=(self.post.pk,)),
+            {'text': 'Мой комментарий'},
+        )
+        cookie = response.cookies[ReplicaMiddleware.cookie_name]
+        self.assertEqual(cookie['max-age'], 10)
+        detail = reverse('posts:post_detail', args=(self.post.pk,))
+        self.assertContains(
+            self.author_client.get(detail), 'Мой комментарий'
+        )
+        self.assertNotContains(self.client.get(detail), 'Мой комментарий')
+        self.author_client.post(
+            reverse('posts:post_create'), {'text': 'Новый пост автора'}
+        )
+        self.assertContains(
+            self.author_client.get(
+                reverse('posts:profile', args=(self.author.username,))
+            ),
+            'Новый пост автора',
+        )
+
+    def test_follow_starts_sticky_window(self):
+        """Подписка GET-запросом тоже включает чтение из основной базы."""
+        reader = User.objects.create(username='replica_reader')
+        replicate(reader)
+        reader_client = Client()
+        reader_client.force_login(reader)
+        response = reader_client.get(
+            reverse('posts:profile_follow', args=(self.author.username,))
+        )
+        self.assertIn(ReplicaMiddleware.cookie_name, response.cookies)
+        response = self.client.get(reverse('posts:index'))
+        self.assertNotIn(ReplicaMiddleware.cookie_name, response.cookies)
+
+
+class SyncReplicaCommandTest(TransactionTestCase):
+    databases = {'default', 'replica'}
+
+    def test_copies_primary_into_replica(self):
+        """Команда копирует основную базу в реплику."""
+        author = User.objects.create(username='synced_author')
+        Post.objects.create(author=author, text='Синхронизированный пост')
+        self.assertFalse(Post.objects.using('replica').exists())
+        out = StringIO()
+        call_command('sync_replica', 'replica', stdout=out)
+        self.assertIn('Реплика replica синхронизирована.', out.getvalue())
+        self.assertEqual(
+            Post.objects.using('replica').get().text,
+            'Синхронизированный пост',
+        )
+
+
+class TimingMiddlewareTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username='timing_author')
+        Post.objects.create(author=cls.author, text='Замеряемый пост')
+
+    def setUp(self):
+        cache.clear()
+
+    def get_index(self):
+        with self.assertLogs('core.middleware', 'INFO') as logs:
+            response = self.client.get(reverse('posts:index'))
+        return response, json.loads(logs.records[-1].getMessage())
+
+    @override_settings(REQUEST_TIMING_SAMPLE_RATE=1)
+    def test_sampled_request_gets_breakdown(self):
+        """Запрос в выборке получает Server-Timing и строку в логе."""
+        response, record = self.get_index()
+        header = response['Server-Timing']
+        for metric in ('db;dur=', 'tpl;dur=', 'thumb;dur=', 'total;dur='):
+            self.assertIn(metric, header)
+        self.assertIn(f'desc="{record["queries"]} queries"', header)
+        self.assertEqual(record['view'], 'posts:index')
+        self.assertEqual(record['status'], 200)
+        self.assertGreater(record['queries'], 0)
+        self.assertGreater(record['tpl_ms'], 0)
+        self.assertGreater(record['cache_misses'], 0)
+        self.assertGreaterEqual(record['total_ms'], record['db_ms'])
+
+    @override_settings(REQUEST_TIMING_SAMPLE_RATE=1)
+    def test_cache_hits_are_counted(self):
+        """Повторный запрос к закэшированной ленте — попадания в кэш."""
+        self.get_index()
+        _, record = self.get_index()
+        self.assertGreater(record['cache_hits'], 0)
+        self.assertEqual(record['cache_misses'], 0)
+
+    def test_sampling_is_off_in_tests(self):
+        """Тестовый раннер выключает выборку, чтобы лог не шумел."""
+        self.assertEqual(settings.REQUEST_TIMING_SAMPLE_RATE, 0)
+
+    @override_settings(REQUEST_TIMING_SAMPLE_RATE=0)
+    def test_unsampled_request_is_untouched(self):
+        """Запрос вне выборки идёт без заголовка и записи в лог."""
+        response = self.client.get(reverse('posts:index'))
+        self.assertFalse(response.has_header('Server-Timing'))
+
+
+def observe_in_worker():
+    """Воркер после fork: три запроса и сброс итогов в хранилище."""
+    for _ in range(3):
+        metrics.REQUESTS.inc(view='posts:index', status=200)
+    metrics.REGISTRY.flush()
+
+
+class MetricsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username='metrics_author')
+        Post.objects.create(author=cls.author, text='Пост для метрик')
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        overrides = override_settings(
+            METRICS_STORE=os.path.join(directory.name, 'metrics.sqlite3'),
+            METRICS_TOKEN='secret',
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        cache.clear()
+        metrics.REGISTRY.clear()
+
+    def scrape(self, token='secret'):
+        response = self.client.get(
+            reverse('metrics'), HTTP_AUTHORIZATION=f'Bearer {token}'
+        )
+        return response, response.content.decode()
+
+    def test_shards_are_aggregated(self):
+        """Наблюдения разных потоков складываются при сборе."""
+        histogram = metrics.REGISTRY.histogram(
+            'test_shard_seconds', 'Тест.', buckets=(1, 5)
+        )
+        self.addCleanup(metrics.REGISTRY.metrics.remove, histogram)
+        histogram.observe(0.5, view='a')
+        worker = threading.Thread(target=histogram.observe, args=(3,),
+                                  kwargs={'view': 'a'})
+        worker.start()
+        worker.join()
+        text = metrics.REGISTRY.render()
+        self.assertIn('test_shard_seconds_bucket{view="a",le="1"} 1', text)
+        self.assertIn('test_shard_seconds_bucket{view="a",le="5"} 2', text)
+        self.assertIn('test_shard_seconds_bucket{view="a",le="+Inf"} 2',
+                      text)
+        self.assertIn('test_shard_seconds_sum{view="a"} 3.5', text)
+        self.assertIn('test_shard_seconds_count{view="a"} 2', text)
+
+    def test_requests_are_exposed_per_view(self):
+        """Эндпоинт отдаёт гистограммы по имени URL и долю попаданий."""
+        self.client.get(reverse('posts:index'))
+        self.client.get(reverse('posts:index'))
+        response, text = self.scrape()
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        self.assertIn('# TYPE yatube_request_duration_seconds histogram',
+                      text)
+        self.assertIn(
+            'yatube_request_duration_seconds_count{view="posts:index"} 2',
+            text,
+        )
+        self.assertIn(
+            'yatube_requests_total{status="200",view="posts:index"} 2', text
+        )
+        self.assertIn('yatube_request_queries_bucket{view="posts:index"',
+                      text)
+        self.assertIn('yatube_cache_requests_total{result="hit"}', text)
+        self.assertIn('yatube_cache_hit_ratio ', text)
+
+    def test_workers_are_aggregated(self):
+        """Сбор в любом воркере суммирует итоги всех процессов."""
+        metrics.REQUESTS.inc(view='posts:index', status=200)
+        worker = multiprocessing.get_context('fork').Process(
+            target=observe_in_worker
+        )
+        worker.start()
+        worker.join()
+        _, text = self.scrape()
+        self.assertIn(
+            'yatube_requests_total{status="200",view="posts:index"} 4', text
+        )
+
+    def test_store_does_not_grow_with_workers(self):
+        """Сменившиеся воркеры не оставляют в хранилище своих строк."""
+        for _ in range(3):
+            worker = multiprocessing.get_context('fork').Process(
+                target=observe_in_worker
+            )
+            worker.start()
+            worker.join()
+        _, text = self.scrape()
+        self.assertIn(
+            'yatube_requests_total{status="200",view="posts:index"} 9', text
+        )
+        with closing(sqlite3.connect(settings.METRICS_STORE)) as store:
+            (rows,) = store.execute(
+                'SELECT COUNT(*) FROM metric_totals WHERE name = ?',
+                ('yatube_requests_total',),
+            ).fetchone()
+        self.assertEqual(rows, 1)
+
+    def test_busy_store_does_not_block_request(self):
+        """Занятое хранилище сброс из запроса пропускает, а не ждёт."""
+        metrics.REGISTRY.flush()
+        metrics.REQUESTS.inc(view='posts:index', status=200)
+        with closing(sqlite3.connect(
+            settings.METRICS_STORE, isolation_level=None
+        )) as store:
+            store.execute('BEGIN IMMEDIATE')
+            started = time.monotonic()
+            with override_settings(METRICS_FLUSH_INTERVAL=0):
+                metrics.REGISTRY.flush_if_due()
+            self.assertLess(time.monotonic() - started, 1)
+            store.execute('ROLLBACK')
+        _, text = self.scrape()
+        self.assertIn(
+            'yatube_requests_total{status="200",view="posts:index"} 1', text
+        )
+
+    def test_finished_threads_are_retired(self):
+        """Шарды завершившихся потоков не копятся, а их итоги целы."""
+        for _ in range(5):
+            worker = threading.Thread(
+                target=metrics.REQUESTS.inc,
+                kwargs={'view': 'posts:index', 'status': 200},
+            )
+            worker.start()
+            worker.join()
+        self.assertLessEqual(len(metrics.REGISTRY.shards), 2)
+        self.assertIn(
+            'yatube_requests_total{status="200",view="posts:index"} 5',
+            metrics.REGISTRY.render(),
+        )
+
+    def test_token_is_required(self):
+        """Без верного токена, как и без заданного, отвечаем 404."""
+        response, _ = self.scrape(token='wrong')
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+        with override_settings(METRICS_TOKEN=None):
+            response, _ = self.scrape(token='None')
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+
+@override_settings(SLOW_QUERY_MS=0)
+class SlowQueryLogTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username='slow_author')
+        cls.post = Post.objects.create(author=cls.author, text='Пост')
+
+    def logged(self, run):
+        with self.assertLogs('core.slow_queries', 'WARNING') as logs:
+            run()
+        return [json.loads(record.getMessage()) for record in logs.records]
+
+    def test_request_queries_are_logged_with_plan(self):
+        """Медленный запрос пишется с view, местом вызова и планом."""
+        cache.clear()
+        records = self.logged(
+            lambda: self.client.get(reverse('posts:index'))
+        )
+        feed = [record for record in records
+                if 'posts_post' in record['sql'] and record['plan']]
+        self.assertTrue(feed)
+        self.assertEqual(feed[0]['view'], 'posts:index')
+        self.assertTrue(feed[0]['call_site'].startswith('posts/'))
+
+    def test_full_scan_is_flagged(self):
+        """Проход по всей таблице отмечается, поиск по ключу — нет."""
+        def run():
+            with timing.request():
+                list(Post.objects.filter(text__contains='Пост').order_by())
+                Post.objects.get(pk=self.post.pk)
+        scan, lookup = self.logged(run)
+        self.assertEqual(scan['full_scan'], ['posts_post'])
+        self.assertEqual(lookup['full_scan'], [])
+        self.assertEqual(lookup['params'], [self.post.pk])
+
+    def test_index_walk_without_limit_is_flagged(self):
+        """Проход по всему индексу — полный, если его не ограничил LIMIT."""
+        plan = ['SCAN posts_post USING COVERING INDEX post_pub_date_idx']
+        count = 'SELECT COUNT(*) FROM posts_post'
+        page = 'SELECT id FROM posts_post ORDER BY pub_date LIMIT 10'
+        self.assertEqual(
+            slow_queries.full_scans(plan, count), ['posts_post']
+        )
+        self.assertEqual(slow_queries.full_scans(plan, page), [])
+
+    def scanned(self, sql):
+        plan = slow_queries.explain(connection, sql, [])
+        return slow_queries.full_scans(plan, sql)
+
+    def test_limit_of_subquery_does_not_bound_outer_scan(self):
+        """LIMIT вложенного SELECT не ограничивает проход внешнего."""
+        self.assertIn('posts_post', self.scanned(
+            'SELECT id FROM posts_post WHERE text IN '
+            '(SELECT text FROM posts_comment LIMIT 3) ORDER BY group_id'
+        ))
+        self.assertNotIn('posts_post', self.scanned(
+            'SELECT COUNT(*) FROM (SELECT id FROM posts_post '
+            'ORDER BY pub_date DESC LIMIT 5) subquery'
+        ))
+
+    def test_temp_btree_sort_is_not_bounded(self):
+        """Сортировка во временном B-дереве читает весь индекс."""
+        sql = 'SELECT group_id FROM posts_post ORDER BY group_id, text LIMIT 1'
+        self.assertIn(
+            'USE TEMP B-TREE',
+            '\n'.join(slow_queries.explain(connection, sql, [])),
+        )
+        self.assertEqual(self.scanned(sql), ['posts_post'])
+        self.assertEqual(self.scanned(
+            'SELECT id FROM posts_post ORDER BY pub_date DESC LIMIT 10'
+        ), [])
+
+    def test_secret_params_are_not_logged(self):
+        """Параметры записей и запросов к сессиям и паролям не пишутся."""
+        def run():
+            with timing.request():
+                self.author.set_password('секрет')
+                self.author.save()
+                Post.objects.filter(pk=self.post.pk).update(text='Новый')
+                User.objects.get(username='slow_author')
+        records = self.logged(run)
+        self.assertTrue(records)
+        for record in records:
+            self.assertIsNone(record['params'], record['sql'])
+        self.assertNotIn(self.author.password, json.dumps(records))
+
+    @override_settings(SLOW_QUERY_MS=None)
+    def test_disabled_log_writes_nothing(self):
+        """Без порога журнал не пишется."""
+        with mock.patch.object(slow_queries.logger, 'warning') as warning:
+            with timing.request():
+                Post.objects.count()
+        warning.assert_not_called()
+
+    def test_log_is_disabled_from_environment(self):
+        """Пустой YATUBE_SLOW_QUERY_MS или off выключают журнал."""
+        values = {'': None, 'off': None, ' OFF ': None, '250': 250.0}
+        for value, expected in values.items():
+            with self.subTest(value=value), mock.patch.dict(
+                os.environ, {'YATUBE_SLOW_QUERY_MS': value}
+            ):
+                self.assertEqual(
+                    optional_float('YATUBE_SLOW_QUERY_MS', 100), expected
+                )
+        with mock.patch.dict(os.environ):
+            os.environ.pop('YATUBE_SLOW_QUERY_MS', None)
+            self.assertEqual(optional_float('YATUBE_SLOW_QUERY_MS', 100), 100)
+
+
+class SlowQueryReportTest(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'slow.log')
+        record = {
+            'time': '2026-01-01T00:00:00+00:00', 'duration_ms': 250.0,
+            'database': 'default', 'view': 'posts:search',
+            'call_site': 'posts/search.py:10 in search_posts',
+            'sql': 'SELECT * FROM posts_post WHERE text LIKE %s',
+            'params': ['%тест%'], 'plan': ['SCAN posts_post'],
+            'full_scan': ['posts_post'],
+        }
+        with open(self.path, 'w', encoding='utf-8') as log:
+            log.write(json.dumps(record) + '\n')
+        with open(self.path + '.1', 'w', encoding='utf-8') as log:
+            log.write(json.dumps({**record, 'duration_ms': 150.0}) + '\n')
+        self.staff = User.objects.create(username='staff', is_staff=True)
+
+    def test_report_groups_rotated_records(self):
+        """Отчёт собирает ротированные файлы и отмечает полный проход."""
+        self.client.force_login(self.staff)
+        with override_settings(SLOW_QUERY_LOG=self.path):
+            response = self.client.get(reverse('slow_queries'))
+        row, = response.context['rows']
+        self.assertEqual(row['count'], 2)
+        self.assertEqual(row['total_ms'], 400.0)
+        self.assertContains(response, 'FULL SCAN: posts_post')
+
+    def test_admin_index_links_diagnostics(self):
+        """Главная админки ведёт к медленным запросам и профилям."""
+        self.staff.is_superuser = True
+        self.staff.save()
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('admin:index'))
+        self.assertContains(response, f'href="{reverse("slow_queries")}"')
+        self.assertContains(response, f'href="{reverse("profiles")}"')
+        self.assertContains(response, 'Группы')
+
+    def test_report_is_staff_only(self):
+        """Обычному пользователю отчёт не показывается."""
+        self.client.force_login(User.objects.create(username='reader'))
+        response = self.client.get(reverse('slow_queries'))
+        self.assertEqual(response.status_code, HTTPStatus.FOUND)
+
+
+def busy_loop(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+class ProfilerTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username='profiled_author')
+        cls.staff = User.objects.create(username='profiler', is_staff=True)
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(PROFILER_DIR=directory.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.directory = directory.name
+        self.client.force_login(self.staff)
+        self.url = reverse('posts:profile', args=('profiled_author',))
+
+    def test_sampler_collects_collapsed_stacks(self):
+        """Выборки складываются в стеки от внешнего вызова к текущему."""
+        with profiling.Sampler(threading.get_ident(), 0.001) as sampler:
+            busy_loop(0.05)
+        stack = sampler.stacks.most_common(1)[0][0]
+        self.assertTrue(stack.endswith(f'{__name__}:busy_loop'))
+
+    def test_staff_request_is_profiled(self):
+        """Запрос сотрудника с X-Profile сохраняет профиль в админку."""
+        response = self.client.get(self.url, HTTP_X_PROFILE='1')
+        name = response['X-Profile']
+        self.assertIn('posts-profile', name)
+        self.assertTrue(os.path.isfile(os.path.join(self.directory, name)))
+        listing = self.client.get(reverse('profiles'))
+        self.assertEqual(listing.context['profiles'][0]['name'], name)
+        download = self.client.get(reverse('profile_file', args=(name,)))
+        self.assertEqual(download.status_code, HTTPStatus.OK)
+        missing = self.client.get(
+            reverse('profile_file', args=('..' + name,))
+        )
+        self.assertEqual(missing.status_code, HTTPStatus.NOT_FOUND)
+
+    @override_settings(PROFILER_KEEP=1)
+    def test_old_profiles_are_removed(self):
+        """Сверх PROFILER_KEEP хранятся только последние профили."""
+        self.client.get(self.url + '?_profile')
+        self.client.get(self.url + '?_profile')
+        self.assertEqual(len(os.listdir(self.directory)), 1)
+
+    @override_settings(PROFILER_KEEP=1)
+    def test_profile_removed_by_another_request(self):
+        """Файл, удалённый соседним запросом, не роняет ни save, ни список."""
+        gone = '20260101-000000-posts-index-5ms-abcdef.collapsed'
+        with open(os.path.join(self.directory, gone), 'w') as profile:
+            profile.write('a;b 1\n')
+        real_remove = os.remove
+
+        def remove_twice(path):
+            real_remove(path)
+            real_remove(path)
+        with mock.patch('core.profiling.os.remove', remove_twice):
+            name = profiling.save(Counter({'a;b': 1}), 'posts:index', 0.01)
+        self.assertEqual(os.listdir(self.directory), [name])
+        with mock.patch('core.profiling.os.path.getsize',
+                        side_effect=FileNotFoundError):
+            self.assertEqual(profiling.list_profiles(), [])
+
+    def test_other_users_are_not_profiled(self):
+        """Заголовок от обычного пользователя игнорируется."""
+        self.client.force_login(self.author)
+        response = self.client.get(self.url, HTTP_X_PROFILE='1')
+        self.assertFalse(response.has_header('X-Profile'))
+        self.assertEqual(os.listdir(self.directory), [])
@@ -1,12 +1,19 @@
 import shutil
 import tempfile
+import unittest
+from io import BytesIO
 
 from django.contrib.auth import get_user_model
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 from posts.models import Group, Post, Comment
 from django.conf import settings
+from django.core.files.storage import default_storage
 from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image, features
+
+from core.metrics import REGISTRY
+from posts.images import save_variants, variant_name
 
 
 User = get_user_model()
@@ -96,3 +103,73 @@ class PostCreateFormTest(TestCase):
         self.assertEqual(Comment.objects.count(), comments_count)
         self.assertTrue(response, reverse(
             'posts:post_detail', kwargs={'post_id': self.post.id}), )
+
+
+def png_upload(name, size):
+    buffer = BytesIO()
+    Image.new('RGB', size, (200, 30, 30)).save(buffer, 'PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(), 'image/png')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, POSTS_IMAGE_MAX_SIDE=50)
+class PostImageUploadTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username='uploader')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.client.force_login(self.author)
+
+    def create_post(self, image):
+        return self.client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Пост с картинкой', 'image': image},
+        )
+
+    def test_large_image_is_downscaled(self):
+        """Большая картинка сохраняется уменьшенной мастер-копией."""
+        self.create_post(png_upload('wide.png', (200, 100)))
+        post = Post.objects.get(text='Пост с картинкой')
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.size, (50, 25))
+
+    def test_small_image_is_kept(self):
+        """Картинка в пределах лимита хранится без перекодирования."""
+        upload = png_upload('small.png', (40, 20))
+        content = upload.read()
+        upload.seek(0)
+        self.create_post(upload)
+        post = Post.objects.get(text='Пост с картинкой')
+        with open(post.image.path, 'rb') as stored:
+            self.assertEqual(stored.read(), content)
+
+    def test_upload_size_is_measured(self):
+        """Размер загрузки попадает в гистограмму метрик."""
+        REGISTRY.clear()
+        upload = png_upload('measured.png', (40, 20))
+        self.create_post(upload)
+        sizes = REGISTRY.totals()['yatube_upload_size_bytes', ()]
+        self.assertEqual(sizes[-1], upload.size)
+
+    @override_settings(POSTS_MAX_IMAGE_PIXELS=100)
+    def test_too_many_pixels_rejected(self):
+        """Картинка с огромным разрешением отклоняется по заголовку."""
+        response = self.create_post(png_upload('huge.png', (20, 20)))
+        self.assertFalse(Post.objects.exists())
+        self.assertTrue(response.context['form'].errors['image'])
+
+    @unittest.skipUnless(features.check('webp'), 'Pillow собран без WebP')
+    @override_settings(POSTS_IMAGE_VARIANTS=('WEBP',))
+    def test_webp_variant_saved(self):
+        """Рядом с мастер-копией сохраняется WebP-версия."""
+        self.create_post(png_upload('variant.png', (40, 20)))
+        name = Post.objects.get(text='Пост с картинкой').image.name
+        self.assertEqual(save_variants(name), [variant_name(name, 'WEBP')])
+        self.assertTrue(
+            default_storage.exists(variant_name(name, 'WEBP')))
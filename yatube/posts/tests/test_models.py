@@ -1,7 +1,12 @@
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from importlib import import_module
+from unittest import mock
 
-from posts.models import Group, Post
+from django.db import IntegrityError, connection, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from posts.models import AuthorStats, Comment, Follow, Group, Post
 
 User = get_user_model()
 
@@ -39,3 +44,113 @@ class PostModelTest(TestCase):
         group = PostModelTest.group
         help_text = group._meta.get_field('title').help_text
         self.assertEqual(help_text, 'Задача')
+
+
+class FollowModelTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='follower')
+        cls.author = User.objects.create(username='author')
+
+    def test_follow_is_unique(self):
+        """Повторная подписка отклоняется базой."""
+        Follow.objects.create(user=self.user, author=self.author)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Follow.objects.create(user=self.user, author=self.author)
+
+    def test_self_follow_is_rejected(self):
+        """Подписка на самого себя отклоняется базой."""
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Follow.objects.create(user=self.user, author=self.user)
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='reader')
+        cls.author = User.objects.create(username='writer')
+
+    def stats(self, user):
+        return AuthorStats.objects.get(user=user)
+
+    def test_post_and_comment_counters(self):
+        """Создание и удаление постов и комментариев сдвигает счётчики."""
+        post = Post.objects.create(author=self.author, text='Пост')
+        Post.objects.create(author=self.author, text='Ещё пост')
+        comment = Comment.objects.create(
+            post=post, author=self.user, text='Комментарий')
+        Comment.objects.create(post=post, author=self.user, text='Ещё')
+        self.assertEqual(self.stats(self.author).posts_count, 2)
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 2)
+        comment.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        post.delete()
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+
+    def test_follow_counters(self):
+        """Подписка и отписка меняют счётчики обеих сторон."""
+        Follow.objects.create(user=self.user, author=self.author)
+        self.assertEqual(self.stats(self.author).followers_count, 1)
+        self.assertEqual(self.stats(self.user).following_count, 1)
+        Follow.objects.filter(user=self.user).delete()
+        self.assertEqual(self.stats(self.author).followers_count, 0)
+        self.assertEqual(self.stats(self.user).following_count, 0)
+
+
+class DeleteUserTest(TransactionTestCase):
+    def test_user_with_posts_and_follows_is_deleted(self):
+        """Удаление пользователя не воскрешает его счётчики."""
+        user = User.objects.create(username='leaving')
+        other = User.objects.create(username='staying')
+        Post.objects.create(author=user, text='Пост')
+        Follow.objects.create(user=user, author=other)
+        Follow.objects.create(user=other, author=user)
+        user_id = user.pk
+        user.delete()
+        self.assertFalse(AuthorStats.objects.filter(user_id=user_id).exists())
+        stats = AuthorStats.objects.get(user=other)
+        self.assertEqual(stats.followers_count, 0)
+        self.assertEqual(stats.following_count, 0)
+
+
+class FeedMigrationTest(TransactionTestCase):
+    before = [('posts', '0008_auto_20221005_2005')]
+    after = [('posts', '0009_feeditem')]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        self.migrate(executor.loader.graph.leaf_nodes())
+
+    @override_settings(FEED_FANOUT_LIMIT=1)
+    def test_backfill_is_capped_like_rebuild(self):
+        """Миграция ограничивает ленту и пропускает популярных авторов."""
+        apps = self.migrate(self.before)
+        user_model = apps.get_model('auth', 'User')
+        post_model = apps.get_model('posts', 'Post')
+        follow_model = apps.get_model('posts', 'Follow')
+        reader, other, author, star = (
+            user_model.objects.create(username=name)
+            for name in ('reader', 'other', 'author', 'star')
+        )
+        for number in range(4):
+            post_model.objects.create(author=author, text=f'Пост {number}')
+            post_model.objects.create(author=star, text=f'Звезда {number}')
+        follow_model.objects.create(user=reader, author=author)
+        follow_model.objects.create(user=reader, author=star)
+        follow_model.objects.create(user=other, author=star)
+        migration = import_module('posts.migrations.0009_feeditem')
+        with mock.patch.object(migration, 'BACKFILL_POSTS', 3):
+            apps = self.migrate(self.after)
+        feed = apps.get_model('posts', 'FeedItem').objects
+        self.assertEqual(feed.count(), 3)
+        self.assertFalse(feed.filter(author_id=star.pk).exists())
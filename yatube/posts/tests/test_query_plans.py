@@ -0,0 +1,119 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post
+from posts.tests.utils import QueryPlanMixin
+from posts.utils import PAGINATOR_PAGE
+
+User = get_user_model()
+
+HOT_TABLES = ('posts_post', 'posts_comment', 'posts_follow')
+
+
+class QueryPlanRegressionTest(QueryPlanMixin, TestCase):
+    """Каждый view из posts/views.py — без полных проходов и в бюджете.
+
+    Бюджет — число запросов на один вызов view с пустым кэшем, вместе
+    с сессией и пользователем; превысить его можно только осознанно,
+    поправив число здесь.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username='plan_author')
+        cls.reader = User.objects.create(username='plan_reader')
+        cls.other = User.objects.create(username='plan_other')
+        cls.group = Group.objects.create(title='Группа', slug='plan-group')
+        for number in range(PAGINATOR_PAGE * 2 + 1):
+            post = Post.objects.create(
+                author=cls.author,
+                text=f'Пост для плана {number}',
+                group=cls.group if number % 2 else None,
+            )
+            Comment.objects.create(
+                post=post, author=cls.reader, text='Комментарий'
+            )
+        cls.post = post
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        self.client.force_login(self.reader)
+        self.author_client = self.client_class()
+        self.author_client.force_login(self.author)
+
+    def check_view(self, name, budget, request):
+        cache.clear()
+        with self.subTest(view=name), self.record_queries() as queries:
+            request()
+        with self.subTest(view=name):
+            self.assertNoFullScans(queries, HOT_TABLES)
+            self.assertLessEqual(
+                len(queries),
+                budget,
+                f'{name}: {len(queries)} запросов вместо не более '
+                f'{budget}:\n' + '\n'.join(sql for sql, _, _ in queries),
+            )
+
+    def test_full_scan_is_caught(self):
+        """Проверка плана ловит поиск без индекса."""
+        with self.record_queries() as queries:
+            list(Post.objects.filter(text__contains='план').order_by())
+        with self.assertRaisesMessage(AssertionError, 'posts_post'):
+            self.assertNoFullScans(queries, HOT_TABLES)
+
+    def test_read_views(self):
+        """Ленты, поиск и страница поста."""
+        post_detail = reverse('posts:post_detail', args=(self.post.pk,))
+        views = {
+            'posts:index': (4, reverse('posts:index')),
+            'posts:index page 2': (4, reverse('posts:index') + '?page=2'),
+            'posts:search': (4, reverse('posts:search') + '?q=план'),
+            'posts:group_list': (
+                5, reverse('posts:group_list', args=('plan-group',))
+            ),
+            'posts:profile': (
+                6, reverse('posts:profile', args=('plan_author',))
+            ),
+            'posts:post_detail': (4, post_detail),
+            'posts:follow_index': (5, reverse('posts:follow_index')),
+            'posts:post_create': (5, reverse('posts:post_create')),
+        }
+        for name, (budget, url) in views.items():
+            self.check_view(name, budget, lambda: self.client.get(url))
+        self.check_view(
+            'posts:post_edit',
+            5,
+            lambda: self.author_client.get(
+                reverse('posts:post_edit', args=(self.post.pk,))
+            ),
+        )
+
+    def test_write_views(self):
+        """Создание, правка, комментарий и подписки."""
+        self.check_view('posts:post_create POST', 8, lambda: (
+            self.client.post(
+                reverse('posts:post_create'), {'text': 'Новый пост'}
+            )
+        ))
+        self.check_view('posts:post_edit POST', 7, lambda: (
+            self.author_client.post(
+                reverse('posts:post_edit', args=(self.post.pk,)),
+                {'text': 'Правка'},
+            )
+        ))
+        self.check_view('posts:add_comment', 8, lambda: self.client.post(
+            reverse('posts:add_comment', args=(self.post.pk,)),
+            {'text': 'Ещё комментарий'},
+        ))
+        self.check_view('posts:profile_follow', 12, lambda: self.client.get(
+            reverse('posts:profile_follow', args=('plan_other',))
+        ))
+        # +1: проверка, не вышел ли автор из популярных (досылка ленты).
+        self.check_view(
+            'posts:profile_unfollow', 11, lambda: self.client.get(
+                reverse('posts:profile_unfollow', args=('plan_author',))
+            )
+        )
@@ -1,13 +1,22 @@
+import shutil
+import tempfile
+from unittest import mock
+
 from django.core.cache import cache
 from django.contrib.auth import get_user_model
-from django.test import Client, TestCase
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django import forms
-from posts.utils import PAGINATOR_PAGE
+from posts.utils import COMMENTS_PAGE, PAGINATOR_PAGE
 from django.core.cache import cache
 
 
-from posts.models import Group, Post, Follow
+from posts.models import Comment, FeedItem, Group, Post, Follow
+from posts.tests.utils import QueryBudgetMixin
+from posts.thumbnails import generate_thumbnails, get_ready_thumbnail
 
 TEST_POST: int = 13
 User = get_user_model()
@@ -88,9 +97,7 @@ class PostPagesTests(TestCase):
 
 
 class PaginatorViewsTest(TestCase):
-    @classmethod
     def setUp(self):
-        super().setUpClass()
         self.user = User.objects.create(username='Test')
         self.group = Group.objects.create(
             title='Тестовая группа',
@@ -141,6 +148,131 @@ class PaginatorViewsTest(TestCase):
             self.assertEqual(len(response.context['page_obj']), posts_count)
 
 
+class CursorPaginatorViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='Test')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug-cursor',
+        )
+        for number in range(TEST_POST):
+            Post.objects.create(
+                author=cls.user,
+                text=f'Тестовый пост {number}',
+                group=cls.group
+            )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_cursor_pages_walk_whole_feed(self):
+        '''Проверка: курсоры ведут по ленте вперёд и назад без потерь.'''
+        url = reverse('posts:group_list', kwargs={'slug': 'test-slug-cursor'})
+        first = self.client.get(url + '?after=').context['page_obj']
+        self.assertEqual(len(first), PAGINATOR_PAGE)
+        self.assertFalse(first.has_previous())
+        second = self.client.get(
+            url + f'?after={first.next_cursor}').context['page_obj']
+        self.assertEqual(len(second), TEST_POST - PAGINATOR_PAGE)
+        self.assertFalse(second.has_next())
+        expected = list(Post.objects.order_by('-pub_date', '-id'))
+        self.assertEqual(list(first) + list(second), expected)
+        back = self.client.get(
+            url + f'?before={second.previous_cursor}').context['page_obj']
+        self.assertEqual(list(back), list(first))
+
+    def test_cursor_page_skips_count(self):
+        '''Проверка: курсорная страница не считает строки.'''
+        url = reverse('posts:index')
+        first = self.client.get(url + '?after=').context['page_obj']
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url + f'?after={first.next_cursor}')
+        self.assertFalse(
+            any('COUNT(' in query['sql'] for query in queries.captured_queries)
+        )
+
+    def test_broken_cursor_opens_first_page(self):
+        '''Проверка: битый токен открывает начало ленты.'''
+        response = self.client.get(reverse('posts:index') + '?after=%%%')
+        self.assertEqual(
+            response.context['page_obj'][0],
+            Post.objects.order_by('-pub_date', '-id').first()
+        )
+
+
+class FeedPaginatorViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='Test')
+        Post.objects.bulk_create(
+            Post(author=cls.user, text=f'Тестовый пост {number}')
+            for number in range(PAGINATOR_PAGE * 6)
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        return [
+            query for query in queries.captured_queries
+            if 'COUNT(' in query['sql']
+        ]
+
+    def test_page_links_are_windowed(self):
+        '''Проверка: выводятся только соседние номера страниц.'''
+        url = reverse('posts:index')
+        first = self.client.get(url).context['page_obj']
+        self.assertEqual(list(first.page_window), [1, 2, 3])
+        middle = self.client.get(url + '?page=4').context['page_obj']
+        self.assertEqual(list(middle.page_window), [2, 3, 4, 5, 6])
+        self.assertNotContains(
+            self.client.get(url + '?page=6'), '?page=3"'
+        )
+
+    def test_count_is_cached_until_feed_changes(self):
+        '''Проверка: COUNT(*) повторяется только после новой записи.'''
+        url = reverse('posts:profile', kwargs={'username': 'Test'})
+        self.assertTrue(self.count_queries(url))
+        self.assertFalse(self.count_queries(url + '?page=2'))
+        Post.objects.create(author=self.user, text='Новый пост')
+        self.assertTrue(self.count_queries(url + '?page=3'))
+        response = self.client.get(url)
+        self.assertEqual(
+            response.context['page_obj'].paginator.count,
+            PAGINATOR_PAGE * 6 + 1
+        )
+
+    @mock.patch('posts.views.MAX_PAGES', 3)
+    def test_index_count_is_capped(self):
+        '''Проверка: номерами доступны не больше MAX_PAGES страниц.'''
+        url = reverse('posts:index')
+        (query,) = self.count_queries(url)
+        self.assertIn('LIMIT', query['sql'])
+        response = self.client.get(url + '?page=6')
+        page_obj = response.context['page_obj']
+        self.assertEqual(page_obj.paginator.num_pages, 3)
+        self.assertEqual(page_obj.number, 3)
+        link = f'?after={page_obj.next_cursor}'
+        self.assertContains(response, f'href="{link}"')
+        following = self.client.get(url + link).context['page_obj']
+        self.assertEqual(
+            following[0], Post.objects.feed()[PAGINATOR_PAGE * 3]
+        )
+
+    @mock.patch('posts.views.MAX_PAGES', 6)
+    def test_full_capped_feed_has_no_cursor_link(self):
+        '''Проверка: ровно MAX_PAGES страниц — без ссылки на курсоры.'''
+        url = reverse('posts:index')
+        page_obj = self.client.get(url + '?page=6').context['page_obj']
+        self.assertEqual(page_obj.paginator.num_pages, 6)
+        self.assertIsNone(page_obj.next_cursor)
+
+
 class CacheViewsTest(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -160,12 +292,10 @@ class CacheViewsTest(TestCase):
 
     def test_cache_index(self):
         """проверка кэша"""
+        cache.clear()
         response = self.authorized_client.get(reverse('posts:index'))
         posts = response.content
-        Post.objects.create(
-            text='test_new_post',
-            author=CacheViewsTest.author,
-        )
+        Post.objects.filter(pk=self.post.pk).update(text='changed_quietly')
         response_old = self.authorized_client.get(
             reverse('posts:index')
         )
@@ -175,11 +305,65 @@ class CacheViewsTest(TestCase):
             posts,
             'Не возвращает кэшированную страницу.'
         )
-        cache.clear()
+        Post.objects.create(
+            text='test_new_post',
+            author=CacheViewsTest.author,
+        )
         response_new = CacheViewsTest.authorized_client.get(reverse
                                                             ('posts:index'))
         new_posts = response_new.content
         self.assertNotEqual(old_posts, new_posts, 'Кэш не сбросился')
+        self.assertIn('test_new_post', new_posts.decode())
+
+    def test_cache_is_per_page(self):
+        """Страницы ленты кэшируются отдельно."""
+        for number in range(TEST_POST):
+            Post.objects.create(
+                text=f'test_post_{number}',
+                author=CacheViewsTest.author,
+            )
+        first = self.authorized_client.get(reverse('posts:index'))
+        second = self.authorized_client.get(
+            reverse('posts:index') + '?page=2')
+        self.assertNotEqual(first.content, second.content)
+
+    def test_extra_params_share_cached_page(self):
+        """Посторонние и битые параметры не заводят новых фрагментов."""
+        cache.clear()
+        url = reverse('posts:index')
+        self.authorized_client.get(url)
+        Post.objects.filter(pk=self.post.pk).update(text='changed_quietly')
+        for query in ('?utm=1', '?page=abc', '?page=1&x=2'):
+            with self.subTest(query=query):
+                response = self.authorized_client.get(url + query)
+                self.assertContains(response, 'test_post')
+                self.assertNotContains(response, 'changed_quietly')
+
+    def test_author_rename_invalidates_feeds(self):
+        """Новое имя автора сразу видно в закэшированной ленте."""
+        cache.clear()
+        url = reverse('posts:index')
+        self.authorized_client.get(url)
+        self.author.first_name = 'Переименованный'
+        self.author.save()
+        self.assertContains(self.authorized_client.get(url), 'Переименованный')
+
+    def test_edit_invalidates_group_and_profile(self):
+        """Правка поста сразу видна в ленте группы и профиля."""
+        urls = (
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': 'test_user'}),
+        )
+        for url in urls:
+            self.authorized_client.get(url)
+        self.authorized_client.post(
+            reverse('posts:post_edit', kwargs={'post_id': self.post.pk}),
+            data={'text': 'edited_post', 'group': self.group.pk},
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.authorized_client.get(url)
+                self.assertIn('edited_post', response.content.decode())
 
 
 class FollowViewsTest(TestCase):
@@ -248,3 +432,307 @@ class FollowViewsTest(TestCase):
         response = self.author_client.get(
             reverse('posts:follow_index'))
         self.assertNotIn(post, response.context['page_obj'].object_list)
+
+    def test_follow_feed_is_materialized(self):
+        """Проверка: пост подписки попадает в ленту при публикации."""
+        Follow.objects.create(
+            user=self.post_follower,
+            author=self.post_autor)
+        post = Post.objects.create(
+            author=self.post_autor,
+            text="Подписка")
+        self.assertTrue(FeedItem.objects.filter(
+            user=self.post_follower, post=post).exists())
+        Follow.objects.filter(
+            user=self.post_follower,
+            author=self.post_autor).delete()
+        self.assertFalse(FeedItem.objects.filter(
+            user=self.post_follower).exists())
+
+    def test_follow_feed_count_sees_new_posts(self):
+        """Проверка: число постов ленты подписок учитывает новые посты."""
+        Follow.objects.create(
+            user=self.post_follower,
+            author=self.post_autor)
+        url = reverse('posts:follow_index')
+        response = self.author_client.get(url)
+        self.assertEqual(response.context['page_obj'].paginator.count, 1)
+        Post.objects.create(author=self.post_autor, text='Ещё пост')
+        response = self.author_client.get(url)
+        self.assertEqual(response.context['page_obj'].paginator.count, 2)
+
+    @override_settings(FEED_FANOUT_LIMIT=0)
+    def test_follow_feed_reads_popular_authors(self):
+        """Проверка: посты популярного автора читаются без рассылки."""
+        Follow.objects.create(
+            user=self.post_follower,
+            author=self.post_autor)
+        post = Post.objects.create(
+            author=self.post_autor,
+            text="Подписка")
+        self.assertFalse(FeedItem.objects.exists())
+        response = self.author_client.get(
+            reverse('posts:follow_index'))
+        self.assertIn(post, response.context['page_obj'].object_list)
+
+    @override_settings(FEED_FANOUT_LIMIT=1)
+    def test_author_below_limit_again_is_backfilled(self):
+        """Проверка: посты времён популярности попадают в ленты потом."""
+        other = User.objects.create(username='other_follower')
+        Follow.objects.create(user=self.post_follower, author=self.post_autor)
+        Follow.objects.create(user=other, author=self.post_autor)
+        post = Post.objects.create(author=self.post_autor, text="Подписка")
+        self.assertFalse(FeedItem.objects.filter(post=post).exists())
+        Follow.objects.filter(user=other).delete()
+        self.assertTrue(FeedItem.objects.filter(
+            user=self.post_follower, post=post).exists())
+        self.assertFalse(FeedItem.objects.filter(user=other).exists())
+
+
+class FeedQueryBudgetTest(QueryBudgetMixin, TestCase):
+    FEED_QUERY_BUDGET: int = 6
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username='budget_author')
+        cls.reader = User.objects.create(username='budget_reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug-budget',
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        self.client.force_login(self.reader)
+        self.urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'test-slug-budget'}),
+            reverse('posts:profile', kwargs={'username': 'budget_author'}),
+            reverse('posts:follow_index'),
+        )
+
+    def create_posts(self, amount):
+        for _ in range(amount):
+            post = Post.objects.create(
+                author=self.author,
+                text='Тестовый пост',
+                group=self.group
+            )
+            Comment.objects.create(
+                post=post,
+                author=self.reader,
+                text='Комментарий'
+            )
+        return post
+
+    def page_queries(self, url):
+        cache.clear()
+        return self.count_queries(self.client.get, url)
+
+    def test_feed_queries_do_not_grow_with_page(self):
+        """Число запросов ленты не зависит от числа постов на странице."""
+        self.create_posts(1)
+        single = {url: self.page_queries(url) for url in self.urls}
+        self.create_posts(PAGINATOR_PAGE)
+        for url in self.urls:
+            with self.subTest(url=url):
+                cache.clear()
+                with self.assertMaxQueries(self.FEED_QUERY_BUDGET) as ctx:
+                    self.client.get(url)
+                self.assertEqual(len(ctx.captured_queries), single[url])
+
+    def test_post_detail_query_budget(self):
+        """Комментарии и счётчики поста не дают запроса на строку."""
+        post = self.create_posts(1)
+        for _ in range(5):
+            Comment.objects.create(
+                post=post, author=self.author, text='Комментарий')
+        with self.assertMaxQueries(self.FEED_QUERY_BUDGET):
+            response = self.client.get(
+                reverse('posts:post_detail', kwargs={'post_id': post.pk}))
+        self.assertEqual(response.context['post'].comments_count, 6)
+        self.assertEqual(
+            response.context['post'].author.stats.posts_count, 1)
+
+    def test_counters_do_not_aggregate(self):
+        """Профиль и пост показывают счётчики без COUNT-запросов."""
+        post = self.create_posts(2)
+        urls = (
+            reverse('posts:profile', kwargs={'username': 'budget_author'}),
+            reverse('posts:post_detail', kwargs={'post_id': post.pk}),
+        )
+        for url in urls:
+            self.client.get(url)
+            with self.subTest(url=url), CaptureQueriesContext(
+                connection
+            ) as queries:
+                response = self.client.get(url)
+            self.assertFalse(any(
+                'COUNT(' in query['sql']
+                for query in queries.captured_queries
+            ))
+        self.assertContains(response, 'Комментариев:')
+        self.assertContains(
+            self.client.get(urls[0]), 'Подписчиков: 1'
+        )
+
+
+class CommentsViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='Test')
+        cls.post = Post.objects.create(author=cls.user, text='Тестовый пост')
+        for number in range(COMMENTS_PAGE + 5):
+            Comment.objects.create(
+                post=cls.post, author=cls.user, text=f'Комментарий {number}'
+            )
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+        self.url = reverse(
+            'posts:post_detail', kwargs={'post_id': self.post.pk}
+        )
+
+    def test_comments_are_paginated(self):
+        '''Проверка: комментарии выводятся страницами по курсору.'''
+        first = self.client.get(self.url).context['comments']
+        self.assertEqual(len(first), COMMENTS_PAGE)
+        second = self.client.get(
+            self.url + f'?after={first.next_cursor}').context['comments']
+        self.assertEqual(len(second), 5)
+        self.assertFalse(second.has_next())
+        self.assertEqual(
+            list(first) + list(second),
+            list(self.post.comments.order_by('-created', '-id'))
+        )
+
+    def test_comments_page_is_cached(self):
+        '''Проверка: закэшированная страница не читает комментарии.'''
+        self.client.get(self.url)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.url)
+        self.assertFalse(any(
+            '"posts_comment"."text"' in query['sql']
+            for query in queries.captured_queries
+        ))
+
+    def test_add_comment_invalidates_page(self):
+        '''Проверка: новый комментарий сразу виден на странице поста.'''
+        self.client.get(self.url)
+        self.authorized_client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.pk}),
+            data={'text': 'Свежий комментарий'},
+        )
+        self.assertContains(self.client.get(self.url), 'Свежий комментарий')
+
+
+class SearchViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_superuser(
+            username='searcher', email='s@example.com', password='pass')
+        cls.post = Post.objects.create(
+            author=cls.user, text='Рецепт борща со сметаной')
+        cls.other = Post.objects.create(
+            author=cls.user, text='Заметки о погоде')
+        Comment.objects.create(
+            post=cls.other, author=cls.user, text='Сегодня был борщ')
+
+    def search(self, query):
+        response = self.client.get(reverse('posts:search'), {'q': query})
+        return list(response.context['page_obj'])
+
+    def test_search_matches_posts_and_comments(self):
+        '''Проверка: поиск находит посты по тексту и по комментариям.'''
+        self.assertEqual(self.search('рецепт'), [self.post])
+        self.assertEqual(self.search('БОРЩ'), [self.other, self.post])
+        self.assertEqual(self.search('бор'), [self.other, self.post])
+        self.assertEqual(self.search('"борща" OR'), [])
+        self.assertEqual(self.search(''), [])
+
+    def test_search_index_follows_edits(self):
+        '''Проверка: правка и удаление сразу отражаются в индексе.'''
+        self.post.text = 'Рецепт окрошки'
+        self.post.save()
+        self.assertEqual(self.search('окрошки'), [self.post])
+        self.assertEqual(self.search('борща'), [])
+        self.other.comments.all().delete()
+        self.assertEqual(self.search('борщ'), [])
+
+    def test_admin_uses_search_index(self):
+        '''Проверка: поиск в админке идёт по индексу и только по постам.'''
+        self.client.force_login(self.user)
+        response = self.client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'борщ'})
+        self.assertEqual(
+            list(response.context['cl'].result_list), [self.post])
+
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='thumbnail_author')
+        cls.post = Post.objects.create(
+            author=cls.user,
+            text='Пост с картинкой',
+            image=SimpleUploadedFile('thumb.gif', SMALL_GIF, 'image/gif'),
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_feed_shows_original_until_thumbnail_is_ready(self):
+        """Лента не строит миниатюру сама, а показывает исходник."""
+        with mock.patch(
+            'posts.templatetags.post_thumbnails.schedule_thumbnails'
+        ) as schedule:
+            response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, self.post.image.url)
+        self.assertIsNone(
+            get_ready_thumbnail(self.post.image, '960x339', crop='center',
+                                upscale=True)
+        )
+        schedule.assert_called_once_with(self.post)
+
+    def test_feed_uses_generated_thumbnail(self):
+        """После фоновой генерации лента отдаёт миниатюру."""
+        self.assertTrue(generate_thumbnails(self.post.image.name))
+        self.assertFalse(generate_thumbnails(self.post.image.name))
+        thumbnail = get_ready_thumbnail(
+            self.post.image, '960x339', crop='center', upscale=True)
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, thumbnail.url)
+
+    def test_post_create_schedules_thumbnails(self):
+        """Создание поста ставит миниатюры в очередь."""
+        self.client.force_login(self.user)
+        with mock.patch('posts.views.schedule_thumbnails') as schedule:
+            self.client.post(reverse('posts:post_create'), data={
+                'text': 'Новый пост',
+                'image': SimpleUploadedFile(
+                    'new.gif', SMALL_GIF, 'image/gif'),
+            })
+        schedule.assert_called_once()
@@ -0,0 +1,63 @@
+from contextlib import contextmanager
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from core import slow_queries
+
+
+class QueryBudgetMixin:
+    """Проверки числа SQL-запросов для TestCase."""
+
+    @contextmanager
+    def assertMaxQueries(self, budget, using=connection):
+        """Блок должен уложиться не более чем в budget запросов."""
+        with CaptureQueriesContext(using) as context:
+            yield context
+        executed = len(context.captured_queries)
+        self.assertLessEqual(
+            executed,
+            budget,
+            f'{executed} запросов вместо не более {budget}:\n'
+            + '\n'.join(
+                query['sql'] for query in context.captured_queries
+            )
+        )
+
+    def count_queries(self, func, *args, **kwargs):
+        """Сколько запросов выполняет func(*args, **kwargs)."""
+        with CaptureQueriesContext(connection) as context:
+            func(*args, **kwargs)
+        return len(context.captured_queries)
+
+
+class QueryPlanMixin:
+    """Сбор SQL с параметрами и проверка планов для TestCase."""
+
+    @contextmanager
+    def record_queries(self, using=connection):
+        """Список (sql, params) всех запросов, выполненных в блоке."""
+        queries = []
+
+        def record(execute, sql, params, many, context):
+            queries.append((sql, params, many))
+            return execute(sql, params, many, context)
+        with using.execute_wrapper(record):
+            yield queries
+
+    def assertNoFullScans(self, queries, tables, using=connection):
+        """Ни один запрос не проходит таблицы tables целиком."""
+        for sql, params, many in queries:
+            if many:
+                continue
+            plan = slow_queries.explain(using, sql, params)
+            self.assertFalse(
+                any(step.startswith('EXPLAIN ') for step in plan),
+                plan,
+            )
+            scanned = set(slow_queries.full_scans(plan, sql)) & set(tables)
+            self.assertFalse(
+                scanned,
+                f'Полный проход по {", ".join(sorted(scanned))}:\n'
+                f'{sql}\n' + '\n'.join(plan),
+            )
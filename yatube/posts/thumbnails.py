@@ -0,0 +1,128 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections, transaction
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.conf import defaults as thumbnail_defaults
+from sorl.thumbnail.images import ImageFile
+
+from core import timing
+
+from . import cache
+from .images import save_variants
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_OPTIONS = {'crop': 'center', 'upscale': True}
+# Геометрии, которые используют шаблоны лент и страницы поста.
+GEOMETRIES = ('960x339', '400x150')
+THUMBNAIL_WORKERS: int = 2
+# Картинку, для которой задача уже поставлена или упала, не ставим
+# повторно в течение этого времени.
+RETRY_TIMEOUT: int = 60 * 5
+
+_executor = None
+_lock = threading.Lock()
+
+
+class ReadyThumbnailBackend(ThumbnailBackend):
+    """Бэкенд sorl, умеющий искать миниатюру, не создавая её."""
+
+    def _thumbnail_options(self, source, options):
+        # Повторяет нормализацию опций из ThumbnailBackend.get_thumbnail,
+        # чтобы имя миниатюры совпало с тем, что создаст sorl.
+        if thumbnail_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(thumbnail_settings, attr)
+            if value != getattr(thumbnail_defaults, attr):
+                options.setdefault(key, value)
+        return options
+
+    def get_ready_thumbnail(self, file_, geometry_string, **options):
+        """Миниатюра из хранилища ключей sorl или None, если её ещё нет."""
+        source = ImageFile(file_)
+        options = self._thumbnail_options(source, options)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return default.kvstore.get(ImageFile(name, default.storage))
+
+
+backend = ReadyThumbnailBackend()
+
+
+def get_ready_thumbnail(file_, geometry_string, **options):
+    with timing.measure('thumb'):
+        return backend.get_ready_thumbnail(file_, geometry_string, **options)
+
+
+def generate_thumbnails(name):
+    """Строит стандартные миниатюры картинки; True, если что-то создано."""
+    created = False
+    for geometry in GEOMETRIES:
+        if get_ready_thumbnail(name, geometry, **THUMBNAIL_OPTIONS):
+            continue
+        with timing.measure('thumb'):
+            get_thumbnail(name, geometry, **THUMBNAIL_OPTIONS)
+        created = True
+    return created
+
+
+def _run(name, post_id, scopes):
+    try:
+        save_variants(name)
+        if generate_thumbnails(name):
+            # Во фрагментах лент ещё лежит исходная картинка.
+            cache.bump(*scopes)
+    except Exception:
+        logger.exception('Не удалось построить миниатюры поста %s', post_id)
+
+
+def _run_in_worker(name, post_id, scopes):
+    try:
+        _run(name, post_id, scopes)
+    finally:
+        connections.close_all()
+
+
+def _shared_memory_db():
+    # In-memory базу SQLite потоки делят через shared cache с табличными
+    # блокировками: фоновая запись в kvstore sorl ломает запросы потока,
+    # который её породил.
+    connection = connections['default']
+    return connection.vendor == 'sqlite' and connection.is_in_memory_db()
+
+
+def _submit(name, post_id, scopes):
+    global _executor
+    if not caches['default'].add(f'thumbnails:{name}', True, RETRY_TIMEOUT):
+        return
+    workers = getattr(settings, 'POSTS_THUMBNAIL_WORKERS', THUMBNAIL_WORKERS)
+    if not workers or _shared_memory_db():
+        _run(name, post_id, scopes)
+        return
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=workers, thread_name_prefix='thumbnails'
+            )
+    _executor.submit(_run_in_worker, name, post_id, scopes)
+
+
+def schedule_thumbnails(post):
+    """Ставит построение миниатюр поста в фоновую очередь.
+
+    Задача уходит в пул после коммита транзакции, чтобы воркер видел
+    сохранённый файл и запись поста.
+    """
+    if not post.image:
+        return
+    scopes = cache.post_scopes(post.pk, post.author_id, post.group_id)
+    name = post.image.name
+    transaction.on_commit(lambda: _submit(name, post.pk, scopes))
@@ -0,0 +1,173 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Q
+
+from .models import AuthorStats, FeedItem, Follow, Post
+
+FANOUT_FOLLOWERS_LIMIT: int = 1000
+BACKFILL_POSTS: int = 200
+POPULAR_CACHE_KEY = 'timeline:popular_authors'
+POPULAR_CACHE_TIMEOUT: int = 60 * 5
+
+
+def fanout_limit():
+    """Сколько подписчиков автора ещё обслуживаем рассылкой при записи."""
+    return getattr(settings, 'FEED_FANOUT_LIMIT', FANOUT_FOLLOWERS_LIMIT)
+
+
+def popular_author_ids():
+    """Авторы, чьи посты читаются из ленты напрямую, без рассылки."""
+    authors = cache.get(POPULAR_CACHE_KEY)
+    if authors is None:
+        authors = set(
+            AuthorStats.objects.filter(
+                followers_count__gt=fanout_limit()
+            ).values_list('user_id', flat=True)
+        )
+        cache.set(POPULAR_CACHE_KEY, authors, POPULAR_CACHE_TIMEOUT)
+    return authors
+
+
+def _feed_items(user_ids, author_id, posts):
+    return [
+        FeedItem(
+            user_id=user_id,
+            post_id=post_id,
+            author_id=author_id,
+            pub_date=pub_date,
+        )
+        for user_id in user_ids
+        for post_id, pub_date in posts
+    ]
+
+
+def fan_out_posts(author_id, posts):
+    """Раскладывает новые посты автора по лентам его подписчиков."""
+    limit = fanout_limit()
+    followers = list(
+        Follow.objects.filter(
+            author_id=author_id
+        ).values_list('user_id', flat=True)[:limit + 1]
+    )
+    if len(followers) > limit:
+        if author_id not in popular_author_ids():
+            cache.delete(POPULAR_CACHE_KEY)
+        return
+    FeedItem.objects.bulk_create(
+        _feed_items(
+            followers, author_id, [(post.pk, post.pub_date) for post in posts]
+        ),
+        batch_size=500,
+        ignore_conflicts=True,
+    )
+
+
+def fan_out_post(post):
+    """Раскладывает новый пост по лентам подписчиков автора."""
+    fan_out_posts(post.author_id, [post])
+
+
+def add_follow(user_id, author_id):
+    """Добавляет в ленту подписчика последние посты нового автора."""
+    if author_id in popular_author_ids():
+        return
+    posts = Post.objects.filter(
+        author_id=author_id
+    ).values_list('id', 'pub_date')[:BACKFILL_POSTS]
+    FeedItem.objects.bulk_create(
+        _feed_items([user_id], author_id, posts),
+        batch_size=500,
+        ignore_conflicts=True,
+    )
+
+
+def remove_follow(user_id, author_id):
+    """Убирает из ленты посты автора, от которого пользователь отписался.
+
+    Если с этой отпиской автор перестал быть популярным, его посты,
+    вышедшие без рассылки, раскладываются по лентам подписчиков.
+    Счётчики к этому моменту уже обновлены сигналом.
+    """
+    FeedItem.objects.filter(user_id=user_id, author_id=author_id).delete()
+    if AuthorStats.objects.filter(
+        user_id=author_id, followers_count=fanout_limit()
+    ).exists():
+        cache.delete(POPULAR_CACHE_KEY)
+        backfill_author(author_id)
+
+
+def backfill_author(author_id):
+    """Раскладывает последние BACKFILL_POSTS постов автора подписчикам.
+
+    Одним INSERT ... SELECT, как rebuild_feeds; строки, что уже есть
+    в лентах, пропускаются.
+    """
+    operations = connection.ops
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'{operations.insert_statement(ignore_conflicts=True)} '
+            f'{FeedItem._meta.db_table} '
+            '(user_id, post_id, author_id, pub_date) '
+            'SELECT follow.user_id, post.id, post.author_id, post.pub_date '
+            f'FROM {Follow._meta.db_table} AS follow '
+            'JOIN (SELECT id, author_id, pub_date '
+            f'FROM {Post._meta.db_table} WHERE author_id = %s '
+            'ORDER BY pub_date DESC, id DESC LIMIT %s) AS post '
+            'ON post.author_id = follow.author_id '
+            'WHERE follow.author_id = %s '
+            f'{operations.ignore_conflicts_suffix_sql(ignore_conflicts=True)}',
+            [author_id, BACKFILL_POSTS, author_id],
+        )
+        return cursor.rowcount
+
+
+def follow_feed(user):
+    """Лента подписок пользователя.
+
+    Обычные авторы читаются одним проходом по индексу ленты
+    (user, -pub_date); посты популярных авторов, для которых рассылка
+    не делается, подмешиваются при чтении.
+    """
+    popular = popular_author_ids()
+    if popular:
+        popular = list(
+            Follow.objects.filter(
+                user=user, author_id__in=popular
+            ).values_list('author_id', flat=True)
+        )
+    if not popular:
+        return Post.objects.filter(
+            feed_items__user=user
+        ).order_by('-feed_items__pub_date', '-id')
+    return Post.objects.filter(
+        Q(id__in=FeedItem.objects.filter(user=user).values('post_id'))
+        | Q(author_id__in=popular)
+    )
+
+
+def rebuild_feeds():
+    """Заново раскладывает ленты всех подписчиков одним INSERT ... SELECT.
+
+    Для массовой загрузки, минуя сигналы: каждый подписчик получает
+    последние BACKFILL_POSTS постов каждого обычного автора, как при
+    add_follow. Счётчики подписчиков должны быть уже пересчитаны.
+    """
+    cache.delete(POPULAR_CACHE_KEY)
+    FeedItem.objects.all().delete()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {FeedItem._meta.db_table} '
+            '(user_id, post_id, author_id, pub_date) '
+            'SELECT follow.user_id, post.id, post.author_id, post.pub_date '
+            f'FROM {Follow._meta.db_table} AS follow '
+            'JOIN (SELECT id, author_id, pub_date, ROW_NUMBER() OVER ('
+            'PARTITION BY author_id ORDER BY pub_date DESC, id DESC'
+            f') AS position FROM {Post._meta.db_table}) AS post '
+            'ON post.author_id = follow.author_id '
+            'WHERE post.position <= %s AND follow.author_id NOT IN ('
+            f'SELECT user_id FROM {AuthorStats._meta.db_table} '
+            'WHERE followers_count > %s)',
+            [BACKFILL_POSTS, fanout_limit()],
+        )
+        return cursor.rowcount
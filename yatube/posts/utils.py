@@ -1,11 +1,227 @@
-from django.core.paginator import Paginator
+import base64
+import binascii
+from datetime import datetime
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+from django.utils.functional import cached_property
 
 
 PAGINATOR_PAGE: int = 10
+COMMENTS_PAGE: int = 20
+# Сколько номеров страниц показывать по обе стороны от текущей.
+PAGE_WINDOW: int = 2
+COUNT_CACHE_TIMEOUT: int = 60 * 5
+# Сколько страниц общей ленты доступно по номеру; дальше — курсоры.
+MAX_PAGES: int = 100
+
+
+def encode_cursor(stamp, pk):
+    """Упаковывает ключ сортировки (дата, id) в непрозрачный токен."""
+    raw = f'{stamp.isoformat()}|{pk}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Распаковывает токен курсора; для битого токена возвращает None."""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        stamp, pk = raw.decode().split('|')
+        return datetime.fromisoformat(stamp), int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+
+
+def page_window(page):
+    """Номера страниц по обе стороны от текущей, не больше PAGE_WINDOW."""
+    first = max(page.number - PAGE_WINDOW, 1)
+    last = min(page.number + PAGE_WINDOW, page.paginator.num_pages)
+    return range(first, last + 1)
+
+
+class FeedPaginator(Paginator):
+    """Пагинатор, который берёт число строк из кэша.
+
+    count_key — ключ ленты, обычно с её версией: пока лента не менялась,
+    COUNT(*) не выполняется; без версии число строк может отставать от
+    базы не дольше PAGINATOR_COUNT_TIMEOUT секунд. max_count ограничивает
+    подсчёт: COUNT(*) по срезу с LIMIT проходит не всю таблицу, а только
+    начало индекса сортировки. Если строк больше, последняя страница
+    по номеру получает next_cursor — ссылку на продолжение по курсору.
+    """
+
+    def __init__(self, object_list, per_page, count_key=None,
+                 max_count=None, field='pub_date', **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.count_key = count_key
+        self.max_count = max_count
+        self.field = field
+
+    def _count_rows(self):
+        if self.max_count is None:
+            return super().count
+        # Лишняя строка отличает обрезанную ленту от ровно max_count.
+        return self.object_list[:self.max_count + 1].count()
+
+    @cached_property
+    def rows(self):
+        """Число строк, но не больше max_count + 1."""
+        if self.count_key is None:
+            return self._count_rows()
+        key = f'feed-count:{self.count_key}'
+        rows = cache.get(key)
+        if rows is None:
+            rows = self._count_rows()
+            cache.set(key, rows, getattr(
+                settings, 'PAGINATOR_COUNT_TIMEOUT', COUNT_CACHE_TIMEOUT
+            ))
+        return rows
+
+    @property
+    def truncated(self):
+        return self.max_count is not None and self.rows > self.max_count
+
+    @cached_property
+    def count(self):
+        if self.truncated:
+            return self.max_count
+        return self.rows
+
+    def _get_page(self, *args, **kwargs):
+        # Остаёмся на обычном Page: окно номеров и курсор — атрибуты.
+        page = super()._get_page(*args, **kwargs)
+        page.page_window = page_window(page)
+        page.next_cursor = None
+        if self.truncated and not page.has_next() and len(page):
+            last = page[len(page) - 1]
+            page.next_cursor = encode_cursor(
+                getattr(last, self.field), last.pk
+            )
+        return page
+
+
+class CursorPage(Page):
+    """Страница keyset-пагинации: вместо номера хранит курсоры соседей."""
+
+    is_cursor = True
+
+    def __init__(self, object_list, paginator,
+                 next_cursor=None, previous_cursor=None):
+        super().__init__(object_list, None, paginator)
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return '<Cursor page>'
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+class CursorPaginator(Paginator):
+    """Keyset-пагинация по (field, id) без COUNT(*) и OFFSET.
+
+    Любая страница стоит столько же, сколько первая: запрос всегда
+    начинается с позиции курсора в индексе, а не пропускает строки.
+    """
+
+    def __init__(self, object_list, per_page, field='pub_date'):
+        super().__init__(object_list, per_page)
+        self.field = field
+
+    def cursor_for(self, obj):
+        return encode_cursor(getattr(obj, self.field), obj.pk)
+
+    def cursor_page(self, after=None, before=None):
+        """Возвращает страницу после курсора after или перед before."""
+        field = self.field
+        after = decode_cursor(after)
+        before = decode_cursor(before)
+        if before is not None:
+            stamp, pk = before
+            rows = list(
+                self.object_list.filter(
+                    Q(**{f'{field}__gt': stamp})
+                    | Q(**{field: stamp, 'id__gt': pk})
+                ).order_by(field, 'id')[:self.per_page + 1]
+            )
+            more_previous = len(rows) > self.per_page
+            rows = rows[:self.per_page][::-1]
+            more_next = True
+        else:
+            queryset = self.object_list
+            if after is not None:
+                stamp, pk = after
+                queryset = queryset.filter(
+                    Q(**{f'{field}__lt': stamp})
+                    | Q(**{field: stamp, 'id__lt': pk})
+                )
+            rows = list(
+                queryset.order_by(f'-{field}', '-id')[:self.per_page + 1]
+            )
+            more_next = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+            more_previous = after is not None
+        if not rows:
+            return CursorPage(rows, self)
+        return CursorPage(
+            rows,
+            self,
+            next_cursor=self.cursor_for(rows[-1]) if more_next else None,
+            previous_cursor=(
+                self.cursor_for(rows[0]) if more_previous else None
+            ),
+        )
+
+
+def get_cursor_page(queryset, request, per_page=PAGINATOR_PAGE,
+                    field='pub_date'):
+    """Страница по курсорам ?after=/?before=; без них — первая."""
+    paginator = CursorPaginator(queryset, per_page, field=field)
+    return paginator.cursor_page(
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+    )
+
+
+def page_cache_key(request):
+    """Часть ключа кэша страницы из тех же параметров, что читает get_page.
+
+    Посторонние параметры (?utm=...) и битые значения не плодят новых
+    записей в кэше: ключ совпадает с ключом страницы, что откроется.
+    """
+    params = request.GET
+    if 'after' in params or 'before' in params:
+        for name in ('before', 'after'):
+            cursor = decode_cursor(params.get(name))
+            if cursor is not None:
+                return f'{name}={encode_cursor(*cursor)}'
+        return 'after='
+    try:
+        return f'page={int(params.get("page", 1))}'
+    except ValueError:
+        return 'page=1'
+
 
+def get_page(queryset, request, count_key=None, max_count=None):
+    """Страница ленты: по номеру (?page=) или по курсору (?after=/?before=).
 
-def get_page(queryset, request):
-    paginator = Paginator(queryset, PAGINATOR_PAGE)
+    Курсорный режим включается наличием after или before в запросе;
+    пустой ?after= открывает первую страницу ленты без подсчёта строк.
+    count_key и max_count передаются в FeedPaginator.
+    """
+    if 'after' in request.GET or 'before' in request.GET:
+        return get_cursor_page(queryset, request)
+    paginator = FeedPaginator(
+        queryset, PAGINATOR_PAGE, count_key=count_key, max_count=max_count
+    )
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
     return page_obj
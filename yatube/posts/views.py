@@ -1,33 +1,65 @@
 from django.contrib.auth.decorators import login_required
-from .utils import get_page
+from django.db import IntegrityError, transaction
+from django.utils.functional import SimpleLazyObject
+from django.utils.http import urlencode
+
+from core.db import retry_on_lock
+from .utils import (
+    COMMENTS_PAGE, MAX_PAGES, PAGINATOR_PAGE, get_cursor_page, get_page,
+)
+from . import search, timeline
 from django.shortcuts import render, get_object_or_404, redirect
 from .models import Group, Post, User, Follow
 from .forms import CommentForm, PostForm
-from django.views.decorators.cache import cache_page
+from .cache import (
+    INDEX_SCOPE, author_scope, feed_version, follow_scope, group_scope,
+    post_scope,
+)
+from .thumbnails import schedule_thumbnails
 
 
-@cache_page(60 * 20)
 def index(request):
-    page_obj = get_page(Post.objects.all(), request)
+    version = feed_version(INDEX_SCOPE)
+    page_obj = get_page(
+        Post.objects.feed(), request, count_key=version,
+        max_count=MAX_PAGES * PAGINATOR_PAGE,
+    )
     context = {
-        'page_obj': page_obj
+        'page_obj': page_obj,
+        'feed_version': version,
     }
     return render(request, 'posts/index.html', context)
 
 
+def post_search(request):
+    query = request.GET.get('q', '').strip()
+    page_obj = get_page(search.search_posts(query).feed(), request)
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+        'extra_query': urlencode({'q': query}) + '&' if query else '',
+    }
+    return render(request, 'posts/search.html', context)
+
+
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    page_obj = get_page(group.posts.all(), request)
+    version = feed_version(group_scope(group.pk))
+    page_obj = get_page(group.posts.feed(), request, count_key=version)
     context = {
         'group': group,
         'page_obj': page_obj,
+        'feed_version': version,
     }
     return render(request, 'posts/group_list.html', context)
 
 
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    page_obj = get_page(author.posts.all(), request)
+    author = get_object_or_404(
+        User.objects.select_related('stats'), username=username
+    )
+    version = feed_version(author_scope(author.pk))
+    page_obj = get_page(author.posts.feed(), request, count_key=version)
     following = (request.user.is_authenticated
                  and Follow.objects.filter(
                      user=request.user,
@@ -36,23 +68,35 @@ def profile(request, username):
         'author': author,
         'page_obj': page_obj,
         'following': following,
+        'feed_version': version,
     }
     return render(request, 'posts/profile.html', context)
 
 
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
+    post = get_object_or_404(
+        Post.objects.select_related('author__stats', 'group'), id=post_id
+    )
     author_post = post.author
     form = CommentForm()
+    comments = post.comments.select_related('author')
     context = {
         'post': post,
         'author_post': author_post,
         'form': form,
+        # Страница считается лениво: при попадании во фрагментный кэш
+        # запросов за комментариями нет вовсе.
+        'comments': SimpleLazyObject(lambda: get_cursor_page(
+            comments, request, per_page=COMMENTS_PAGE, field='created'
+        )),
+        'comments_version': feed_version(post_scope(post.pk)),
     }
     return render(request, 'posts/post_detail.html', context)
 
 
 @login_required
+@retry_on_lock
+@transaction.atomic
 def post_create(request):
     form = PostForm(
         request.POST or None,
@@ -63,6 +107,7 @@ def post_create(request):
             post = form.save(commit=False)
             post.author = request.user
             post.save()
+            schedule_thumbnails(post)
             return redirect('posts:profile', post.author)
     context = {
         'form': form
@@ -71,6 +116,7 @@ def post_create(request):
 
 
 @login_required
+@retry_on_lock
 def post_edit(request, post_id):
     post = get_object_or_404(Post, pk=post_id)
     if post.author != request.user:
@@ -81,7 +127,7 @@ def post_edit(request, post_id):
         instance=post
     )
     if form.is_valid():
-        form.save()
+        schedule_thumbnails(form.save())
         return redirect('posts:post_detail', post_id=post_id)
     context = {
         'post': post,
@@ -92,6 +138,8 @@ def post_edit(request, post_id):
 
 
 @login_required
+@retry_on_lock
+@transaction.atomic
 def add_comment(request, post_id):
     post = get_object_or_404(Post, id=post_id)
     form = CommentForm(request.POST or None)
@@ -105,8 +153,12 @@ def add_comment(request, post_id):
 
 @login_required
 def follow_index(request):
-    post = Post.objects.filter(author__following__user=request.user)
-    page_obj = get_page(post, request)
+    page_obj = get_page(
+        timeline.follow_feed(request.user).feed(),
+        request,
+        # Новые посты авторов меняют только общую версию ленты.
+        count_key=feed_version(INDEX_SCOPE, follow_scope(request.user.pk)),
+    )
     context = {
         'page_obj': page_obj,
     }
@@ -114,16 +166,15 @@ def follow_index(request):
 
 
 @login_required
+@retry_on_lock
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
-    if author == request.user or (Follow.objects.filter
-                                  (user=request.user,
-                                   author=author).exists()):
-        return redirect(
-            'posts:profile',
-            username=username
-        )
-    Follow.objects.create(user=request.user, author=author)
+    if author != request.user:
+        try:
+            with transaction.atomic():
+                Follow.objects.create(user=request.user, author=author)
+        except IntegrityError:
+            pass
     return redirect(
         'posts:profile',
         username=username
@@ -131,6 +182,8 @@ def profile_follow(request, username):
 
 
 @login_required
+@retry_on_lock
+@transaction.atomic
 def profile_unfollow(request, username):
     Follow.objects.filter(
         user=request.user, author=User.objects.get(username=username)
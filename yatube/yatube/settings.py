@@ -12,6 +12,8 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 
 import os
 
+from core.env import optional_float
+
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
@@ -50,11 +52,18 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Первыми, чтобы в замер попало всё остальное.
+    'core.middleware.MetricsMiddleware',
+    'core.middleware.TimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    # Раньше сессий: их сохранение тоже запись, после которой клиент
+    # должен читать из основной базы.
+    'core.middleware.ReplicaMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.ProfilerMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -65,7 +74,7 @@ TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.template_backends.DjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -89,10 +98,53 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
-    }
+        # Отдельный файл нужен, например, для замеров benchmark_views.
+        'NAME': os.getenv(
+            'YATUBE_DB', os.path.join(BASE_DIR, 'db.sqlite3')
+        ),
+        # Воркер держит соединение между запросами, а не открывает файл
+        # и не ставит прагмы заново на каждый запрос.
+        'CONN_MAX_AGE': int(os.getenv('YATUBE_CONN_MAX_AGE', 600)),
+    },
+    # Копия основной базы только для чтения; её догоняет sync_replica
+    # или внешняя репликация. Запросы идут на неё, только если задан
+    # YATUBE_REPLICA_DB, иначе алиас нужен лишь тестам маршрутизации.
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.getenv(
+            'YATUBE_REPLICA_DB', os.path.join(BASE_DIR, 'replica.sqlite3')
+        ),
+        'CONN_MAX_AGE': int(os.getenv('YATUBE_CONN_MAX_AGE', 600)),
+    },
 }
 
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+
+# Алиасы, с которых GET-запросы читают ленты и страницы. Поколение кэша
+# реплики sync_replica сдвигает из своего процесса, поэтому с репликой
+# нужен общий кэш (YATUBE_SHARED_CACHE).
+DATABASE_REPLICAS = ['replica'] if os.getenv('YATUBE_REPLICA_DB') else []
+
+# Сколько секунд после записи клиент читает из основной базы.
+READ_YOUR_WRITES_SECONDS = 10
+
+# Прагмы, которые core.db ставит каждому новому соединению с SQLite.
+# WAL пускает читателей параллельно с писателем, NORMAL не ждёт fsync
+# на каждом коммите; busy_timeout — сколько мс ждать чужую запись.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    # Отрицательное значение — размер в КиБ, то есть 64 МиБ.
+    'cache_size': -64 * 1024,
+    'busy_timeout': 20000,
+}
+
+# Сколько раз повторять пишущий запрос, упавший на блокировке SQLite,
+# и пауза перед первым повтором в секундах; дальше она удваивается.
+DATABASE_LOCK_RETRIES = 3
+DATABASE_LOCK_RETRY_DELAY = 0.05
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -145,8 +197,109 @@ CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Загрузки всегда пишутся на диск кусками, а не собираются в памяти.
+FILE_UPLOAD_HANDLERS = [
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+
+# Мастер-копия картинки поста не больше этого по длинной стороне;
+# картинки, у которых в заголовке больше пикселей, отклоняются.
+POSTS_IMAGE_MAX_SIDE = 2048
+POSTS_MAX_IMAGE_PIXELS = 40_000_000
+# Дополнительные форматы (например, 'WEBP'), которые фоновый пул
+# сохраняет рядом с мастер-копией.
+POSTS_IMAGE_VARIANTS = ()
+
+# Размер пула, который строит миниатюры загруженных картинок в фоне;
+# 0 — строить сразу после коммита в потоке запроса.
+POSTS_THUMBNAIL_WORKERS = 2
+
+# Доля запросов, для которых TimingMiddleware собирает Server-Timing
+# и пишет строку в лог; остальные обходятся без замеров. manage.py test
+# выключает выборку через TEST_RUNNER.
+REQUEST_TIMING_SAMPLE_RATE = float(
+    os.getenv('YATUBE_TIMING_SAMPLE_RATE', 0.01)
+)
+TEST_RUNNER = 'core.test_runner.TestRunner'
+
+# Токен, который сборщик метрик передаёт в Authorization: Bearer;
+# без токена /metrics/ закрыт (404).
+METRICS_TOKEN = os.getenv('YATUBE_METRICS_TOKEN')
+# Общий для воркеров файл с суммами метрик: каждый процесс раз в
+# METRICS_FLUSH_INTERVAL секунд прибавляет к ним свой прирост.
+METRICS_STORE = os.getenv(
+    'YATUBE_METRICS_STORE', os.path.join(BASE_DIR, 'metrics.sqlite3')
+)
+METRICS_FLUSH_INTERVAL = 5
+
+# Запросы к базе дольше этого (в мс) пишутся с планом в SLOW_QUERY_LOG
+# и видны в админке на /admin/slow-queries/; None — журнал выключен,
+# из окружения — пустым значением или off.
+SLOW_QUERY_MS = optional_float('YATUBE_SLOW_QUERY_MS', 100)
+SLOW_QUERY_LOG = os.getenv(
+    'YATUBE_SLOW_QUERY_LOG', os.path.join(BASE_DIR, 'slow_queries.log')
+)
+
+# Профили запросов, снятые ProfilerMiddleware по X-Profile: каталог,
+# шаг выборки стека в секундах и сколько последних файлов хранить.
+PROFILER_DIR = os.getenv(
+    'YATUBE_PROFILER_DIR', os.path.join(BASE_DIR, 'profiles')
+)
+# Каждая выборка снимает стеки всех потоков под GIL: шаг меньше
+# нескольких миллисекунд заметно замедляет сам профилируемый запрос.
+PROFILER_INTERVAL = float(os.getenv('YATUBE_PROFILER_INTERVAL', 0.005))
+PROFILER_KEEP = 200
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+        'slow_queries': {
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': SLOW_QUERY_LOG,
+            'maxBytes': 5 * 1024 * 1024,
+            'backupCount': 5,
+            'encoding': 'utf-8',
+            'delay': True,
+        },
+    },
+    'loggers': {
+        'core.middleware': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+        'core.slow_queries': {
+            'handlers': ['slow_queries'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
+
+# Сколько секунд пагинатор доверяет закэшированному числу постов ленты.
+PAGINATOR_COUNT_TIMEOUT = 60 * 5
+
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.cache.InstrumentedLocMemCache',
     }
 }
+
+# Путь к общему SQLite-кэшу: с ним все воркеры хоста видят одни и те же
+# записи и версии лент. Без него каждый процесс держит свой LocMemCache.
+SHARED_CACHE_PATH = os.getenv('YATUBE_SHARED_CACHE')
+
+if SHARED_CACHE_PATH:
+    CACHES = {
+        'default': {
+            'BACKEND': 'core.cache.InstrumentedSQLiteCache',
+            'LOCATION': SHARED_CACHE_PATH,
+            'OPTIONS': {
+                'MAX_ENTRIES': 100000,
+            },
+        }
+    }